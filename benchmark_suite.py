@@ -0,0 +1,330 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from fake_index import FakeIndex
+from metrics import LatencyStats, get_logger
+
+# baseline ที่ commit ไว้ (อัปเดตด้วย --update-baseline หลังยืนยันว่าผลเปลี่ยนเพราะตั้งใจ)
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+_THAI_WORDS = [
+    'การเรียนรู้', 'ของเครื่อง', 'ฐานข้อมูล', 'ภาษาไทย', 'ระบบ', 'ค้นหา', 'เอกสาร', 'ข้อมูล', 'ประสิทธิภาพ',
+    'โมเดล', 'ผู้ใช้', 'คำถาม', 'คำตอบ', 'เวกเตอร์', 'ความหมาย', 'ประโยค', 'การประมวลผล', 'ธรรมชาติ',
+    'กรุงเทพมหานคร', 'มหาวิทยาลัย', 'บริษัท', 'ลูกค้า', 'สินค้า', 'บริการ', 'รายงาน', 'การวิเคราะห์',
+]
+_THAI_GLUE = ['และ', 'ที่', 'ใน', 'ของ', 'เป็น', 'ได้', 'ให้', 'กับ', 'จาก', 'สำหรับ', 'ซึ่ง', 'โดย']
+_ENGLISH_WORDS = [
+    'retrieval', 'vector', 'database', 'embedding', 'model', 'search', 'document', 'query', 'latency',
+    'throughput', 'index', 'chunk', 'token', 'language', 'semantic', 'similarity', 'python', 'pipeline',
+    'customer', 'product', 'service', 'report', 'analysis', 'network', 'cache', 'memory', 'storage',
+]
+_ENGLISH_GLUE = ['the', 'a', 'of', 'and', 'to', 'in', 'for', 'with', 'on', 'by', 'is', 'are']
+
+def _sentence(rng: random.Random, language: str) -> str:
+    if language == 'th':
+        # ภาษาไทยไม่เว้นวรรคระหว่างคำ เว้นวรรคระหว่างประโยค/วลี
+        words = [rng.choice(_THAI_WORDS if i % 2 == 0 else _THAI_GLUE) for i in range(rng.randint(6, 16))]
+        return ''.join(words)
+    words = [rng.choice(_ENGLISH_WORDS if i % 2 == 0 else _ENGLISH_GLUE) for i in range(rng.randint(8, 20))]
+    return ' '.join(words).capitalize() + '.'
+
+def generate_corpus(count: int, language: str, doc_chars: int = 2000, seed: int = 0) -> List[Dict[str, Any]]:
+    """สร้างเอกสารจำลองภาษาไทย ('th') หรืออังกฤษ ('en') ที่ได้ผลเหมือนเดิมทุกครั้งสำหรับ seed เดียวกัน
+
+    ความยาวเอกสารกระจายรอบ doc_chars (0.25x - 2x) และมีย่อหน้า
+    """
+    rng = random.Random(f"{language}-{seed}")
+    documents = []
+    for i in range(count):
+        target = int(doc_chars * rng.uniform(0.25, 2.0))
+        paragraphs, paragraph, length = [], [], 0
+        while length < target:
+            sentence = _sentence(rng, language)
+            paragraph.append(sentence)
+            length += len(sentence) + 1
+            if len(paragraph) >= rng.randint(3, 6):
+                paragraphs.append(' '.join(paragraph))
+                paragraph = []
+        if paragraph:
+            paragraphs.append(' '.join(paragraph))
+        documents.append({
+            'id': f"bench_{language}_{i}",
+            'title': f"Benchmark {language} document {i}",
+            'content': '\n\n'.join(paragraphs),
+            'source_url': f"https://example.com/{language}/{i}",
+            'type': f"bench_{language}",
+        })
+    return documents
+
+def generate_queries(count: int, seed: int = 0) -> List[str]:
+    """queries ไทย/อังกฤษสลับกัน (ไม่ซ้ำกัน เพื่อไม่ให้โดน query cache)"""
+    rng = random.Random(f"queries-{seed}")
+    queries = []
+    for i in range(count):
+        language = 'th' if i % 2 == 0 else 'en'
+        words = _THAI_WORDS if language == 'th' else _ENGLISH_WORDS
+        queries.append(f"{' '.join(rng.sample(words, 3))} {i}")
+    return queries
+
+class StubEmbedder:
+    """ใช้แทน EmbeddingModel ใน benchmark โดยไม่ต้องโหลดโมเดล
+
+    embedding = hashing ของ character trigrams ลง dim ช่อง (normalize แล้ว) ข้อความที่คล้ายกันจึงได้ vector ใกล้กัน
+    วัด overhead ของ pipeline (chunk, batch, serialize, upsert, query) แยกจากความเร็วของโมเดล
+    """
+
+    backend = 'torch'
+    num_threads = None
+    cache = None
+    loaded = True
+
+    def __init__(self, dim: int = 384):
+        self.embedding_dim = dim
+        self.model_name = f"stub-trigram-{dim}"
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        embeddings = np.zeros((len(texts), self.embedding_dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+            if len(codes) < 3:
+                codes = np.pad(codes, (0, 3 - len(codes)))
+            buckets = (codes[:-2] * 1000003 ^ codes[1:-1] * 8191 ^ codes[2:]) % self.embedding_dim
+            embeddings[i] = np.bincount(buckets.astype(np.int64), minlength=self.embedding_dim)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+    def batch_encode(self, texts, batch_size=32) -> np.ndarray:
+        return self.encode(texts)
+
+    def encode_packed(self, texts, batch_size=64, show_progress_bar=False) -> np.ndarray:
+        return self.encode(texts)
+
+    def encode_single(self, text):
+        return self.encode([text])[0].tolist()
+
+    def cache_stats(self):
+        return None
+
+    def flush_cache(self):
+        pass
+
+def _best_of(repeat: int, run: Callable[[], float]) -> float:
+    """รัน run() หลายรอบ คืนเวลาที่น้อยที่สุด (ลดผลของ noise จาก process อื่น)"""
+    return min(run() for _ in range(repeat))
+
+def _timed(function: Callable[[], Any]) -> float:
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+def bench_chunker(corpora: Dict[str, List[Dict[str, Any]]], repeat: int = 3) -> Dict[str, float]:
+    """throughput ของ TextChunker.chunk_many_by_sentences (แบบนับตัวอักษร) ต่อภาษา"""
+    from text_chunker import TextChunker
+
+    chunker = TextChunker(chunk_size=512, overlap=50)
+    results = {}
+    for language, documents in corpora.items():
+        texts = [document['content'] for document in documents]
+        seconds = _best_of(repeat, lambda: _timed(lambda: chunker.chunk_many_by_sentences(texts)))
+        results[f"chunker.{language}.docs_per_s"] = len(texts) / seconds
+        results[f"chunker.{language}.mchars_per_s"] = sum(map(len, texts)) / seconds / 1e6
+    return results
+
+def bench_encode(embedder, texts: List[str], batch_size: int = 64, repeat: int = 3) -> Dict[str, float]:
+    """texts/s ของ batch_encode และ latency ของ encode ข้อความเดียว (embedder ต้องไม่มี cache)"""
+    embedder.encode(texts[:1], show_progress_bar=False)
+    seconds = _best_of(repeat, lambda: _timed(lambda: embedder.batch_encode(texts, batch_size=batch_size)))
+    single = LatencyStats()
+    for text in texts[:100]:
+        single.record(_timed(lambda: embedder.encode([text], show_progress_bar=False)))
+    return {
+        'encode.texts_per_s': len(texts) / seconds,
+        'encode.single_p50_ms': single.percentile(50) * 1000,
+    }
+
+def bench_ingest(embedder, documents: List[Dict[str, Any]], make_index: Callable[[], FakeIndex], token_aware: bool,
+                 workdir: str, repeat: int = 3) -> Dict[str, float]:
+    """FileDataImporter.import_from_jsonl ตั้งแต่อ่านไฟล์จนทุก batch upsert เสร็จ (index ใหม่ทุกรอบ)
+
+    คืน index ของรอบสุดท้ายไว้ใช้กับ bench_search ด้วย
+    """
+    from data_importer import FileDataImporter
+    from data_upserter import PineconeDataUpserter
+
+    path = os.path.join(workdir, 'corpus.jsonl')
+    with open(path, 'w', encoding='utf-8') as f:
+        for document in documents:
+            f.write(json.dumps(document, ensure_ascii=False) + '\n')
+
+    best = None
+    for _ in range(repeat):
+        index = make_index()
+        upserter = PineconeDataUpserter('benchmark', index=index, embedder=embedder, token_aware=token_aware)
+        importer = FileDataImporter(upserter=upserter, manifest_path=os.path.join(workdir, 'manifest.json'))
+        started = time.perf_counter()
+        count = importer.import_from_jsonl(path)
+        seconds = time.perf_counter() - started
+        upserter.writer.close()
+        if best is None or seconds < best[0]:
+            best = (seconds, count, upserter.writer.summary()['vectors'])
+    seconds, count, chunks = best
+    return {
+        'ingest.docs_per_s': count / seconds,
+        'ingest.chunks_per_s': chunks / seconds,
+    }, index
+
+def bench_search(embedder, index: FakeIndex, queries: List[str], top_k: int = 5,
+                 batch_size: int = 16, repeat: int = 3) -> Dict[str, float]:
+    """latency ของ VectorSearcher.search ทีละ query และ throughput ของ search_many (ไม่ใช้ result cache)
+
+    แต่ละรอบใช้ searcher ใหม่ (query cache ว่าง) แล้วเก็บรอบที่ดีที่สุดของแต่ละ metric
+    """
+    from vector_search import VectorSearcher
+
+    half = len(queries) // 2
+    results = {}
+    for _ in range(repeat):
+        searcher = VectorSearcher('benchmark', index=index, embedder=embedder, result_cache=False)
+        for query in queries[:half]:
+            searcher.search(query, top_k=top_k)
+        summary = searcher.latency['search'].summary()
+
+        started = time.perf_counter()
+        for start in range(half, len(queries), batch_size):
+            searcher.search_many(queries[start:start + batch_size], top_k=top_k)
+        seconds = time.perf_counter() - started
+        searcher.close()
+
+        for metric, value in (('search.p50_ms', summary['p50_ms']), ('search.p95_ms', summary['p95_ms']),
+                              ('search.p99_ms', summary['p99_ms'])):
+            results[metric] = min(value, results.get(metric, value))
+        results['search_many.queries_per_s'] = max((len(queries) - half) / seconds,
+                                                   results.get('search_many.queries_per_s', 0.0))
+    return results
+
+def run_suite(docs: int = 500, queries: int = 300, doc_chars: int = 2000, model: str = 'stub',
+              latency: float = 0.005, seed: int = 0, repeat: int = 3) -> Dict[str, Any]:
+    """รันทุก benchmark คืน {'meta': ..., 'results': {metric: value}}"""
+    # ปิด log รายละเอียดของ upserter/importer ระหว่างวัด (get_logger ตั้ง handler ก่อน แล้วค่อยลด level)
+    get_logger('benchmark')
+    logging.getLogger('rag').setLevel(logging.WARNING)
+
+    if model == 'stub':
+        embedder, token_aware = StubEmbedder(), False
+    else:
+        from embedding_model import EmbeddingModel
+        embedder, token_aware = EmbeddingModel(model, cache_dir=False), True
+
+    corpora = {language: generate_corpus(docs, language, doc_chars, seed) for language in ('th', 'en')}
+    mixed = [document for pair in zip(corpora['th'], corpora['en']) for document in pair]
+    chunk_texts = [document['content'][:512] for document in mixed[:512]]
+
+    results = {}
+    results.update(bench_chunker(corpora, repeat))
+    results.update(bench_encode(embedder, chunk_texts, repeat=repeat))
+
+    # latency เทียมแบบไม่มี jitter เพื่อให้ผลแต่ละรอบเทียบกันได้
+    with tempfile.TemporaryDirectory() as workdir:
+        ingest, index = bench_ingest(embedder, mixed, lambda: FakeIndex(latency=latency, jitter=0.0, seed=seed),
+                                     token_aware, workdir, repeat)
+    results.update(ingest)
+    results.update(bench_search(embedder, index, generate_queries(queries, seed), repeat=repeat))
+
+    return {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'config': {'docs': docs, 'queries': queries, 'doc_chars': doc_chars, 'model': model,
+                       'latency': latency, 'seed': seed, 'repeat': repeat},
+        },
+        'results': results,
+    }
+
+# metric แบบ _ms ที่ต่างจาก baseline น้อยกว่านี้ไม่นับเป็น regression (ต่ำกว่า noise ของ timer/scheduler)
+_NOISE_FLOOR_MS = 0.5
+
+def lower_is_better(metric: str) -> bool:
+    return metric.endswith('_ms')
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float = 0.3) -> List[Dict[str, Any]]:
+    """เทียบกับ baseline ต่อ metric: change > 0 คือดีขึ้น, regression เมื่อแย่ลงเกิน tolerance (สัดส่วน)"""
+    rows = []
+    for metric, value in results.items():
+        base = baseline.get(metric)
+        if not base:
+            rows.append({'metric': metric, 'value': value, 'baseline': None, 'change': None, 'regression': False})
+            continue
+        change = (base - value) / base if lower_is_better(metric) else (value - base) / base
+        regression = change < -tolerance
+        if lower_is_better(metric) and abs(value - base) < _NOISE_FLOOR_MS:
+            regression = False
+        rows.append({'metric': metric, 'value': value, 'baseline': base, 'change': change,
+                     'regression': regression})
+    return rows
+
+def main(argv=None) -> int:
+    """CLI: python benchmark_suite.py [--docs 500] [--output bench.json] [--baseline benchmark_baseline.json]
+
+    exit code 1 ถ้า metric ใดแย่กว่า baseline เกิน --tolerance
+    """
+    parser = argparse.ArgumentParser(description="Offline ingest/search benchmark against a fake index")
+    parser.add_argument('--docs', type=int, default=500, help="จำนวนเอกสารต่อภาษา")
+    parser.add_argument('--queries', type=int, default=300, help="จำนวน queries")
+    parser.add_argument('--doc-chars', type=int, default=2000, help="ความยาวเฉลี่ยของเอกสาร (ตัวอักษร)")
+    parser.add_argument('--model', default='stub', help="'stub' หรือชื่อ/path ของ SentenceTransformer ขนาดเล็ก")
+    parser.add_argument('--latency', type=float, default=0.005, help="latency เทียมของ FakeIndex (วินาที)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="จำนวนรอบของ benchmark ย่อย (ใช้ค่าที่ดีที่สุด)")
+    parser.add_argument('--output', help="เขียนผลเป็น JSON ที่ path นี้")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="ไฟล์ baseline ที่ใช้เทียบ")
+    parser.add_argument('--tolerance', type=float, default=0.3, help="สัดส่วนที่ยอมให้แย่ลงได้")
+    parser.add_argument('--update-baseline', action='store_true', help="เขียนผลรอบนี้ทับ baseline")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.docs, args.queries, args.doc_chars, args.model, args.latency, args.seed, args.repeat)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        if stored['meta']['config'] != report['meta']['config']:
+            print(f"Baseline config differs ({stored['meta']['config']}), comparison may not be meaningful")
+        baseline = stored['results']
+
+    rows = compare(report['results'], baseline, args.tolerance)
+    for row in rows:
+        if row['baseline'] is None:
+            note = "(no baseline)"
+        else:
+            note = f"baseline {row['baseline']:12.2f}  {row['change']:+7.1%}"
+        flag = 'REGRESSION' if row['regression'] else ''
+        print(f"{row['metric']:28s} {row['value']:12.2f}  {note} {flag}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written: {args.baseline}")
+        return 0
+    return 1 if any(row['regression'] for row in rows) else 0
+
+# ทดสอบ: python benchmark_suite.py --docs 50 --queries 40
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,381 @@
+import atexit
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from chunk_store import COMPACT_METADATA_FIELDS
+from metadata_filter import MetadataIndex, filter_fields
+
+# ตัวอักษรไทย (ไม่มีการเว้นวรรคระหว่างคำ จึงตัดเป็น character bigrams แทนการตัดคำ)
+_THAI_RUN = r'[\u0E00-\u0E7F]+'
+# คำ/รหัสภาษาอื่น รวมรหัสที่มีตัวคั่นเช่น SKU-1234, v2.1, A/B
+_WORD_RUN = r'[^\W_\u0E00-\u0E7F]+(?:[-./][^\W_\u0E00-\u0E7F]+)*'
+_TOKEN_RE = re.compile(f'({_THAI_RUN})|({_WORD_RUN})')
+_SEPARATORS = re.compile(r'[-./]')
+
+# field ของ metadata ที่ไม่เก็บใน BM25 index (ข้อความของ chunk อยู่ใน posting lists แล้ว)
+_UNSTORED_FIELDS = ('content',)
+
+def tokenize(text: str) -> List[str]:
+    """แปลงข้อความเป็น terms สำหรับ BM25
+
+    - ภาษาไทย: character bigrams (คำไทยที่ตรงกันจะมี bigrams ตรงกันโดยไม่ต้องใช้ dictionary)
+    - ภาษาอื่น: คำตัวพิมพ์เล็ก รหัสที่มีตัวคั่นได้ทั้งแต่ละส่วนและแบบรวม (sku-1234 -> sku, 1234, sku1234)
+    """
+    tokens = []
+    for thai, word in _TOKEN_RE.findall(unicodedata.normalize('NFC', text).lower()):
+        if thai:
+            if len(thai) == 1:
+                tokens.append(thai)
+            else:
+                tokens.extend(thai[i:i + 2] for i in range(len(thai) - 1))
+        else:
+            parts = _SEPARATORS.split(word)
+            tokens.extend(parts)
+            if len(parts) > 1:
+                tokens.append(''.join(parts))
+    return tokens
+
+class BM25Index:
+    """Inverted index สำหรับค้นหาด้วยคำ (BM25) ของ chunks ที่ upsert เข้า vector index
+
+    - posting list ต่อ term: doc rows (uint32) + term frequency (uint16)
+      ส่วนที่โหลดจาก disk เป็น CSR array ต่อเนื่อง (memory-mapped) ส่วนที่เพิ่มใหม่อยู่ใน array.array
+      และถูกรวมเป็น CSR เมื่อ save() หรือเมื่อส่วนใหม่โตเกินส่วนเดิม
+    - ลบ/อัปเดตแบบ tombstone (แถวเดิมถูกข้ามตอนค้นหา และถูกตัดทิ้งเมื่อ compact)
+    - เก็บ metadata ทุก field ยกเว้น content เพื่อให้ filter ได้ผลเหมือน index
+      filter ที่ใช้ field ที่ไม่ได้เก็บจะ raise ValueError แทนการคืนผลที่ผิด
+      (index ที่บันทึกก่อนหน้านี้เก็บแค่ COMPACT_METADATA_FIELDS จึง filter ได้เฉพาะ field เหล่านั้น)
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._reset()
+
+        if path and os.path.exists(os.path.join(path, 'bm25.json')):
+            self._load()
+        if path:
+            atexit.register(self.save)
+
+    def _reset(self):
+        self._ids: List[Optional[str]] = []
+        self._metadata: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._lengths = np.zeros(0, dtype=np.uint32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._total_length = 0
+        # posting lists ที่ compact แล้ว: term -> ตำแหน่งใน offsets
+        self._terms: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.uint32)
+        self._tfs = np.zeros(0, dtype=np.uint16)
+        # posting lists ที่เพิ่มหลัง compact ครั้งล่าสุด
+        self._delta: Dict[str, Tuple[array, array]] = {}
+        self._delta_postings = 0
+        self._metadata_index = None
+        # None = เก็บทุก field ยกเว้น _UNSTORED_FIELDS ไม่งั้นเป็น fields ที่เก็บ
+        self._stored_fields: Optional[Tuple[str, ...]] = None
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # ---------- write ----------
+
+    def _ensure_capacity(self, extra: int):
+        needed = self._size + extra
+        if needed <= len(self._lengths) and self._lengths.flags.writeable:
+            return
+        capacity = max(needed, len(self._lengths) * 2, 1024)
+        lengths = np.zeros(capacity, dtype=np.uint32)
+        lengths[:self._size] = self._lengths[:self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._lengths, self._alive = lengths, alive
+
+    def _delete_row(self, row: int):
+        del self._rows[self._ids[row]]
+        if self._metadata_index is not None:
+            self._metadata_index.remove(row, self._metadata[row])
+        self._total_length -= int(self._lengths[row])
+        self._alive[row] = False
+        self._ids[row] = None
+        self._metadata[row] = None
+
+    def add_many(self, documents: Iterable[Tuple[str, str, Dict[str, Any]]]):
+        """เพิ่ม/แทนที่ (vector_id, text, metadata) หลายรายการ"""
+        documents = list(documents)
+        with self._lock:
+            self._ensure_capacity(len(documents))
+            for vector_id, text, metadata in documents:
+                row = self._rows.get(vector_id)
+                if row is not None:
+                    self._delete_row(row)
+
+                counts = Counter(tokenize(text))
+                row = self._size
+                self._size += 1
+                stored = {field: value for field, value in metadata.items() if self._stores(field)}
+                self._ids.append(vector_id)
+                self._metadata.append(stored)
+                self._rows[vector_id] = row
+                length = sum(counts.values())
+                self._lengths[row] = length
+                self._alive[row] = True
+                self._total_length += length
+                if self._metadata_index is not None:
+                    self._metadata_index.add(row, stored)
+
+                for term, count in counts.items():
+                    postings = self._delta.get(term)
+                    if postings is None:
+                        postings = self._delta[term] = (array('I'), array('H'))
+                    postings[0].append(row)
+                    postings[1].append(min(count, 65535))
+                self._delta_postings += len(counts)
+            self._dirty = True
+
+            if self._delta_postings > max(len(self._docs), 1_000_000):
+                self._compact()
+
+    def add_vectors(self, vectors: Iterable[tuple]):
+        """เพิ่มจาก vectors (vector_id, values, metadata) ที่ใช้ upsert โดยใช้ metadata['content']"""
+        self.add_many((vector_id, metadata.get('content', ''), metadata) for vector_id, _, metadata in vectors)
+
+    def _stores(self, field: str) -> bool:
+        if self._stored_fields is None:
+            return field not in _UNSTORED_FIELDS
+        return field in self._stored_fields
+
+    def check_filter(self, filter_dict: Optional[Dict[str, Any]]):
+        """raise ValueError ถ้า filter ใช้ field ที่ index นี้ไม่ได้เก็บ (ผลของ $ne/$nin/$exists จะผิด)"""
+        missing = sorted(field for field in filter_fields(filter_dict) if not self._stores(field))
+        if missing:
+            raise ValueError(f"BM25 index does not store metadata field(s) {missing} and cannot apply this filter")
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[Dict[str, Any]] = None):
+        """ลบตาม ID และ/หรือ filter (รูปแบบ Pinecone)"""
+        self.check_filter(filter)
+        with self._lock:
+            rows = [self._rows[vector_id] for vector_id in ids or [] if vector_id in self._rows]
+            if filter:
+                mask = self._alive[:self._size] & self._filter_index().mask(filter, self._size)
+                rows.extend(np.flatnonzero(mask).tolist())
+            for row in set(rows):
+                self._delete_row(row)
+            if rows:
+                self._dirty = True
+
+    def _filter_index(self) -> MetadataIndex:
+        if self._metadata_index is None:
+            self._metadata_index = MetadataIndex()
+            for row, metadata in enumerate(self._metadata[:self._size]):
+                if metadata is not None:
+                    self._metadata_index.add(row, metadata)
+        return self._metadata_index
+
+    def _compact(self):
+        """รวม posting lists ทั้งหมดเป็น CSR และตัดแถวที่ถูกลบทิ้ง (เลขแถวเปลี่ยน)"""
+        keep = np.flatnonzero(self._alive[:self._size])
+        remap = np.full(self._size, -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+
+        terms, offsets, doc_parts, tf_parts = {}, [0], [], []
+        for term in set(self._terms) | set(self._delta):
+            docs, tfs = self._postings(term)
+            live = remap[docs] >= 0
+            if not live.any():
+                continue
+            terms[term] = len(offsets) - 1
+            doc_parts.append(remap[docs[live]].astype(np.uint32))
+            tf_parts.append(tfs[live])
+            offsets.append(offsets[-1] + int(live.sum()))
+
+        self._terms = terms
+        self._offsets = np.array(offsets, dtype=np.int64)
+        self._docs = np.concatenate(doc_parts) if doc_parts else np.zeros(0, dtype=np.uint32)
+        self._tfs = np.concatenate(tf_parts) if tf_parts else np.zeros(0, dtype=np.uint16)
+        self._delta = {}
+        self._delta_postings = 0
+
+        self._ids = [self._ids[row] for row in keep]
+        self._metadata = [self._metadata[row] for row in keep]
+        self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        self._lengths = self._lengths[keep]
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._size = len(keep)
+        self._metadata_index = None
+
+    # ---------- search ----------
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, tfs) ของ term จากส่วน CSR รวมกับส่วนที่เพิ่มใหม่"""
+        docs, tfs = [], []
+        index = self._terms.get(term)
+        if index is not None:
+            start, end = self._offsets[index], self._offsets[index + 1]
+            docs.append(self._docs[start:end])
+            tfs.append(self._tfs[start:end])
+        delta = self._delta.get(term)
+        if delta is not None:
+            docs.append(np.array(delta[0], dtype=np.uint32))
+            tfs.append(np.array(delta[1], dtype=np.uint16))
+        if not docs:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint16)
+        if len(docs) == 1:
+            return docs[0], tfs[0]
+        return np.concatenate(docs), np.concatenate(tfs)
+
+    def search(self, query: str, top_k: int = 10,
+               filter_dict: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """คืน [(vector_id, bm25 score)] เรียงจากมากไปน้อย เฉพาะ chunks ที่มีอย่างน้อยหนึ่ง term ของ query"""
+        self.check_filter(filter_dict)
+        terms = set(tokenize(query))
+        with self._lock:
+            live_count = len(self._rows)
+            if not terms or live_count == 0 or top_k <= 0:
+                return []
+            size = self._size
+            alive = self._alive[:size]
+            avg_length = self._total_length / live_count
+            norms = self.k1 * (1 - self.b + self.b * self._lengths[:size].astype(np.float32) / avg_length)
+
+            scores = np.zeros(size, dtype=np.float32)
+            for term in terms:
+                docs, tfs = self._postings(term)
+                live = alive[docs]
+                docs, tfs = docs[live], tfs[live].astype(np.float32)
+                if len(docs) == 0:
+                    continue
+                idf = math.log(1 + (live_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norms[docs])
+
+            candidates = np.flatnonzero(scores > 0)
+            if filter_dict and len(candidates):
+                candidates = candidates[self._filter_index().mask(filter_dict, size)[candidates]]
+            if len(candidates) > top_k:
+                candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+            candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+            return [(self._ids[row], float(scores[row])) for row in candidates.tolist()]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'documents': len(self._rows),
+                'terms': len(set(self._terms) | set(self._delta)),
+                'postings': len(self._docs) + self._delta_postings,
+                'posting_bytes': self._docs.nbytes + self._tfs.nbytes + self._delta_postings * 6,
+                'avg_length': self._total_length / len(self._rows) if self._rows else 0.0,
+            }
+
+    # ---------- persistence ----------
+
+    def _save_array(self, name: str, array_: np.ndarray):
+        tmp_path = os.path.join(self.path, name + '.tmp.npy')
+        np.save(tmp_path, array_)
+        os.replace(tmp_path, os.path.join(self.path, name + '.npy'))
+
+    def save(self):
+        """compact แล้วบันทึกลง path (posting lists เป็น .npy ที่เปิดแบบ memory-mapped ตอนโหลด)"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._compact()
+            os.makedirs(self.path, exist_ok=True)
+            self._save_array('offsets', self._offsets)
+            self._save_array('docs', self._docs)
+            self._save_array('tfs', self._tfs)
+            self._save_array('lengths', self._lengths[:self._size])
+
+            info = {
+                'k1': self.k1,
+                'b': self.b,
+                'count': self._size,
+                'terms': sorted(self._terms, key=self._terms.get),
+                'ids': self._ids,
+                'metadata': self._metadata,
+                'metadata_fields': self._stored_fields,
+                'saved_at': time.time(),
+            }
+            tmp_path = os.path.join(self.path, 'bm25.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, os.path.join(self.path, 'bm25.json'))
+            self._dirty = False
+
+    def _load(self):
+        with open(os.path.join(self.path, 'bm25.json'), 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        self.k1, self.b = info['k1'], info['b']
+        self._ids = info['ids']
+        self._metadata = info['metadata']
+        # index จากก่อนมี metadata_fields เก็บเฉพาะ COMPACT_METADATA_FIELDS
+        stored_fields = info.get('metadata_fields', COMPACT_METADATA_FIELDS)
+        self._stored_fields = tuple(stored_fields) if stored_fields is not None else None
+        self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        self._size = info['count']
+        self._terms = {term: i for i, term in enumerate(info['terms'])}
+        self._offsets = np.load(os.path.join(self.path, 'offsets.npy'))
+        self._docs = np.load(os.path.join(self.path, 'docs.npy'), mmap_mode='r')
+        self._tfs = np.load(os.path.join(self.path, 'tfs.npy'), mmap_mode='r')
+        self._lengths = np.load(os.path.join(self.path, 'lengths.npy'), mmap_mode='r')
+        self._alive = np.ones(self._size, dtype=bool)
+        self._total_length = int(self._lengths.sum())
+
+# BM25Index ที่เปิดแล้วใน process นี้ (upserter และ searcher ต้องใช้ object เดียวกัน)
+_shared_indexes: Dict[str, BM25Index] = {}
+_shared_lock = threading.Lock()
+
+def open_bm25_index(index_name: str, path: Optional[str] = None, create: bool = True) -> Optional[BM25Index]:
+    """เปิด BM25Index ของ index ที่ path หรือ BM25_INDEX_DIR/<index_name> (default .bm25_index)
+
+    create=False: คืน None ถ้ายังไม่มี index บน disk (ฝั่ง search ที่ไม่ได้ ingest แบบ lexical)
+    """
+    path = path or os.path.join(os.getenv('BM25_INDEX_DIR', '.bm25_index'), index_name)
+    with _shared_lock:
+        index = _shared_indexes.get(path)
+        if index is None:
+            if not create and not os.path.exists(os.path.join(path, 'bm25.json')):
+                return None
+            index = BM25Index(path)
+            _shared_indexes[path] = index
+    return index
+
+# ทดสอบ: สร้าง index จากข้อความจำลองแล้ววัดเวลา
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    words = ['การเรียนรู้ของเครื่อง', 'ฐานข้อมูล', 'ภาษาไทย', 'python', 'vector', 'search', 'ประสิทธิภาพ',
+             'ระบบ', 'ข้อมูล', 'model', 'ค้นหา', 'เอกสาร', 'กรุงเทพมหานคร', 'api', 'cache']
+    print("Tokens:", tokenize("ค้นหารหัสสินค้า SKU-1234 ในกรุงเทพมหานคร v2.1"))
+
+    count = 100000
+    index = BM25Index()
+    started = time.perf_counter()
+    batch = []
+    for i in range(count):
+        text = ' '.join(rng.choice(words, 40)) + f" SKU-{i:06d}"
+        batch.append((f"doc{i // 10}_{i % 10}", text, {'doc_id': f"doc{i // 10}", 'chunk_index': i % 10}))
+        if len(batch) == 1000:
+            index.add_many(batch)
+            batch = []
+    print(f"Indexed {count:,} chunks in {time.perf_counter() - started:.1f}s: {index.stats()}")
+
+    for query in ("SKU-004242", "กรุงเทพมหานคร ฐานข้อมูล", "python vector search"):
+        started = time.perf_counter()
+        results = index.search(query, top_k=3)
+        print(f"{query!r}: {(time.perf_counter() - started) * 1000:.1f} ms -> {results}")
@@ -0,0 +1,437 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from metadata_filter import MetadataIndex, filter_fields, match_metadata, required_values
+
+# จำนวน parameters สูงสุดต่อ query ของ SQLite
+_MAX_PARAMS = 900
+
+def text_hash(text: str) -> str:
+    """hash ของข้อความ chunk หลังตัดช่องว่างซ้ำและไม่สนตัวพิมพ์เล็ก/ใหญ่"""
+    normalized = ' '.join(text.split()).casefold()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+class _FilterRows:
+    """MetadataIndex ของแถวใน table หนึ่ง (ไม่รวม content) เลขแถวใน index ถูกใช้ซ้ำเมื่อ ID ถูกลบ"""
+
+    def __init__(self):
+        self.index = MetadataIndex()
+        self.slots: Dict[str, int] = {}
+        self.ids: List[Optional[str]] = []
+        self.metadata: List[Optional[Dict[str, Any]]] = []
+        self.free: List[int] = []
+
+    def add(self, vector_id: str, metadata: Dict[str, Any]):
+        self.remove(vector_id)
+        if self.free:
+            slot = self.free.pop()
+        else:
+            slot = len(self.ids)
+            self.ids.append(None)
+            self.metadata.append(None)
+        self.ids[slot] = vector_id
+        self.metadata[slot] = metadata
+        self.slots[vector_id] = slot
+        self.index.add(slot, metadata)
+
+    def remove(self, vector_id: str):
+        slot = self.slots.pop(vector_id, None)
+        if slot is not None:
+            self.index.remove(slot, self.metadata[slot])
+            self.ids[slot] = self.metadata[slot] = None
+            self.free.append(slot)
+
+    def find(self, filter_dict: Dict[str, Any]) -> List[str]:
+        mask = self.index.mask(filter_dict, len(self.ids))
+        return [self.ids[slot] for slot in np.flatnonzero(mask).tolist() if self.ids[slot] is not None]
+
+class ChunkDeduplicator:
+    """ตรวจ chunks ที่ซ้ำ/เกือบซ้ำก่อน upsert แล้วเก็บเป็น reference แทนการเป็น vector แยก
+
+    - ซ้ำตรงตัว: hash ของข้อความ (ตัดช่องว่างซ้ำ + casefold)
+    - เกือบซ้ำ: LSH แบบ random hyperplane (SimHash ของ embedding) แบ่งเป็น bands x rows bits
+      chunks ที่ตก bucket เดียวกันอย่างน้อยหนึ่ง band ถูกเทียบ cosine แบบ exact กับ threshold
+    - เทียบทั้งภายใน batch และกับ chunks ที่ ingest ไปแล้ว (canonical ทั้งหมดอยู่ใน SQLite ไม่ได้โหลดขึ้น memory)
+    - chunk ที่ซ้ำถูกบันทึกใน refs (vector_id -> canonical_id + metadata ของตัวเอง) ไม่ถูก upsert
+      ถ้า canonical ถูกลบ references ของมันถูกคืนเป็น vectors (ใช้ embedding ของ canonical เดิม)
+    - ตอนค้นหา VectorSearcher ใช้ search_references() / get_references() ให้ references ยังค้นเจอด้วย filter
+      และดึงเป็น chunk ข้างเคียงได้ (doc_id / document_type มี index ใน SQLite ส่วน filter อื่นใช้ MetadataIndex
+      ที่สร้างจาก table เมื่อใช้ครั้งแรก แก้ไขตามการเขียนของ instance นี้ และสร้างใหม่เมื่อ process อื่นเขียน DB)
+    """
+
+    def __init__(self, path: str = '.chunk_dedup.db', threshold: float = 0.95, bands: int = 16, rows: int = 16,
+                 seed: int = 0):
+        if not 0 < rows < 32:
+            raise ValueError("rows ต้องอยู่ระหว่าง 1 ถึง 31")
+        self.path = path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.seed = seed
+        self._planes = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS canonical (
+                vector_id TEXT PRIMARY KEY,
+                doc_id TEXT,
+                document_type TEXT,
+                text_hash TEXT NOT NULL,
+                vals BLOB NOT NULL,
+                metadata TEXT
+            );
+            CREATE INDEX IF NOT EXISTS canonical_text_hash ON canonical (text_hash);
+            CREATE INDEX IF NOT EXISTS canonical_doc_id ON canonical (doc_id);
+            CREATE INDEX IF NOT EXISTS canonical_document_type ON canonical (document_type);
+            CREATE TABLE IF NOT EXISTS buckets (bucket INTEGER NOT NULL, vector_id TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS buckets_bucket ON buckets (bucket);
+            CREATE INDEX IF NOT EXISTS buckets_vector_id ON buckets (vector_id);
+            CREATE TABLE IF NOT EXISTS refs (
+                vector_id TEXT PRIMARY KEY,
+                canonical_id TEXT NOT NULL,
+                doc_id TEXT,
+                document_type TEXT,
+                metadata TEXT
+            );
+            CREATE INDEX IF NOT EXISTS refs_canonical_id ON refs (canonical_id);
+            CREATE INDEX IF NOT EXISTS refs_doc_id ON refs (doc_id);
+            CREATE INDEX IF NOT EXISTS refs_document_type ON refs (document_type);
+        """)
+        self._conn.commit()
+        self._filter_rows: Dict[str, _FilterRows] = {}
+        self._data_version = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.chunks = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    # ---------- LSH ----------
+
+    def _bucket_keys(self, unit: np.ndarray) -> np.ndarray:
+        """bucket ของแต่ละ band (n x bands) ค่าไม่ซ้ำข้าม band: band * 2^rows + bits ของ band"""
+        if self._planes is None or self._planes.shape[0] != unit.shape[1]:
+            rng = np.random.default_rng(self.seed)
+            self._planes = rng.standard_normal((unit.shape[1], self.bands * self.rows)).astype(np.float32)
+        bits = (unit @ self._planes > 0).reshape(len(unit), self.bands, self.rows)
+        keys = bits.astype(np.int64) @ (np.int64(1) << np.arange(self.rows, dtype=np.int64))
+        return keys + (np.arange(self.bands, dtype=np.int64) << self.rows)
+
+    @staticmethod
+    def _filter_metadata(vector_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """metadata ที่ใช้ตรวจ filter (เติม doc_id จาก vector ID ถ้าไม่มี เหมือน compact metadata ใน index)"""
+        if 'doc_id' in metadata:
+            return metadata
+        return {**metadata, 'doc_id': vector_id.rpartition('_')[0]}
+
+    def _filter_index(self, table: str) -> _FilterRows:
+        """_FilterRows ของ table (สร้างใหม่ถ้า connection อื่นเขียน DB ตั้งแต่ครั้งก่อน: PRAGMA data_version เปลี่ยน)"""
+        version, = self._conn.execute("PRAGMA data_version").fetchone()
+        if version != self._data_version:
+            self._filter_rows = {}
+            self._data_version = version
+        rows = self._filter_rows.get(table)
+        if rows is None:
+            rows = self._filter_rows[table] = _FilterRows()
+            for vector_id, metadata in self._conn.execute(f"SELECT vector_id, metadata FROM {table}"):
+                rows.add(vector_id, self._index_metadata(vector_id, json.loads(metadata)))
+        return rows
+
+    def _index_metadata(self, vector_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        return self._filter_metadata(vector_id, {key: value for key, value in metadata.items() if key != 'content'})
+
+    def _matching_rows(self, table: str, columns: str, filter_dict: Dict[str, Any]) -> List[tuple]:
+        """แถวของ table ที่ metadata ตรงกับ filter (columns ต้องขึ้นต้นด้วย vector_id และจบด้วย metadata)
+
+        ถ้า filter บังคับค่าของ doc_id หรือ document_type จะเลือกแถวผ่าน index ของ column นั้นก่อน
+        ไม่งั้นหา IDs จาก MetadataIndex แล้วอ่านเฉพาะแถวเหล่านั้น (filter ที่ใช้ content ต้องอ่านทั้ง table)
+        """
+        for field in ('doc_id', 'document_type'):
+            values = required_values(filter_dict, field)
+            if values is not None:
+                rows = self._select(f"SELECT {columns} FROM {table} WHERE {field} IN ({{}})", values)
+                break
+        else:
+            if 'content' not in filter_fields(filter_dict):
+                ids = self._filter_index(table).find(filter_dict)
+                return self._select(f"SELECT {columns} FROM {table} WHERE vector_id IN ({{}})", ids)
+            rows = self._conn.execute(f"SELECT {columns} FROM {table}").fetchall()
+        return [row for row in rows
+                if match_metadata(self._filter_metadata(row[0], json.loads(row[-1])), filter_dict)]
+
+    def _update_filter_index(self, table: str, added: Iterable[Tuple[str, Dict[str, Any]]] = (),
+                             removed: Iterable[str] = ()):
+        """แก้ MetadataIndex ของ table (ถ้าสร้างไว้แล้ว) ตามแถวที่ instance นี้เพิ่ม/ลบ"""
+        rows = self._filter_rows.get(table)
+        if rows is None:
+            return
+        for vector_id in removed:
+            rows.remove(vector_id)
+        for vector_id, metadata in added:
+            rows.add(vector_id, self._index_metadata(vector_id, metadata))
+
+    def _select(self, sql: str, values: List) -> List[tuple]:
+        """SELECT ... WHERE column IN (values) ทีละ _MAX_PARAMS ค่า (sql มี {} แทน placeholders)"""
+        rows = []
+        for i in range(0, len(values), _MAX_PARAMS):
+            batch = values[i:i + _MAX_PARAMS]
+            rows.extend(self._conn.execute(sql.format(','.join('?' * len(batch))), batch).fetchall())
+        return rows
+
+    # ---------- dedup ----------
+
+    def deduplicate(self, vectors: List[tuple]) -> Tuple[List[tuple], List[str]]:
+        """แยก (vector_id, values, metadata) เป็น vectors ที่ต้อง upsert กับ references
+
+        คืน (vectors ที่ต้อง upsert, IDs ที่เคยเป็น vector ใน index แต่ตอนนี้ซ้ำกับ chunk อื่น ต้องลบออกจาก index)
+        chunk ที่ ingest ซ้ำ (ID เดิม) ถูกตรวจใหม่ตามเนื้อหาปัจจุบัน
+        """
+        if not vectors:
+            return [], []
+        with self._lock:
+            incoming = [vector_id for vector_id, _, _ in vectors]
+            was_canonical = {vector_id for vector_id, in self._select(
+                "SELECT vector_id FROM canonical WHERE vector_id IN ({})", incoming)}
+            # ลบสถานะเดิมของ IDs ที่เข้ามา references ของ canonical เดิมถูกตรวจใหม่พร้อม batch นี้
+            items = list(vectors) + self._forget_locked(incoming)
+
+            values = np.stack([np.asarray(values, dtype=np.float32) for _, values, _ in items])
+            unit = values / np.maximum(np.linalg.norm(values, axis=1, keepdims=True), 1e-12)
+            hashes = [text_hash(metadata.get('content', '')) for _, _, metadata in items]
+            keys = self._bucket_keys(unit)
+
+            known = dict(self._select("SELECT text_hash, vector_id FROM canonical WHERE text_hash IN ({})",
+                                      list(set(hashes))))
+            stored = {}
+            for bucket, vector_id in self._select("SELECT bucket, vector_id FROM buckets WHERE bucket IN ({})",
+                                                  np.unique(keys).tolist()):
+                stored.setdefault(bucket, []).append(vector_id)
+            candidate_ids = list({vector_id for ids in stored.values() for vector_id in ids})
+            stored_units = {
+                vector_id: np.frombuffer(vals, dtype=np.float32)
+                for vector_id, vals in self._select("SELECT vector_id, vals FROM canonical WHERE vector_id IN ({})",
+                                                    candidate_ids)
+            }
+            for vector_id, vector in stored_units.items():
+                stored_units[vector_id] = vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+            unique, demoted, canonical_rows, bucket_rows, ref_rows = [], [], [], [], []
+            batch_hashes: Dict[str, str] = {}
+            batch_buckets: Dict[int, List[int]] = {}
+            for i, (vector_id, vector, metadata) in enumerate(items):
+                canonical_id = known.get(hashes[i]) or batch_hashes.get(hashes[i])
+                if canonical_id is not None:
+                    kind = 'exact'
+                else:
+                    canonical_id = self._nearest(unit, i, keys[i], stored, stored_units, batch_buckets, items)
+                    kind = 'near'
+                # references เดิมที่ถูกตรวจใหม่ (i >= len(vectors)) ไม่นับเป็น chunk ของรอบนี้
+                if canonical_id is not None and i < len(vectors):
+                    if kind == 'exact':
+                        self.exact_duplicates += 1
+                    else:
+                        self.near_duplicates += 1
+
+                if canonical_id is None:
+                    unique.append((vector_id, vector, metadata))
+                    batch_hashes.setdefault(hashes[i], vector_id)
+                    for bucket in keys[i].tolist():
+                        batch_buckets.setdefault(bucket, []).append(i)
+                        bucket_rows.append((bucket, vector_id))
+                    summary = {key: value for key, value in metadata.items() if key != 'content'}
+                    canonical_rows.append((vector_id, *self._index_columns(vector_id, metadata), hashes[i],
+                                           values[i].tobytes(), json.dumps(summary, ensure_ascii=False, default=str)))
+                else:
+                    ref_rows.append((vector_id, canonical_id, *self._index_columns(vector_id, metadata),
+                                     json.dumps(metadata, ensure_ascii=False, default=str)))
+                    if vector_id in was_canonical:
+                        demoted.append(vector_id)
+
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO canonical VALUES (?, ?, ?, ?, ?, ?)", canonical_rows)
+                self._conn.executemany("INSERT INTO buckets VALUES (?, ?)", bucket_rows)
+                self._conn.executemany("INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?, ?)", ref_rows)
+            # อ่านกลับจาก JSON ที่เขียนลง DB ให้ตรงกับ index ที่สร้างจาก table
+            self._update_filter_index('canonical', added=[(row[0], json.loads(row[-1])) for row in canonical_rows])
+            self._update_filter_index('refs', added=[(row[0], json.loads(row[-1])) for row in ref_rows])
+            self.chunks += len(vectors)
+        return unique, demoted
+
+    @staticmethod
+    def _index_columns(vector_id: str, metadata: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        return metadata.get('doc_id') or vector_id.rpartition('_')[0], metadata.get('document_type')
+
+    def _nearest(self, unit: np.ndarray, i: int, keys: np.ndarray, stored: Dict[int, List[str]],
+                 stored_units: Dict[str, np.ndarray], batch_buckets: Dict[int, List[int]],
+                 items: List[tuple]) -> Optional[str]:
+        """canonical ที่ cosine >= threshold และใกล้ที่สุดใน bucket เดียวกัน (ของเดิมหรือใน batch นี้)"""
+        stored_ids = list({vector_id for bucket in keys.tolist() for vector_id in stored.get(bucket, ())})
+        batch_rows = list({row for bucket in keys.tolist() for row in batch_buckets.get(bucket, ())})
+        best_id, best_score = None, self.threshold
+        if stored_ids:
+            scores = np.stack([stored_units[vector_id] for vector_id in stored_ids]) @ unit[i]
+            j = int(np.argmax(scores))
+            if scores[j] >= best_score:
+                best_id, best_score = stored_ids[j], scores[j]
+        if batch_rows:
+            scores = unit[batch_rows] @ unit[i]
+            j = int(np.argmax(scores))
+            if scores[j] >= best_score:
+                best_id = items[batch_rows[j]][0]
+        return best_id
+
+    # ---------- delete ----------
+
+    def _forget_locked(self, ids: List[str]) -> List[tuple]:
+        """ลบ IDs ออกจาก canonical/refs คืน references ของ canonical ที่ถูกลบ (ที่ไม่ได้อยู่ใน IDs เอง)
+
+        references ที่คืนถูกลบออกด้วย และได้ embedding ของ canonical เดิมไปใช้เป็น vector ของตัวเอง
+        """
+        forgotten = set(ids)
+        canonical = {
+            vector_id: np.frombuffer(vals, dtype=np.float32)
+            for vector_id, vals in self._select("SELECT vector_id, vals FROM canonical WHERE vector_id IN ({})", ids)
+        }
+        orphans = [
+            (vector_id, canonical[canonical_id], json.loads(metadata))
+            for vector_id, canonical_id, metadata in self._select(
+                "SELECT vector_id, canonical_id, metadata FROM refs WHERE canonical_id IN ({})", list(canonical))
+            if vector_id not in forgotten
+        ]
+        removed = list(ids) + [vector_id for vector_id, _, _ in orphans]
+        with self._conn:
+            for i in range(0, len(removed), _MAX_PARAMS):
+                batch = removed[i:i + _MAX_PARAMS]
+                placeholders = ','.join('?' * len(batch))
+                self._conn.execute(f"DELETE FROM canonical WHERE vector_id IN ({placeholders})", batch)
+                self._conn.execute(f"DELETE FROM buckets WHERE vector_id IN ({placeholders})", batch)
+                self._conn.execute(f"DELETE FROM refs WHERE vector_id IN ({placeholders})", batch)
+            canonical_ids = list(canonical)
+            for i in range(0, len(canonical_ids), _MAX_PARAMS):
+                batch = canonical_ids[i:i + _MAX_PARAMS]
+                self._conn.execute(f"DELETE FROM refs WHERE canonical_id IN ({','.join('?' * len(batch))})", batch)
+        # refs ที่ถูกลบตาม canonical_id คือ orphans (อยู่ใน removed แล้ว) หรือ IDs ที่ถูกลบเอง
+        for table in ('canonical', 'refs'):
+            self._update_filter_index(table, removed=removed)
+        return orphans
+
+    def forget(self, ids: List[str]) -> List[tuple]:
+        """ลบ chunks ตาม ID คืน references ที่ไม่มี canonical แล้ว เป็น (vector_id, values, metadata) ที่ต้อง upsert ใหม่"""
+        with self._lock:
+            return self._forget_locked(list(ids))
+
+    def forget_matching(self, filter_dict: Dict[str, Any]) -> List[tuple]:
+        """เหมือน forget() สำหรับ chunks ที่ metadata ตรงกับ filter (ใช้คู่กับ delete_by_filter)"""
+        with self._lock:
+            ids = [row[0] for table in ('canonical', 'refs')
+                   for row in self._matching_rows(table, 'vector_id, metadata', filter_dict)]
+            return self._forget_locked(ids)
+
+    # ---------- query ----------
+
+    def references(self, canonical_ids: Iterable[str]) -> Dict[str, List[str]]:
+        """canonical_id -> IDs ของ chunks ที่ซ้ำกับมัน"""
+        found: Dict[str, List[str]] = {}
+        with self._lock:
+            for vector_id, canonical_id in self._select(
+                    "SELECT vector_id, canonical_id FROM refs WHERE canonical_id IN ({})", list(canonical_ids)):
+                found.setdefault(canonical_id, []).append(vector_id)
+        return found
+
+    def get_references(self, ids: Iterable[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """vector_id -> (canonical_id, metadata) ของ IDs ที่เป็น reference (ไม่มีอยู่ใน index)"""
+        with self._lock:
+            return {
+                vector_id: (canonical_id, json.loads(metadata))
+                for vector_id, canonical_id, metadata in self._select(
+                    "SELECT vector_id, canonical_id, metadata FROM refs WHERE vector_id IN ({})", list(ids))
+            }
+
+    def search_references(self, query_vector, top_k: int,
+                          filter_dict: Dict[str, Any]) -> List[Tuple[float, str, str, Dict[str, Any]]]:
+        """references ที่ตรงกับ filter แต่ canonical ของมันไม่ตรง (index จึงกรองทิ้งไป)
+
+        score คือ cosine ระหว่าง query กับ embedding ของ canonical
+        คืน [(score, vector_id, canonical_id, metadata)] เรียงตาม score ไม่เกิน top_k รายการ
+        """
+        with self._lock:
+            refs = self._matching_rows('refs', 'vector_id, canonical_id, metadata', filter_dict)
+            if not refs:
+                return []
+            canonical = self._select("SELECT vector_id, vals, metadata FROM canonical WHERE vector_id IN ({})",
+                                     list({canonical_id for _, canonical_id, _ in refs}))
+        # canonical ที่ตรงกับ filter เองอยู่ในผลลัพธ์จาก index แล้ว (เป็นตัวแทนของ references)
+        canonical = [(vector_id, vals) for vector_id, vals, metadata in canonical
+                     if not match_metadata(self._filter_metadata(vector_id, json.loads(metadata)), filter_dict)]
+        if not canonical:
+            return []
+        vectors = np.stack([np.frombuffer(vals, dtype=np.float32) for _, vals in canonical])
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        scores = vectors @ (query_vector / max(float(np.linalg.norm(query_vector)), 1e-12))
+        score_of = {vector_id: float(score) for (vector_id, _), score in zip(canonical, scores)}
+        found = [(score_of[canonical_id], vector_id, canonical_id, json.loads(metadata))
+                 for vector_id, canonical_id, metadata in refs if canonical_id in score_of]
+        found.sort(key=lambda item: -item[0])
+        return found[:top_k]
+
+    def stats(self) -> Dict[str, Any]:
+        """สถิติของรอบนี้ (ตั้งแต่ reset_stats) และจำนวน canonical/references ทั้งหมด"""
+        with self._lock:
+            canonical, = self._conn.execute("SELECT COUNT(*) FROM canonical").fetchone()
+            references, = self._conn.execute("SELECT COUNT(*) FROM refs").fetchone()
+        duplicates = self.exact_duplicates + self.near_duplicates
+        return {
+            'chunks': self.chunks,
+            'exact_duplicates': self.exact_duplicates,
+            'near_duplicates': self.near_duplicates,
+            'dedup_ratio': duplicates / self.chunks if self.chunks else 0.0,
+            'canonical': canonical,
+            'references': references,
+        }
+
+def open_chunk_dedup(index_name: str, path: Optional[str] = None, threshold: Optional[float] = None,
+                     create: bool = True) -> Optional[ChunkDeduplicator]:
+    """ChunkDeduplicator ของ index ที่ path หรือ CHUNK_DEDUP_DIR/<index_name>.db (default .chunk_dedup)
+
+    threshold: None = ใช้ DEDUP_THRESHOLD (default 0.95)
+    create=False: คืน None ถ้ายังไม่มีไฟล์ (ฝั่ง search ของ index ที่ไม่ได้ ingest แบบ dedup)
+    """
+    if path is None:
+        path = os.path.join(os.getenv('CHUNK_DEDUP_DIR', '.chunk_dedup'), f"{index_name}.db")
+    if not create and not os.path.exists(path):
+        return None
+    if threshold is None:
+        threshold = float(os.getenv('DEDUP_THRESHOLD', '0.95'))
+    return ChunkDeduplicator(path, threshold=threshold)
+
+# ทดสอบ: chunks ซ้ำตรงตัว, เกือบซ้ำ และไม่ซ้ำ
+if __name__ == "__main__":
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=(4, 384)).astype(np.float32)
+    vectors = [
+        ('a_0', base[0], {'content': 'Copyright 2024 Example Co. All rights reserved.'}),
+        ('b_0', base[0], {'content': 'copyright 2024  Example Co. All rights reserved.'}),
+        ('c_0', base[1], {'content': 'Python เป็นภาษาโปรแกรมมิ่งระดับสูง'}),
+        ('d_0', base[1] + rng.normal(scale=0.05, size=384).astype(np.float32), {'content': 'Python เป็นภาษาระดับสูง'}),
+        ('e_0', base[2], {'content': 'Machine learning คือ...'}),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        dedup = ChunkDeduplicator(os.path.join(directory, 'dedup.db'))
+        unique, demoted = dedup.deduplicate(vectors)
+        print(f"upsert: {[vector_id for vector_id, _, _ in unique]}, demoted: {demoted}")
+        print(f"references: {dedup.references(['a_0', 'c_0'])}")
+        print(f"stats: {dedup.stats()}")
+        print(f"forget a_0 -> restore {[vector_id for vector_id, _, _ in dedup.forget(['a_0'])]}")
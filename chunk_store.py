@@ -0,0 +1,184 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from metadata_filter import match_metadata, required_values
+
+# field ที่เก็บใน index ในโหมด compact (ใช้ filter ได้) ที่เหลือเก็บใน ChunkStore
+COMPACT_METADATA_FIELDS = ('doc_id', 'chunk_index', 'document_type', 'title')
+
+# จำนวน parameters สูงสุดต่อ query ของ SQLite
+_MAX_PARAMS = 900
+
+def split_vector_id(vector_id: str):
+    """'{doc_id}_{chunk_index}' -> (doc_id, chunk_index)"""
+    doc_id, _, chunk_index = vector_id.rpartition('_')
+    return doc_id, int(chunk_index)
+
+def compact_vector_metadata(vector_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """ตัด metadata ให้เหลือเฉพาะ field ขนาดเล็กที่ใช้ filter"""
+    compact = {field: metadata[field] for field in COMPACT_METADATA_FIELDS if field in metadata}
+    compact.setdefault('doc_id', split_vector_id(vector_id)[0])
+    return compact
+
+class ChunkStore:
+    """เก็บข้อความของ chunks และ field ของเอกสารใน SQLite แทนการเก็บใน metadata ของ index
+
+    - documents: doc_id -> title, source_url, document_type, created_at (เก็บครั้งเดียวต่อเอกสาร)
+    - chunks: vector_id -> doc_id, chunk_index, total_chunks, content, char_start, char_end
+    """
+
+    def __init__(self, path: str = '.chunk_store.db'):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                title TEXT,
+                source_url TEXT,
+                document_type TEXT,
+                created_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                vector_id TEXT PRIMARY KEY,
+                doc_id TEXT NOT NULL,
+                chunk_index INTEGER,
+                total_chunks INTEGER,
+                content TEXT,
+                char_start INTEGER,
+                char_end INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks (doc_id);
+            CREATE INDEX IF NOT EXISTS documents_type ON documents (document_type);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        """connection ของ thread นี้ (sqlite3 connection ใช้ข้าม thread ไม่ได้)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put_vectors(self, vectors: Iterable[tuple]):
+        """บันทึก (vector_id, values, metadata) โดยใช้ metadata แบบเต็มจาก DocumentVectorizer"""
+        documents = {}
+        chunks = []
+        for vector_id, _, metadata in vectors:
+            doc_id = metadata.get('doc_id') or split_vector_id(vector_id)[0]
+            documents[doc_id] = (
+                doc_id,
+                metadata.get('title', ''),
+                metadata.get('source_url', ''),
+                metadata.get('document_type', ''),
+                metadata.get('created_at', ''),
+            )
+            chunks.append((
+                vector_id,
+                doc_id,
+                metadata.get('chunk_index'),
+                metadata.get('total_chunks'),
+                metadata.get('content', ''),
+                metadata.get('char_start'),
+                metadata.get('char_end'),
+            ))
+
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)", documents.values())
+            conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?)", chunks)
+
+    def get_many(self, vector_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """metadata แบบเต็ม (เหมือนที่เคยเก็บใน index) ของหลาย vectors ใน query เดียวต่อ 900 IDs"""
+        found = {}
+        conn = self._conn()
+        for i in range(0, len(vector_ids), _MAX_PARAMS):
+            batch = vector_ids[i:i + _MAX_PARAMS]
+            placeholders = ','.join('?' * len(batch))
+            rows = conn.execute(
+                "SELECT c.vector_id, c.doc_id, c.chunk_index, c.total_chunks, c.content, c.char_start, c.char_end, "
+                "d.title, d.source_url, d.document_type, d.created_at "
+                f"FROM chunks c LEFT JOIN documents d ON d.doc_id = c.doc_id WHERE c.vector_id IN ({placeholders})",
+                batch
+            ).fetchall()
+            for (vector_id, doc_id, chunk_index, total_chunks, content, char_start, char_end,
+                 title, source_url, document_type, created_at) in rows:
+                metadata = {
+                    'doc_id': doc_id,
+                    'title': title or '',
+                    'content': content or '',
+                    'chunk_index': chunk_index,
+                    'total_chunks': total_chunks,
+                    'source_url': source_url or '',
+                    'document_type': document_type or '',
+                    'created_at': created_at or '',
+                }
+                if char_start is not None:
+                    metadata['char_start'], metadata['char_end'] = char_start, char_end
+                found[vector_id] = metadata
+        return found
+
+    def find(self, filter_dict: Dict[str, Any]) -> List[str]:
+        """vector IDs ที่ metadata แบบ compact (ที่ index เก็บ) ตรงกับ filter
+
+        ใช้หา chunks ที่ index.delete(filter=...) ลบไป ถ้า filter บังคับค่าของ doc_id หรือ
+        document_type จะเลือกผ่าน index ของ column นั้น ไม่งั้นต้องอ่านทั้ง table
+        """
+        sql = ("SELECT c.vector_id, c.doc_id, c.chunk_index, d.document_type, d.title "
+               "FROM chunks c LEFT JOIN documents d ON d.doc_id = c.doc_id")
+        conn = self._conn()
+        for column, field in (('c.doc_id', 'doc_id'), ('d.document_type', 'document_type')):
+            values = required_values(filter_dict, field)
+            if values is not None:
+                rows = []
+                for i in range(0, len(values), _MAX_PARAMS):
+                    batch = values[i:i + _MAX_PARAMS]
+                    rows.extend(conn.execute(f"{sql} WHERE {column} IN ({','.join('?' * len(batch))})",
+                                             batch).fetchall())
+                break
+        else:
+            rows = conn.execute(sql).fetchall()
+
+        found = []
+        for vector_id, doc_id, chunk_index, document_type, title in rows:
+            fields = zip(COMPACT_METADATA_FIELDS, (doc_id, chunk_index, document_type, title))
+            metadata = {field: value for field, value in fields if value is not None}
+            if match_metadata(metadata, filter_dict):
+                found.append(vector_id)
+        return found
+
+    def delete(self, vector_ids: List[str]):
+        """ลบ chunks และเอกสารที่ไม่เหลือ chunk แล้ว"""
+        doc_ids = list({split_vector_id(vector_id)[0] for vector_id in vector_ids})
+        conn = self._conn()
+        with conn:
+            for i in range(0, len(vector_ids), _MAX_PARAMS):
+                batch = vector_ids[i:i + _MAX_PARAMS]
+                conn.execute(f"DELETE FROM chunks WHERE vector_id IN ({','.join('?' * len(batch))})", batch)
+            for i in range(0, len(doc_ids), _MAX_PARAMS):
+                batch = doc_ids[i:i + _MAX_PARAMS]
+                conn.execute(
+                    f"DELETE FROM documents WHERE doc_id IN ({','.join('?' * len(batch))}) "
+                    "AND NOT EXISTS (SELECT 1 FROM chunks WHERE chunks.doc_id = documents.doc_id)",
+                    batch
+                )
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+def open_chunk_store(path: Optional[str] = None, create: bool = True) -> Optional[ChunkStore]:
+    """เปิด ChunkStore ที่ path หรือ CHUNK_STORE_PATH (default .chunk_store.db)
+
+    create=False: คืน None ถ้ายังไม่มีไฟล์ (ฝั่ง search ที่ index ไม่ได้อยู่ในโหมด compact)
+    """
+    path = path or os.getenv('CHUNK_STORE_PATH', '.chunk_store.db')
+    if not create and not os.path.exists(path):
+        return None
+    return ChunkStore(path)
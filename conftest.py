@@ -0,0 +1,111 @@
+import uuid
+
+import numpy as np
+import pytest
+
+from data_upserter import PineconeDataUpserter
+from fake_index import FakeIndex
+
+class StubEmbedder:
+    """แทน EmbeddingModel ใน tests โดยไม่ต้องโหลดโมเดล
+
+    embedding = hashing ของ character trigrams (normalize แล้ว) ข้อความที่คล้ายกันจึงได้ vector ใกล้กัน
+    """
+
+    backend = 'torch'
+    num_threads = None
+    cache = None
+    loaded = True
+
+    def __init__(self, dim: int = 384):
+        self.embedding_dim = dim
+        self.model_name = f"stub-trigram-{dim}"
+
+    def load(self):
+        return self
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        embeddings = np.zeros((len(texts), self.embedding_dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+            if len(codes) < 3:
+                codes = np.pad(codes, (0, 3 - len(codes)))
+            buckets = (codes[:-2] * 1000003 ^ codes[1:-1] * 8191 ^ codes[2:]) % self.embedding_dim
+            embeddings[i] = np.bincount(buckets.astype(np.int64), minlength=self.embedding_dim)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+    def batch_encode(self, texts, batch_size=32) -> np.ndarray:
+        return self.encode(texts)
+
+    def encode_packed(self, texts, batch_size=64, show_progress_bar=False) -> np.ndarray:
+        return self.encode(texts)
+
+    def encode_single(self, text):
+        return self.encode([text])[0].tolist()
+
+    def cache_stats(self):
+        return None
+
+    def flush_cache(self):
+        pass
+
+@pytest.fixture(autouse=True)
+def isolated_paths(tmp_path, monkeypatch):
+    """ไฟล์ที่ใช้ path default (journal, BM25, dedup, chunk store, cache) อยู่ใน tmp_path ของแต่ละ test"""
+    monkeypatch.chdir(tmp_path)
+    for name in ('RESULT_CACHE_PATH', 'CHUNK_STORE_PATH', 'METRICS_DUMP', 'DEDUP_THRESHOLD', 'VECTOR_BACKEND'):
+        monkeypatch.delenv(name, raising=False)
+    for name in ('BM25_INDEX_DIR', 'CHUNK_DEDUP_DIR', 'INGEST_JOURNAL_DIR', 'EMBEDDING_CACHE_DIR', 'ONNX_CACHE_DIR',
+                 'LOCAL_INDEX_DIR'):
+        monkeypatch.setenv(name, str(tmp_path / name.lower()))
+
+@pytest.fixture
+def make_fake_index():
+    """สร้าง FakeIndex ที่ไม่มี latency เทียมเป็นค่าเริ่มต้น (ส่ง latency/throttle_rate/seed เพื่อจำลอง network)"""
+    def make(**kwargs):
+        kwargs.setdefault('latency', 0)
+        kwargs.setdefault('jitter', 0)
+        return FakeIndex(**kwargs)
+    return make
+
+@pytest.fixture
+def fake_index(make_fake_index):
+    return make_fake_index()
+
+@pytest.fixture
+def index_name():
+    # BM25 index / result cache ถูกแชร์ตามชื่อ index ภายใน process ชื่อจึงต้องไม่ซ้ำกันระหว่าง tests
+    return f"test-{uuid.uuid4().hex[:8]}"
+
+@pytest.fixture
+def embedder():
+    return StubEmbedder()
+
+@pytest.fixture
+def make_upserter(index_name, fake_index, embedder):
+    """สร้าง PineconeDataUpserter บน FakeIndex + StubEmbedder (StubEmbedder ไม่มี tokenizer จึงนับตัวอักษร)"""
+    def make(**kwargs):
+        kwargs.setdefault('index', fake_index)
+        kwargs.setdefault('embedder', embedder)
+        return PineconeDataUpserter(index_name, token_aware=False, **kwargs)
+    return make
+
+def make_documents(count, prefix='d', sentences=20, **fields):
+    """เอกสารที่แต่ละฉบับมีเนื้อหาต่างกันพอที่ StubEmbedder จะไม่มองว่าซ้ำกัน"""
+    return [
+        {
+            'id': f"{prefix}{i}",
+            'title': f"{prefix} title {i}",
+            'content': ' '.join(f"Document {prefix}{i} sentence {j} mentions item {i * 31 + j * 7}."
+                                for j in range(sentences)),
+            **fields,
+        }
+        for i in range(count)
+    ]
+
+@pytest.fixture
+def documents():
+    return make_documents
@@ -1,64 +1,124 @@
-import pandas as pd
+import argparse
+import logging
 import json
 import csv
-from typing import List, Dict, Any
+import sys
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 from pathlib import Path
 
 from data_upserter import PineconeDataUpserter
+from json_stream import iter_json_documents
+from sync_manifest import SyncManifest
+from ingest_journal import open_journal
+from metrics import registry, serve_metrics, profile_run, get_logger, log_event
+
+logger = get_logger('importer')
 
 class FileDataImporter:
-    def __init__(self, index_name="rag-documents"):
-        self.upserter = PineconeDataUpserter(index_name)
-    
-    def import_from_csv(self, csv_file: str, encoding='utf-8'):
-        """Import ข้อมูลจาก CSV file"""
-        print(f"Importing from CSV: {csv_file}")
-        
-        df = pd.read_csv(csv_file, encoding=encoding)
-        documents = []
+    def __init__(self, index_name="rag-documents", manifest_path='.sync_manifest.json', workers=1, upserter=None,
+                 resumable=False, dedup=False):
+        """workers > 1: chunk + encode ด้วย process pool ตามจำนวน workers
         
-        for idx, row in df.iterrows():
-            doc = {
-                'id': f"csv_{idx}",
-                'title': row.get('title', f"Document {idx}"),
-                'content': row.get('content', ''),
-                'source_url': row.get('source_url', ''),
-                'type': row.get('type', 'csv_import'),
-                'created_at': str(pd.Timestamp.now())
-            }
-            documents.append(doc)
-        
-        self.upserter.upsert_documents(documents)
-        return len(documents)
+        upserter: ส่ง PineconeDataUpserter ที่สร้างไว้แล้วเข้ามาใช้แทนได้
+        resumable: import แบบไม่ incremental บันทึกความคืบหน้าลง journal (INGEST_JOURNAL_DIR)
+        ถ้า job หยุดกลางทาง การ import แหล่งเดิมซ้ำจะทำต่อจากจุดเดิมโดยไม่ encode ใหม่
+        dedup: เก็บ chunks ที่ซ้ำ/เกือบซ้ำเป็น reference แทนการ upsert (CHUNK_DEDUP_DIR, DEDUP_THRESHOLD)
+        """
+        self.upserter = upserter or PineconeDataUpserter(index_name, workers=workers, dedup=dedup)
+        self.manifest_path = manifest_path
+        self.resumable = resumable
     
-    def import_from_json(self, json_file: str, encoding='utf-8'):
-        """Import ข้อมูลจาก JSON file"""
-        print(f"Importing from JSON: {json_file}")
-        
-        with open(json_file, 'r', encoding=encoding) as f:
-            data = json.load(f)
-        
-        # Handle different JSON structures
-        if isinstance(data, list):
-            documents = data
-        elif isinstance(data, dict) and 'documents' in data:
-            documents = data['documents']
+    def _ingest(self, documents: Iterable[Dict[str, Any]], incremental=False, source=None,
+                manifest: Optional[SyncManifest] = None, **sync_kwargs):
+        """ส่งเอกสาร (list หรือ generator) เข้า upserter คืนจำนวนเอกสารที่ประมวลผล"""
+        if incremental:
+            manifest = manifest or SyncManifest(self.manifest_path)
+            result = self.upserter.sync_documents(
+                documents, manifest, source=source, prune_missing=True, **sync_kwargs
+            )
         else:
-            documents = [data]
+            # incremental sync ทำต่อได้อยู่แล้วผ่าน manifest ส่วน bulk import ใช้ journal
+            journal = open_journal(self.upserter.index_name, source) if self.resumable and source else None
+            result = self.upserter.upsert_stream(documents, journal=journal)
+        return result['documents']
+    
+    def iter_csv_documents(self, csv_file: str, encoding='utf-8', chunksize=1000) -> Iterator[Dict[str, Any]]:
+        """อ่าน CSV ทีละ chunksize แถว (ไม่โหลดทั้งไฟล์)"""
+        import pandas as pd  # import เฉพาะตอนอ่าน CSV (pandas ใช้เวลา import นาน)
         
-        # Ensure required fields
-        for i, doc in enumerate(documents):
-            if 'id' not in doc:
-                doc['id'] = f"json_{i}"
-            if 'created_at' not in doc:
-                doc['created_at'] = str(pd.Timestamp.now())
+        created_at = str(datetime.now())
+        for frame in pd.read_csv(csv_file, encoding=encoding, chunksize=chunksize):
+            for idx, row in frame.iterrows():
+                yield {
+                    'id': f"csv_{idx}",
+                    'title': row.get('title', f"Document {idx}"),
+                    'content': row.get('content', ''),
+                    'source_url': row.get('source_url', ''),
+                    'type': row.get('type', 'csv_import'),
+                    'created_at': created_at
+                }
+    
+    def import_from_csv(self, csv_file: str, encoding='utf-8', chunksize=1000, incremental=False):
+        """Import ข้อมูลจาก CSV file แบบ streaming"""
+        log_event(logger, f"Importing from CSV: {csv_file}", event='import_started', source=csv_file)
+        return self._ingest(
+            self.iter_csv_documents(csv_file, encoding, chunksize),
+            incremental=incremental,
+            source=f"csv:{Path(csv_file).resolve()}"
+        )
+    
+    def iter_json_documents(self, json_file: str, encoding='utf-8') -> Iterator[Dict[str, Any]]:
+        """อ่าน JSON แบบ incremental ทีละเอกสาร (รองรับ list, {'documents': [...]} และ object เดียว)"""
+        created_at = str(datetime.now())
+        with open(json_file, 'r', encoding=encoding) as f:
+            for i, doc in enumerate(iter_json_documents(f)):
+                # Ensure required fields
+                if 'id' not in doc:
+                    doc['id'] = f"json_{i}"
+                if 'created_at' not in doc:
+                    doc['created_at'] = created_at
+                yield doc
+    
+    def import_from_json(self, json_file: str, encoding='utf-8', incremental=False):
+        """Import ข้อมูลจาก JSON file แบบ streaming
         
-        self.upserter.upsert_documents(documents)
-        return len(documents)
+        incremental=True: upsert เฉพาะเอกสารที่ใหม่/เปลี่ยนตาม manifest และลบ chunks ที่ไม่ใช้แล้ว
+        """
+        log_event(logger, f"Importing from JSON: {json_file}", event='import_started', source=json_file)
+        return self._ingest(
+            self.iter_json_documents(json_file, encoding),
+            incremental=incremental,
+            source=f"json:{Path(json_file).resolve()}"
+        )
+    
+    def iter_jsonl_documents(self, jsonl_file: str, encoding='utf-8') -> Iterator[Dict[str, Any]]:
+        """อ่าน JSON Lines ทีละบรรทัด (หนึ่งเอกสารต่อบรรทัด)"""
+        created_at = str(datetime.now())
+        with open(jsonl_file, 'r', encoding=encoding) as f:
+            for line_no, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+                doc = json.loads(line)
+                if 'id' not in doc:
+                    doc['id'] = f"jsonl_{line_no}"
+                if 'created_at' not in doc:
+                    doc['created_at'] = created_at
+                yield doc
+    
+    def import_from_jsonl(self, jsonl_file: str, encoding='utf-8', incremental=False):
+        """Import ข้อมูลจาก JSON Lines file แบบ streaming"""
+        log_event(logger, f"Importing from JSONL: {jsonl_file}", event='import_started', source=jsonl_file)
+        return self._ingest(
+            self.iter_jsonl_documents(jsonl_file, encoding),
+            incremental=incremental,
+            source=f"jsonl:{Path(jsonl_file).resolve()}"
+        )
     
     def import_from_txt(self, txt_file: str, title: str = None, encoding='utf-8'):
         """Import ข้อมูลจาก text file"""
-        print(f"Importing from TXT: {txt_file}")
+        log_event(logger, f"Importing from TXT: {txt_file}", event='import_started', source=txt_file)
         
         with open(txt_file, 'r', encoding=encoding) as f:
             content = f.read()
@@ -69,45 +129,134 @@ class FileDataImporter:
             'content': content,
             'source_url': f"file://{txt_file}",
             'type': 'text_file',
-            'created_at': str(pd.Timestamp.now())
+            'created_at': str(datetime.now())
         }
         
         self.upserter.upsert_documents([doc])
         return 1
     
-    def import_from_folder(self, folder_path: str, file_types=['.txt', '.md']):
-        """Import ข้อมูลจาก folder ทั้งหมด"""
-        print(f"Importing from folder: {folder_path}")
+    def iter_folder_documents(self, folder_path: str, file_types=['.txt', '.md'],
+                              manifest: Optional[SyncManifest] = None,
+                              unchanged_ids: Optional[List[str]] = None,
+                              file_stats: Optional[Dict[str, tuple]] = None) -> Iterator[Dict[str, Any]]:
+        """อ่านไฟล์ใน folder ทีละไฟล์
         
-        folder = Path(folder_path)
-        documents = []
+        ถ้าส่ง manifest มา จะข้ามไฟล์ที่ mtime/size ตรงกับ manifest (ใส่ doc_id ลง unchanged_ids)
+        และบันทึก (mtime_ns, size) ของทุกไฟล์ลง file_stats
+        """
+        config = self.upserter.ingest_config()
+        created_at = str(datetime.now())
+        
+        for file_path in Path(folder_path).rglob('*'):
+            if not (file_path.is_file() and file_path.suffix.lower() in file_types):
+                continue
+            
+            doc_id = f"folder_{file_path.stem}"
+            if manifest is not None:
+                stat = file_path.stat()
+                file_stats[doc_id] = (stat.st_mtime_ns, stat.st_size)
+                if manifest.file_unchanged(doc_id, stat.st_mtime_ns, stat.st_size, config):
+                    unchanged_ids.append(doc_id)
+                    continue
+            
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except Exception as e:
+                log_event(logger, f"Error reading {file_path}: {e}", level=logging.WARNING,
+                          event='read_failed', path=str(file_path), error=str(e))
+                if manifest is not None:
+                    # อ่านไม่ได้รอบนี้ ให้คง vectors เดิมไว้ ไม่ถือว่าไฟล์ถูกลบ
+                    unchanged_ids.append(doc_id)
+                continue
+            
+            yield {
+                'id': doc_id,
+                'title': file_path.stem.replace('_', ' ').replace('-', ' '),
+                'content': content,
+                'source_url': f"file://{file_path}",
+                'type': 'folder_import',
+                'created_at': created_at
+            }
+    
+    def import_from_folder(self, folder_path: str, file_types=['.txt', '.md'], incremental=False):
+        """Import ข้อมูลจาก folder ทั้งหมด (อ่านและ upsert ทีละ window ของไฟล์)
         
-        for file_path in folder.rglob('*'):
-            if file_path.is_file() and file_path.suffix.lower() in file_types:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    doc = {
-                        'id': f"folder_{file_path.stem}",
-                        'title': file_path.stem.replace('_', ' ').replace('-', ' '),
-                        'content': content,
-                        'source_url': f"file://{file_path}",
-                        'type': 'folder_import',
-                        'created_at': str(pd.Timestamp.now())
-                    }
-                    documents.append(doc)
-                
-                except Exception as e:
-                    print(f"Error reading {file_path}: {e}")
+        incremental=True: ข้ามไฟล์ที่ mtime/size ตรงกับ manifest โดยไม่ต้องอ่าน,
+        upsert เฉพาะไฟล์ที่ใหม่/เปลี่ยน และลบ chunks ของไฟล์ที่ถูกลบหรือสั้นลง
+        """
+        log_event(logger, f"Importing from folder: {folder_path}", event='import_started', source=folder_path)
+        source = f"folder:{Path(folder_path).resolve()}"
         
-        if documents:
-            self.upserter.upsert_documents(documents)
+        if not incremental:
+            return self._ingest(self.iter_folder_documents(folder_path, file_types), source=source)
         
-        return len(documents)
+        manifest = SyncManifest(self.manifest_path)
+        unchanged_ids = []
+        file_stats = {}
+        documents = self.iter_folder_documents(
+            folder_path, file_types, manifest, unchanged_ids, file_stats
+        )
+        return self._ingest(
+            documents,
+            incremental=True,
+            source=source,
+            manifest=manifest,
+            unchanged_ids=unchanged_ids,
+            file_stats=file_stats
+        )
+
+def main(argv=None):
+    """CLI: python data_importer.py <file หรือ folder> [--workers N] [--incremental]"""
+    parser = argparse.ArgumentParser(description="Import documents into Pinecone")
+    parser.add_argument('source', help="ไฟล์ .csv/.json/.jsonl/.txt หรือ folder")
+    parser.add_argument('--index', default="rag-documents", help="ชื่อ index")
+    parser.add_argument('--workers', type=int, default=1, help="จำนวน process สำหรับ chunk + encode")
+    parser.add_argument('--incremental', action='store_true', help="sync เฉพาะเอกสารที่เปลี่ยน")
+    parser.add_argument('--manifest', default='.sync_manifest.json', help="ไฟล์ manifest ของ incremental sync")
+    parser.add_argument('--resume', action='store_true',
+                        help="บันทึก journal ระหว่าง import และทำต่อจาก job เดิมที่ค้าง (INGEST_JOURNAL_DIR)")
+    parser.add_argument('--dedup', action='store_true', help="ไม่ upsert chunks ที่ซ้ำ/เกือบซ้ำกับ chunk ที่มีอยู่แล้ว")
+    parser.add_argument('--metrics', metavar='PATH', help="เปิด metrics แล้วเขียนเวลาต่อขั้นตอนเป็น JSON ที่ PATH")
+    parser.add_argument('--metrics-port', type=int, help="เปิด metrics และ endpoint /metrics (Prometheus) ที่ port นี้")
+    parser.add_argument('--profile', choices=['sample', 'cprofile'], help="profile ทั้ง run (ผลอยู่ใน PROFILE_DIR)")
+    args = parser.parse_args(argv)
+    
+    if args.metrics or args.metrics_port:
+        registry.enable()
+    serve_metrics(args.metrics_port)
+    
+    importer = FileDataImporter(args.index, manifest_path=args.manifest, workers=args.workers, resumable=args.resume,
+                                dedup=args.dedup)
+    source = Path(args.source)
+    suffix = source.suffix.lower()
+    
+    try:
+        with profile_run('import', args.profile):
+            if source.is_dir():
+                count = importer.import_from_folder(str(source), incremental=args.incremental)
+            elif suffix == '.csv':
+                count = importer.import_from_csv(str(source), incremental=args.incremental)
+            elif suffix == '.jsonl':
+                count = importer.import_from_jsonl(str(source), incremental=args.incremental)
+            elif suffix == '.json':
+                count = importer.import_from_json(str(source), incremental=args.incremental)
+            else:
+                count = importer.import_from_txt(str(source))
+    except KeyboardInterrupt:
+        log_event(logger, "Import interrupted", event='import_interrupted')
+        return 130
+    finally:
+        registry.dump(args.metrics)
+    
+    log_event(logger, f"Imported {count} documents", event='import_finished', documents=count)
+    return 0
 
 # ตัวอย่างการใช้งาน
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main())
+    
     importer = FileDataImporter()
     
     # สร้างไฟล์ตัวอย่าง
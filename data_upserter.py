@@ -1,82 +1,520 @@
-import uuid
-from typing import List, Dict, Any
+from functools import partial
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 from tqdm import tqdm
 
-from pinecone_client import PineconeClient
-from embedding_model import EmbeddingModel
+from index_backend import open_index
+from local_index import LocalIndex
+from fake_index import FakeIndex
+from embedding_model import get_embedding_model
 from text_chunker import TextChunker
+from upsert_writer import ConcurrentUpsertWriter
+from sync_manifest import SyncManifest
+from vectorizer import DocumentVectorizer, document_id
+from parallel_ingest import ParallelVectorizer
+from result_cache import open_result_cache
+from chunk_store import open_chunk_store, compact_vector_metadata
+from bm25_index import open_bm25_index
+from ingest_journal import IngestJournal
+from chunk_dedup import open_chunk_dedup
+from metrics import timer, inc, registry, get_logger, log_event
+
+logger = get_logger('upserter')
 
 class PineconeDataUpserter:
-    def __init__(self, index_name="rag-documents"):
-        self.client = PineconeClient()
-        self.index = self.client.get_index(index_name)
-        self.embedder = EmbeddingModel()
-        self.chunker = TextChunker(chunk_size=512, overlap=50)
+    def __init__(self, index_name="rag-documents", window_size=256, encode_batch_size=64,
+                 upsert_workers=4, max_pending_batches=None, workers=1, token_aware=True,
+                 compact_metadata=False, chunk_store_path=None, index=None, embedder=None,
+                 lexical=False, lexical_index_path=None, dedup=False, dedup_path=None, dedup_threshold=None,
+                 result_cache_path=None):
+        """index / embedder: ส่ง object ที่สร้างไว้แล้วเข้ามาใช้แทนได้ (เช่น LocalIndex หรือ FakeIndex ตอนทดสอบ)
+        
+        index, โมเดล และ chunker ถูกสร้างเมื่อใช้ครั้งแรก สร้าง upserter จึงแทบไม่เสียเวลา
+        result_cache_path: ไฟล์ result cache ของ VectorSearcher ที่ต้อง invalidate (None = RESULT_CACHE_PATH)
+        """
+        self.index_name = index_name
+        self._index = index
+        self._writer = None
+        self.upsert_workers = upsert_workers
+        self.max_pending_batches = max_pending_batches
+        # โมเดลตัวเดียวกับ VectorSearcher ใน process เดียวกัน (โหลดตอน encode ครั้งแรก)
+        self.embedder = embedder or get_embedding_model()
+        
+        # token_aware: chunk ตาม token budget ของโมเดล (all-MiniLM-L6-v2 รับได้ 256 tokens)
+        # แทนการนับตัวอักษร เพื่อไม่ให้ส่วนท้ายของ chunk ถูกตัดทิ้งตอน encode
+        self.token_aware = token_aware
+        self._chunker = None
+        self._vectorizer = None
+        
+        # จำนวนเอกสารต่อ window ในโหมด pipelined และขนาด batch ของ encoder
+        self.window_size = window_size
+        self.encode_batch_size = encode_batch_size
+        self.upsert_batch_size = 100
+        
+        # workers > 1: chunk + encode ด้วย process pool (แต่ละ process โหลดโมเดลของตัวเอง)
+        self.workers = workers
+        
+        # ทุก batch ที่เขียนสำเร็จ/ทุกการลบจะเพิ่ม generation ทำให้ผลการค้นหาที่ VectorSearcher cache ไว้ใช้ไม่ได้อีก
+        self.result_cache = open_result_cache(index_name, path=result_cache_path)
+        
+        # compact_metadata: index เก็บแค่ doc_id, chunk_index, document_type, title
+        # ข้อความของ chunk และ field อื่นอยู่ใน ChunkStore (SQLite) ที่ VectorSearcher ดึงมาเติมหลัง query
+        self.chunk_store = open_chunk_store(chunk_store_path) if compact_metadata else None
+        
+        # lexical: สร้าง BM25 index ของข้อความ chunks ไปพร้อมกับการ upsert สำหรับ VectorSearcher.hybrid_search
+        # (เปิดบน index ที่มีข้อมูลอยู่แล้วต้อง import ใหม่แบบไม่ incremental เพื่อให้มีเอกสารเดิมด้วย)
+        self.lexical_index = open_bm25_index(index_name, lexical_index_path) if lexical else None
+        
+        # dedup: chunks ที่ซ้ำ/เกือบซ้ำ (cosine >= dedup_threshold) กับ chunk ที่มีอยู่แล้วไม่ถูก upsert
+        # แต่เก็บเป็น reference ใน ChunkDeduplicator (CHUNK_DEDUP_DIR)
+        self.dedup = open_chunk_dedup(index_name, dedup_path, dedup_threshold) if dedup else None
+    
+    @property
+    def index(self):
+        """index ของ VECTOR_BACKEND (เชื่อมต่อครั้งแรกที่ใช้)"""
+        if self._index is None:
+            self._index = open_index(self.index_name)
+        return self._index
+    
+    @property
+    def writer(self) -> ConcurrentUpsertWriter:
+        if self._writer is None:
+            self._writer = ConcurrentUpsertWriter(
+                self.index,
+                max_workers=self.upsert_workers,
+                max_pending=self.max_pending_batches
+            )
+        return self._writer
+    
+    @property
+    def chunker(self) -> TextChunker:
+        if self._chunker is None:
+            if self.token_aware:
+                self._chunker = TextChunker.for_model(self.embedder)
+            else:
+                self._chunker = TextChunker(chunk_size=512, overlap=50)
+        return self._chunker
+    
+    @property
+    def vectorizer(self) -> DocumentVectorizer:
+        if self._vectorizer is None:
+            self._vectorizer = DocumentVectorizer(self.embedder, self.chunker, self.encode_batch_size)
+        return self._vectorizer
     
     def prepare_vectors(self, document: Dict[str, Any]) -> List[Dict]:
         """เตรียม vectors สำหรับ upsert (v7.x format)"""
         vectors = []
+        doc_id = document_id(document)
         
-        # แบ่ง content เป็น chunks
-        chunks = self.chunker.chunk_by_sentences(document['content'])
+        # แบ่ง content เป็น chunks (เก็บตำแหน่งของแต่ละ chunk ไว้ใน metadata)
+        spans = self.vectorizer.chunk_spans(document['content'])
+        chunks = [document['content'][start:end] for start, end in spans]
         
         # สร้าง embeddings สำหรับแต่ละ chunk
         embeddings = self.embedder.batch_encode(chunks)
         
         for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            vector_id = f"{document.get('id', str(uuid.uuid4()))}_{i}"
-            
-            # Metadata สำหรับ filtering และแสดงผล
-            metadata = {
-                'title': document['title'],
-                'content': chunk,
-                'chunk_index': i,
-                'total_chunks': len(chunks),
-                'source_url': document.get('source_url', ''),
-                'document_type': document.get('type', 'general'),
-                'created_at': document.get('created_at', ''),
-            }
+            vector_id = f"{doc_id}_{i}"
+            metadata = self.vectorizer.build_metadata(document, chunk, i, len(chunks), spans[i])
             
             # Pinecone v7.x vector format: tuple (id, values, metadata)
             vectors.append((vector_id, embedding, metadata))
         
         return vectors
     
+    def prepare_vectors_batch(self, documents: List[Dict[str, Any]]) -> List[tuple]:
+        """เตรียม vectors ของหลายเอกสารพร้อมกัน (pipelined)
+        
+        1) chunk ทุกเอกสารก่อน 2) encode chunks จากทุกเอกสารรวมกันเป็น batch เต็มๆ
+        ที่เรียงตามความยาว 3) กระจาย embeddings กลับไปเป็น vector ของ (doc_id, chunk_index)
+        """
+        _, _, vectors = self.vectorizer.vectorize(documents)
+        return vectors
+    
+    def _vectorize_windows(self, documents: Iterable[Dict[str, Any]]):
+        """แบ่งเอกสารเป็น windows แล้ว vectorize คืน (window, doc_ids, chunk_counts, vectors)
+        
+        workers > 1: กระจายไปหลาย process (ลำดับผลลัพธ์ตามที่ทำเสร็จ)
+        """
+        return self._vectorize(self._windows(documents))
+    
+    def _vectorize(self, windows: Iterable[List[Dict[str, Any]]]):
+        if self.workers > 1:
+            parallel = ParallelVectorizer(
+                self.workers, self.embedder.model_name, self.chunker, self.encode_batch_size,
+                backend=self.embedder.backend
+            )
+            for window, doc_ids, chunk_counts, vectors in parallel.map_windows(windows):
+                yield window, doc_ids, chunk_counts, self._deduplicate(vectors)
+            return
+        
+        for window in windows:
+            doc_ids, chunk_counts, vectors = self.vectorizer.vectorize(window)
+            yield window, doc_ids, chunk_counts, self._deduplicate(vectors)
+    
+    def _journaled_windows(self, documents: Iterable[Dict[str, Any]], journal: IngestJournal):
+        """เหมือน _vectorize_windows แต่ใช้ journal: คืน (window, vectors, window key)
+        
+        - window ที่ journal บันทึกว่า upsert ครบแล้วถูกข้าม
+        - window ที่ spill ไว้แล้วอ่าน embeddings จาก disk แทนการ encode ใหม่
+        - window ใหม่ถูก encode แล้ว spill ลง disk ก่อนส่งเข้า index
+        """
+        resumed = []
+        
+        def drain():
+            while resumed:
+                key, window = resumed.pop(0)
+                _, _, vectors = journal.load(key)
+                yield window, vectors, key
+        
+        for window, doc_ids, chunk_counts, vectors in self._vectorize(journal.filter_windows(self._windows(documents), resumed)):
+            yield from drain()
+            with timer('spill'):
+                key = journal.spill(window, doc_ids, chunk_counts, vectors, self.upsert_batch_size)
+            yield window, vectors, key
+        yield from drain()
+    
+    def _deduplicate(self, vectors: List[tuple]) -> List[tuple]:
+        """ตัด chunks ที่ซ้ำกับ chunk อื่นออก (ChunkDeduplicator เก็บเป็น reference แทน)"""
+        if self.dedup is None:
+            return vectors
+        with timer('dedup'):
+            vectors, demoted = self.dedup.deduplicate(vectors)
+        if demoted:
+            # chunk ที่เคยเป็น vector แต่เนื้อหาใหม่ซ้ำกับ chunk อื่นแล้ว ต้องไม่อยู่ใน index อีก
+            self._delete_vectors(demoted)
+        return vectors
+    
+    def _restore_references(self, orphans: List[tuple]):
+        """upsert references ที่ canonical ถูกลบไปแล้วกลับเข้า index"""
+        if orphans:
+            self._upsert_vectors(self._deduplicate(orphans))
+            self.writer.flush()
+    
+    def _upsert_vectors(self, vectors: List[tuple], journal: Optional[IngestJournal] = None,
+                        window_key: Optional[str] = None):
+        """ส่ง vectors เข้า writer เป็น batch (Pinecone รองรับ max 100 vectors ต่อ batch)
+        
+        writer ส่งหลาย batch พร้อมกันในพื้นหลัง ต้องเรียก self.writer.flush() เพื่อรอให้เสร็จ
+        journal: ข้าม batch ของ window_key ที่ index ตอบรับไปแล้ว และบันทึก ack ของ batch ที่ส่งสำเร็จ
+        result cache ถูก invalidate ทุกครั้งที่ batch ส่งสำเร็จ ไม่ต้องรอให้ job ทั้งหมดเสร็จ
+        """
+        inc('chunks', len(vectors))
+        if self.lexical_index is not None:
+            with timer('lexical_index'):
+                self.lexical_index.add_vectors(vectors)
+        if self.chunk_store is not None:
+            # เขียน chunk store ก่อน เพื่อให้ทุก vector ที่ค้นเจอมีข้อความให้ดึงเสมอ
+            self.chunk_store.put_vectors(vectors)
+            vectors = [(vector_id, values, compact_vector_metadata(vector_id, metadata))
+                       for vector_id, values, metadata in vectors]
+        
+        acked = journal.acked_batches(window_key) if journal is not None else ()
+        for batch_no, i in enumerate(range(0, len(vectors), self.upsert_batch_size)):
+            if batch_no in acked:
+                continue
+            batch = vectors[i:i + self.upsert_batch_size]
+            self.writer.submit(batch, partial(self._batch_done, journal, window_key, batch_no))
+    
+    def _batch_done(self, journal: Optional[IngestJournal], window_key: Optional[str], batch_no: int):
+        """เรียกจาก writer thread เมื่อ index ตอบรับ batch แล้ว"""
+        if journal is not None:
+            journal.ack(window_key, batch_no)
+        self._invalidate_search_cache()
+    
+    def _invalidate_search_cache(self):
+        """ให้ผลการค้นหาที่ cache ไว้ก่อนการเขียนครั้งนี้หมดอายุ (เรียกหลัง batch ถูกเขียน/delete เสร็จ)"""
+        self.result_cache.invalidate()
+    
     def upsert_document(self, document: Dict[str, Any]):
         """Upsert เอกสารเดียว"""
-        vectors = self.prepare_vectors(document)
+        vectors = self._deduplicate(self.prepare_vectors(document))
+        self._upsert_vectors(vectors)
+        self.writer.flush()
         
-        # Upsert เป็น batch (Pinecone รองรับ max 100 vectors ต่อ batch)
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            self.index.upsert(vectors=batch)
-        
-        print(f"Upserted: {document['title']} ({len(vectors)} chunks)")
+        log_event(logger, f"Upserted: {document['title']} ({len(vectors)} chunks)",
+                  event='document_upserted', title=document['title'], chunks=len(vectors))
         return len(vectors)
     
-    def upsert_documents(self, documents: List[Dict[str, Any]]):
-        """Upsert หลายเอกสาร"""
+    def _windows(self, documents: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """แบ่งเอกสารจาก iterable/generator เป็น window ละ window_size เอกสาร"""
+        iterator = iter(documents)
+        while True:
+            # เวลาอ่านเอกสารจาก generator (ไฟล์/CSV) อยู่ใน stage 'read'
+            with timer('read'):
+                window = list(islice(iterator, self.window_size))
+            if not window:
+                return
+            inc('documents', len(window))
+            yield window
+    
+    def upsert_stream(self, documents: Iterable[Dict[str, Any]],
+                      journal: Optional[IngestJournal] = None) -> Dict[str, int]:
+        """Upsert เอกสารจาก iterable/generator ทีละ window
+        
+        ถือเอกสารในหน่วยความจำแค่ครั้งละ window และ writer จำกัดจำนวน batch ที่ค้างส่ง
+        memory จึงคงที่ไม่ว่า input จะใหญ่แค่ไหน
+        
+        journal: บันทึกความคืบหน้าลง IngestJournal ถ้า job หยุดกลางทาง (crash/Ctrl-C/error)
+        การเรียกครั้งถัดไปด้วยเอกสารชุดเดิมจะทำต่อจากจุดเดิมโดยไม่ encode ซ้ำ
+        journal ถูกลบเมื่อ job เสร็จครบ
+        """
+        total_documents = 0
         total_chunks = 0
+        self._reset_stats()
+        if journal is not None:
+            journal.begin(self.ingest_config())
+            results = self._journaled_windows(documents, journal)
+        else:
+            results = ((window, vectors, None) for window, _, _, vectors in self._vectorize_windows(documents))
+        
+        # window ถัดไปถูก encode ระหว่างที่ batch ของ window ก่อนหน้ากำลังถูกส่ง
+        try:
+            with tqdm(desc="Upserting documents", unit="doc") as progress:
+                try:
+                    for window, vectors, window_key in results:
+                        self._upsert_vectors(vectors, journal, window_key)
+                        total_documents += len(window)
+                        total_chunks += len(vectors)
+                        progress.update(len(window))
+                        progress.set_postfix(chunks=total_chunks)
+                finally:
+                    # รวมกรณี Ctrl-C: รอ batch ที่ส่งไปแล้วให้เสร็จก่อนออก
+                    self.writer.flush()
+        except BaseException:
+            if journal is not None:
+                # batch ที่ ack แล้วต้องอยู่ใน index จริง: local index/BM25 จึงต้องบันทึกลง disk ก่อนออก
+                self._save_local_indexes()
+            raise
+        
+        # บันทึก local index/BM25 ก่อนลบ journal: ถ้า crash ระหว่างบันทึก รอบหน้ายังทำต่อจาก journal ได้
+        self._save_local_indexes()
+        if journal is not None:
+            stats = journal.stats()
+            log_event(logger,
+                      f"Ingest journal: skipped {stats['skipped_windows']} finished windows, "
+                      f"resumed {stats['resumed_windows']} spilled windows",
+                      event='journal_finished', **stats)
+            journal.finish()
+        if total_documents:
+            self._report_run(total_chunks)
+        return {'documents': total_documents, 'chunks': total_chunks}
+    
+    def upsert_documents(self, documents: Iterable[Dict[str, Any]], pipelined: bool = True):
+        """Upsert หลายเอกสาร
+        
+        pipelined=True: ประมวลผลทีละ window ของเอกสาร โดย encode chunks ข้ามเอกสารรวมกัน
+        pipelined=False: ทำทีละเอกสารแบบเดิม
+        """
+        if pipelined:
+            return self.upsert_stream(documents)['chunks']
         
+        total_chunks = 0
+        self._reset_stats()
         for doc in tqdm(documents, desc="Upserting documents"):
             chunks_count = self.upsert_document(doc)
             total_chunks += chunks_count
         
-        print(f"Total chunks upserted: {total_chunks}")
+        self._save_local_indexes()
+        self._report_run(total_chunks)
+        return total_chunks
+    
+    def _reset_stats(self):
+        self.writer.reset_stats()
+        if self.dedup is not None:
+            self.dedup.reset_stats()
+    
+    def _report_dedup(self):
+        if self.dedup is None:
+            return
+        stats = self.dedup.stats()
+        inc('duplicate_chunks', stats['exact_duplicates'] + stats['near_duplicates'])
+        log_event(logger,
+                  f"Dedup: {stats['exact_duplicates']} exact + {stats['near_duplicates']} near duplicates "
+                  f"of {stats['chunks']} chunks (dedup ratio {stats['dedup_ratio']:.1%}) stored as references",
+                  event='dedup_summary', **stats)
+    
+    def _report_run(self, total_chunks: int):
+        """แสดงสรุปของการ upsert หนึ่งรอบ (และเขียน metrics ลง METRICS_DUMP ถ้ากำหนด)
+        
+        ผู้เรียกต้องบันทึก local indexes (_save_local_indexes) ก่อนเรียก
+        """
+        log_event(logger, f"Total chunks upserted: {total_chunks}", event='run_finished', chunks=total_chunks)
+        self._report_dedup()
+        summary = self.writer.summary()
+        log_event(logger,
+                  f"Upsert summary: {summary['batches']} batches, "
+                  f"{summary['vectors_per_s']:.0f} vectors/s, retries={summary['retries']}, "
+                  f"latency p50={summary['latency']['p50_ms']:.0f} ms p95={summary['latency']['p95_ms']:.0f} ms, "
+                  f"backpressure wait={summary['backpressure_wait_s']:.1f} s",
+                  event='upsert_summary', **summary)
+        
+        cache_stats = self.embedder.cache_stats()
+        if cache_stats:
+            self.embedder.flush_cache()
+            log_event(logger,
+                      f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                      f"(hit rate {cache_stats['hit_rate']:.1%})",
+                      event='embedding_cache', **cache_stats)
         
-        # รอให้ index update (Serverless เร็วกว่า)
-        import time
-        time.sleep(3)
+        if not isinstance(self.index, (LocalIndex, FakeIndex)):
+            # รอให้ index update (Serverless เร็วกว่า) LocalIndex/FakeIndex อัปเดตทันทีจึงไม่ต้องรอ
+            import time
+            time.sleep(3)
         
         # ตรวจสอบสถานะ
         stats = self.index.describe_index_stats()
-        print(f"Index stats: {stats}")
+        log_event(logger, f"Index stats: {stats}", event='index_stats', stats=stats)
+        registry.dump()
+    
+    def _save_local_indexes(self) -> bool:
+        """บันทึก BM25 index และ local index ลง disk คืน True ถ้า index เป็น LocalIndex"""
+        if self.lexical_index is not None:
+            self.lexical_index.save()
+        if isinstance(self.index, LocalIndex):
+            # local index อัปเดตทันที บันทึกลง disk ให้ process อื่นเปิดใช้ได้
+            self.index.save()
+            return True
+        return False
+    
+    def ingest_config(self) -> str:
+        """ค่า config ที่มีผลต่อ vectors (ถ้าเปลี่ยน เอกสารทั้งหมดต้อง upsert ใหม่)"""
+        config = f"{self.embedder.model_name}|{self.chunker.fingerprint()}|sentences"
+        if self.dedup is not None:
+            config += f"|dedup={self.dedup.threshold}"
+        return config + '|compact' if self.chunk_store is not None else config
+    
+    def delete_ids(self, ids: List[str], batch_size: int = 1000):
+        """ลบ vectors ตาม ID โดยตรง (ทีละ batch)"""
+        self._delete_vectors(ids, batch_size)
+        if self.dedup is not None:
+            self._restore_references(self.dedup.forget(ids))
+    
+    def _delete_vectors(self, ids: List[str], batch_size: int = 1000):
+        self.writer.flush()
+        for i in range(0, len(ids), batch_size):
+            self.index.delete(ids=ids[i:i + batch_size])
+        if self.chunk_store is not None:
+            self.chunk_store.delete(ids)
+        if self.lexical_index is not None:
+            self.lexical_index.delete(ids=ids)
+        self._invalidate_search_cache()
+    
+    def sync_documents(self,
+                       documents: Iterable[Dict[str, Any]],
+                       manifest: SyncManifest,
+                       source: Optional[str] = None,
+                       unchanged_ids: Iterable[str] = (),
+                       file_stats: Optional[Dict[str, tuple]] = None,
+                       prune_missing: bool = False) -> Dict[str, int]:
+        """Incremental sync: upsert เฉพาะเอกสารที่ใหม่/เปลี่ยน และลบ chunk IDs ที่ไม่ใช้แล้ว
+        
+        - documents: list หรือ generator (ประมวลผลทีละ window)
+        - unchanged_ids: เอกสารที่ผู้เรียกรู้แล้วว่าไม่เปลี่ยน (เช่นไฟล์ที่ mtime/size ตรง) ไม่ต้องส่งมา
+          อ่านหลังจากวน documents ครบแล้ว จึงเติมค่าระหว่างที่ generator ทำงานได้
+        - file_stats: doc_id -> (mtime_ns, size) ของไฟล์ต้นทาง เพื่อบันทึกลง manifest
+        - prune_missing: ลบเอกสารของ source นี้ที่อยู่ใน manifest แต่ไม่มีในรอบนี้
+        """
+        config = self.ingest_config()
+        if file_stats is None:
+            file_stats = {}
+        seen = set()
+        changed_count = 0
+        stale_ids = []
+        upserted_chunks = 0
+        self._reset_stats()
+        
+        content_hashes = {}
+        
+        def changed_documents():
+            """กรองเฉพาะเอกสารที่ใหม่/เปลี่ยน (เอกสารที่ไม่เปลี่ยนแค่อัปเดต mtime/size)"""
+            for document in documents:
+                doc_id = document['id']
+                seen.add(doc_id)
+                progress.update(1)
+                content_hash = SyncManifest.content_hash(document, config)
+                entry = manifest.get(doc_id)
+                if entry and entry.get('hash') == content_hash:
+                    if doc_id in file_stats:
+                        mtime_ns, size = file_stats[doc_id]
+                        manifest.update(doc_id, mtime_ns=mtime_ns, size=size, config=config)
+                    continue
+                content_hashes[doc_id] = content_hash
+                yield document
+        
+        with tqdm(desc="Syncing documents", unit="doc") as progress:
+            try:
+                for window, doc_ids, chunk_counts, vectors in self._vectorize_windows(changed_documents()):
+                    self._upsert_vectors(vectors)
+                    upserted_chunks += len(vectors)
+                    changed_count += len(window)
+                    
+                    for doc_id, chunk_count in zip(doc_ids, chunk_counts):
+                        entry = manifest.get(doc_id) or {}
+                        # เอกสารสั้นลง: ลบ {doc_id}_{i} ที่ index เกินจำนวน chunks ใหม่
+                        stale_ids.extend(f"{doc_id}_{i}" for i in range(chunk_count, entry.get('chunks', 0)))
+                        fields = {'hash': content_hashes.pop(doc_id), 'chunks': chunk_count,
+                                  'config': config, 'source': source}
+                        if doc_id in file_stats:
+                            fields['mtime_ns'], fields['size'] = file_stats[doc_id]
+                        manifest.update(doc_id, **fields)
+            except KeyboardInterrupt:
+                # บันทึกความคืบหน้าของ windows ที่ upsert แล้ว รอบหน้าจะทำต่อจากที่ค้าง
+                self.writer.flush()
+                if stale_ids:
+                    self.delete_ids(stale_ids)
+                manifest.save()
+                raise
+        
+        self.writer.flush()
+        seen.update(unchanged_ids)
+        
+        removed_docs = 0
+        if prune_missing and source is not None:
+            for doc_id in manifest.doc_ids_for_source(source):
+                if doc_id not in seen:
+                    entry = manifest.get(doc_id)
+                    stale_ids.extend(f"{doc_id}_{i}" for i in range(entry.get('chunks', 0)))
+                    manifest.remove(doc_id)
+                    removed_docs += 1
+        
+        if stale_ids:
+            self.delete_ids(stale_ids)
+        
+        manifest.save()
+        self.embedder.flush_cache()
+        self._save_local_indexes()
+        
+        result = {
+            'documents': len(seen),
+            'changed': changed_count,
+            'unchanged': len(seen) - changed_count,
+            'removed': removed_docs,
+            'upserted_chunks': upserted_chunks,
+            'deleted_chunks': len(stale_ids),
+        }
+        log_event(logger, f"Sync summary: {result}", event='sync_summary', **result)
+        self._report_dedup()
+        registry.dump()
+        return result
     
     def delete_by_filter(self, filter_dict: Dict[str, Any]):
         """ลบ vectors ที่ตรงกับ filter"""
+        if self.lexical_index is not None:
+            # ตรวจก่อนลบจาก index เพื่อไม่ให้ index กับ BM25 index ไม่ตรงกัน
+            self.lexical_index.check_filter(filter_dict)
+        # รอให้ upsert ที่ค้างอยู่เสร็จก่อน เพื่อไม่ให้ลบก่อนเขียน
+        self.writer.flush()
         self.index.delete(filter=filter_dict)
-        print(f"Deleted vectors with filter: {filter_dict}")
+        if self.chunk_store is not None:
+            # index ในโหมด compact เก็บแค่ COMPACT_METADATA_FIELDS จึงหา chunks ที่ถูกลบจาก field เดียวกันใน store
+            self.chunk_store.delete(self.chunk_store.find(filter_dict))
+        if self.lexical_index is not None:
+            self.lexical_index.delete(filter=filter_dict)
+        self._invalidate_search_cache()
+        if self.dedup is not None:
+            self._restore_references(self.dedup.forget_matching(filter_dict))
+        log_event(logger, f"Deleted vectors with filter: {filter_dict}", event='deleted_by_filter', filter=filter_dict)
 
 # ทดสอบ
 if __name__ == "__main__":
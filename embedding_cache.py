@@ -0,0 +1,223 @@
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from quantization import VectorCodec
+
+class EmbeddingCache:
+    """Cache embeddings บน disk แบบ content-addressed: key = (model_name, sha1 ของ chunk text)
+
+    - vectors.f32: ไฟล์ float32 แบบ append-only อ่านผ่าน np.memmap
+      (storage='float16' -> vectors.float16, 'int8' -> vectors.int8 เก็บ scale ต่อ vector ไว้ในแถว)
+    - index.log: key -> slot (append ทุกครั้งที่เขียน และถูกเขียนใหม่ตามลำดับ LRU ตอน flush)
+    - เกิน max_entries จะ evict ตัวที่ใช้ล่าสุดนานที่สุด (LRU) และ compact ไฟล์เมื่อมี slot ว่างมาก
+
+    compact เขียน vectors ลงไฟล์ของ generation ใหม่ (vectors.<generation>.f32) แล้วสลับด้วยการ
+    replace index.log ที่บรรทัดแรกระบุ generation ครั้งเดียว crash ตรงไหน index กับไฟล์ vectors ก็ยังตรงกัน
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, dim: int, max_entries=1_000_000,
+                 storage: str = 'float32'):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self.codec = VectorCodec(storage, dim)
+        self.path = Path(cache_dir) / re.sub(r'[^A-Za-z0-9._-]+', '_', model_name)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self._suffix = 'f32' if storage == 'float32' else storage
+        self._generation = 0
+        self._vectors_path = self._vectors_file(0)
+        self._index_path = self.path / 'index.log'
+        self._lock = threading.Lock()
+        self._slots = OrderedDict()  # key -> slot, เรียงจากใช้นานสุด -> ล่าสุด
+        self._mmap = None
+        self._num_slots = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._load()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _vectors_file(self, generation: int) -> Path:
+        # generation 0 ใช้ชื่อเดิม cache ที่สร้างก่อนมี generation จึงเปิดได้ตามเดิม
+        if generation == 0:
+            return self.path / f'vectors.{self._suffix}'
+        return self.path / f'vectors.{generation}.{self._suffix}'
+
+    def _read_generation(self) -> int:
+        """generation ที่ index.log อ้างถึง (0 ถ้าไม่มีไฟล์หรือไม่มีบรรทัด generation)"""
+        if not self._index_path.exists():
+            return 0
+        with open(self._index_path, 'r', encoding='utf-8') as f:
+            parts = f.readline().split()
+        if len(parts) == 2 and parts[0] == 'generation':
+            return int(parts[1])
+        return 0
+
+    def _load(self):
+        meta_path = self.path / 'meta.json'
+        meta = {'model_name': self.model_name, 'dim': self.dim}
+        if self.codec.storage != 'float32':
+            meta['storage'] = self.codec.storage
+        if meta_path.exists() and json.loads(meta_path.read_text()) != meta:
+            # model/dimension/storage เปลี่ยน ใช้ cache เดิมไม่ได้
+            for vectors_path in self.path.glob('vectors.*'):
+                vectors_path.unlink(missing_ok=True)
+            self._index_path.unlink(missing_ok=True)
+        meta_path.write_text(json.dumps(meta))
+
+        self._generation = self._read_generation()
+        self._vectors_path = self._vectors_file(self._generation)
+        for vectors_path in self.path.glob(f'vectors.*{self._suffix}'):
+            if vectors_path != self._vectors_path:
+                # ไฟล์ของ compact ที่ crash ก่อนสลับ index หรือ generation เก่าที่ยังไม่ได้ลบ
+                vectors_path.unlink(missing_ok=True)
+        if self._generation and not self._vectors_path.exists():
+            # index อ้างถึงไฟล์ vectors ที่ไม่มีแล้ว slot ในนั้นใช้ไม่ได้ เริ่ม cache ใหม่
+            self._index_path.unlink(missing_ok=True)
+            self._generation = 0
+            self._vectors_path = self._vectors_file(0)
+
+        if self._vectors_path.exists():
+            size = self._vectors_path.stat().st_size
+            self._num_slots = size // self.codec.row_bytes
+            if size != self._num_slots * self.codec.row_bytes:
+                # แถวสุดท้ายเขียนไม่จบ (crash ระหว่าง append) ตัดทิ้ง ไม่งั้นแถวถัดไปจะเหลื่อมจาก slot
+                os.truncate(self._vectors_path, self._num_slots * self.codec.row_bytes)
+
+        if self._index_path.exists():
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) != 2 or parts[0] == 'generation':
+                        continue  # บรรทัดที่เขียนไม่จบ (crash ระหว่างเขียน)
+                    key, slot = parts[0], int(parts[1])
+                    if slot < self._num_slots:
+                        self._slots.pop(key, None)
+                        self._slots[key] = slot
+            self._evict()
+
+    def _matrix(self):
+        """memmap ของไฟล์ vectors (map ใหม่เมื่อไฟล์โตขึ้น)"""
+        if self._num_slots == 0:
+            return None
+        if self._mmap is None or self._mmap.shape[0] < self._num_slots:
+            self._mmap = self.codec.memmap(self._vectors_path, self._num_slots)
+        return self._mmap
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """คืน embedding (float32) ของแต่ละ text หรือ None ถ้าไม่มีใน cache"""
+        results = []
+        with self._lock:
+            matrix = self._matrix()
+            for text in texts:
+                key = self.key(text)
+                slot = self._slots.get(key)
+                if slot is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self._slots.move_to_end(key)
+                self.hits += 1
+                results.append(self.codec.decode(matrix[slot:slot + 1])[0])
+        return results
+
+    def put_many(self, texts: List[str], embeddings):
+        """เพิ่ม embeddings ลง cache (append ต่อท้ายไฟล์)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            new_keys = {}
+            new_rows = []
+            for text, embedding in zip(texts, embeddings):
+                key = self.key(text)
+                if key in self._slots or key in new_keys:
+                    continue
+                new_keys[key] = len(new_rows)
+                new_rows.append(embedding)
+            if not new_keys:
+                return
+
+            with open(self._vectors_path, 'ab') as f:
+                f.write(self.codec.encode(new_rows).tobytes())
+            with open(self._index_path, 'a', encoding='utf-8') as f:
+                for offset, key in enumerate(new_keys):
+                    self._slots[key] = self._num_slots + offset
+                    f.write(f"{key} {self._num_slots + offset}\n")
+            self._num_slots += len(new_keys)
+
+            self._evict()
+
+    def _evict(self):
+        while len(self._slots) > self.max_entries:
+            self._slots.popitem(last=False)
+            self.evictions += 1
+        # compact เมื่อ slot ที่ถูก evict แล้วมีมากกว่า slot ที่ใช้งานอยู่
+        if self._num_slots - len(self._slots) > max(len(self._slots), 1024):
+            self._compact()
+
+    def _compact(self):
+        """เขียนไฟล์ใหม่เฉพาะ vectors ที่ยังใช้งาน ตามลำดับ LRU
+
+        ไฟล์ vectors ใหม่เป็นของ generation ถัดไป index.log ที่ replace ทีหลังคือจุดที่สลับไปใช้
+        ถ้า crash ก่อนนั้น index เดิมยังชี้ไฟล์เดิมที่ไม่ถูกแตะ
+        """
+        matrix = self._matrix()
+        generation = self._generation + 1
+        vectors_path = self._vectors_file(generation)
+        with open(vectors_path, 'wb') as f:
+            for key, slot in self._slots.items():
+                f.write(np.ascontiguousarray(matrix[slot:slot + 1]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        slots = OrderedDict((key, slot) for slot, key in enumerate(self._slots))
+        self._write_index(slots, generation)
+
+        old_path = self._vectors_path
+        self._mmap = None
+        self._generation, self._vectors_path = generation, vectors_path
+        self._slots = slots
+        self._num_slots = len(slots)
+        old_path.unlink(missing_ok=True)
+
+    def _write_index(self, slots: Optional[OrderedDict] = None, generation: Optional[int] = None):
+        if slots is None:
+            slots, generation = self._slots, self._generation
+        tmp_path = self._index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if generation:
+                f.write(f"generation {generation}\n")
+            for key, slot in slots.items():
+                f.write(f"{key} {slot}\n")
+        os.replace(tmp_path, self._index_path)
+
+    def flush(self):
+        """บันทึก index ตามลำดับ LRU ปัจจุบัน (และตัด log ที่ซ้ำออก)"""
+        with self._lock:
+            if self._slots or self._index_path.exists():
+                self._write_index()
+
+    def stats(self):
+        """สถิติ hit/miss ของ cache"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._slots),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+        }
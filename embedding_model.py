@@ -1,47 +1,258 @@
-from sentence_transformers import SentenceTransformer
+from tqdm import tqdm
 import numpy as np
+import os
+import threading
+
+from embedding_cache import EmbeddingCache
+from onnx_backend import OnnxEncoder, check_backend
+from metrics import timer, inc, get_logger, log_event
+
+logger = get_logger('embedding')
+
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
 
 class EmbeddingModel:
-    def __init__(self, model_name='all-MiniLM-L6-v2'):
+    def __init__(self, model_name=DEFAULT_MODEL, cache_dir=None, cache_max_entries=1_000_000,
+                 cache_storage=None, backend=None, num_threads=None, warmup=True, lazy=True):
         """
         all-MiniLM-L6-v2: 384 dimensions, รองรับภาษาไทย, เร็ว
         all-mpnet-base-v2: 768 dimensions, คุณภาพสูงกว่า
         paraphrase-multilingual-MiniLM-L12-v2: 384 dimensions, หลายภาษา
+        
+        cache_dir: โฟลเดอร์ของ embedding cache บน disk (None = ใช้ EMBEDDING_CACHE_DIR)
+        ถ้าไม่กำหนดหรือส่ง False จะไม่ใช้ cache
+        cache_storage: 'float32' (default), 'float16' หรือ 'int8' (None = ใช้ EMBEDDING_CACHE_STORAGE)
+        backend: 'torch' (default), 'onnx' หรือ 'onnx-int8' (None = ใช้ EMBEDDING_BACKEND)
+        num_threads: จำนวน CPU threads ของการ encode (None = ใช้ EMBEDDING_THREADS ถ้าไม่มีให้ runtime เลือกเอง)
+        warmup: encode ข้อความสั้นๆ หนึ่งครั้งตอนโหลด เพื่อให้ request แรกไม่ช้า
+        lazy: โหลดโมเดลเมื่อใช้ครั้งแรก (False = โหลดทันที หรือเรียก load() เองตอน start server)
         """
-        print(f"Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
         self.model_name = model_name
-        self.embedding_dim = self.model.get_sentence_embedding_dimension()
-        print(f"Embedding dimension: {self.embedding_dim}")
+        self.backend = check_backend(backend or os.getenv('EMBEDDING_BACKEND', 'torch'))
+        self.num_threads = num_threads or int(os.getenv('EMBEDDING_THREADS', '0')) or None
+        self.warmup = warmup
+        
+        if cache_dir is None:
+            cache_dir = os.getenv('EMBEDDING_CACHE_DIR')
+        self._cache_dir = cache_dir
+        self._cache_max_entries = cache_max_entries
+        self._cache_storage = cache_storage or os.getenv('EMBEDDING_CACHE_STORAGE', 'float32')
+        
+        self._model = None
+        self._embedding_dim = None
+        self._cache = None
+        self.onnx = None
+        self._loaded = False
+        self._load_lock = threading.RLock()
+        if not lazy:
+            self.load()
+    
+    def load(self):
+        """โหลดโมเดล (และ ONNX backend / embedding cache) ถ้ายังไม่ได้โหลด"""
+        if self._loaded:
+            return self
+        with self._load_lock:
+            if self._loaded:
+                return self
+            # import ตอนโหลดโมเดล: sentence_transformers ดึง torch/transformers มาด้วย (หลายวินาที)
+            from sentence_transformers import SentenceTransformer
+            
+            log_event(logger, f"Loading embedding model: {self.model_name}", event='model_loading', model=self.model_name)
+            with timer('load_model'):
+                self._model = SentenceTransformer(self.model_name)
+            self._embedding_dim = self._model.get_sentence_embedding_dimension()
+            log_event(logger, f"Embedding dimension: {self._embedding_dim}", event='model_loaded',
+                      model=self.model_name, dim=self._embedding_dim)
+            
+            if self.backend == 'torch':
+                if self.num_threads:
+                    import torch
+                    torch.set_num_threads(self.num_threads)
+            else:
+                self.onnx = OnnxEncoder(self._model, self.model_name, quantize=self.backend == 'onnx-int8',
+                                        num_threads=self.num_threads)
+                log_event(logger, f"Embedding backend: {self.backend} ({self.onnx.session.get_providers()[0]})",
+                          event='backend', backend=self.backend, provider=self.onnx.session.get_providers()[0])
+            
+            if self._cache_dir:
+                # int8 quantized model ให้ผลต่างจาก float32 เล็กน้อย จึงแยก cache
+                cache_name = f"{self.model_name}-int8" if self.backend == 'onnx-int8' else self.model_name
+                self._cache = EmbeddingCache(self._cache_dir, cache_name, self._embedding_dim,
+                                             self._cache_max_entries, self._cache_storage)
+                entries = self._cache.stats()['entries']
+                log_event(logger, f"Embedding cache: {self._cache.path} ({entries} entries)",
+                          event='cache_opened', path=str(self._cache.path), entries=entries)
+            
+            self._loaded = True
+            if self.warmup:
+                self.encode(["warmup"], show_progress_bar=False)
+        return self
+    
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+    
+    @property
+    def model(self):
+        """SentenceTransformer (โหลดครั้งแรกที่ใช้)"""
+        return self.load()._model
+    
+    @property
+    def embedding_dim(self) -> int:
+        return self.load()._embedding_dim
     
-    def encode(self, texts):
+    @property
+    def cache(self):
+        """EmbeddingCache บน disk (None ถ้าไม่ได้เปิดใช้)"""
+        return self.load()._cache
+    
+    def encode(self, texts, batch_size=32, show_progress_bar=True):
         """แปลงข้อความหลายอันเป็น embeddings"""
         if isinstance(texts, str):
             texts = [texts]
         
-        embeddings = self.model.encode(
-            texts, 
-            convert_to_tensor=False,
-            show_progress_bar=True
-        )
+        model = self.model
+        inc('texts_encoded', len(texts))
+        with timer('encode'):
+            if self.onnx is not None:
+                return self.onnx.encode(texts, batch_size=batch_size, show_progress_bar=show_progress_bar)
+            
+            embeddings = model.encode(
+                texts, 
+                batch_size=batch_size,
+                convert_to_tensor=False,
+                show_progress_bar=show_progress_bar
+            )
         return embeddings
     
+    @property
+    def tokenizer(self):
+        """tokenizer ของโมเดล (HuggingFace fast tokenizer)"""
+        return self.model.tokenizer
+    
+    @property
+    def max_seq_length(self) -> int:
+        """จำนวน tokens สูงสุดที่โมเดลรับได้ (ส่วนที่เกินจะถูกตัดทิ้งตอน encode)"""
+        return self.model.max_seq_length
+    
+    @property
+    def num_special_tokens(self) -> int:
+        """จำนวน special tokens ที่ tokenizer เติมให้ทุกข้อความ (เช่น [CLS], [SEP])"""
+        return self.tokenizer.num_special_tokens_to_add(pair=False)
+    
+    def count_tokens(self, texts):
+        """นับจำนวน tokens ของหลาย texts ใน call เดียว (ไม่รวม special tokens)"""
+        if isinstance(texts, str):
+            texts = [texts]
+        with timer('tokenize'):
+            encoded = self.tokenizer(
+                list(texts),
+                add_special_tokens=False,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+                verbose=False
+            )
+        return [len(ids) for ids in encoded['input_ids']]
+    
     def encode_single(self, text):
         """แปลงข้อความเดียวเป็น embedding"""
-        embedding = self.model.encode([text], convert_to_tensor=False)[0]
+        embedding = self.encode([text], show_progress_bar=False)[0]
         return embedding.tolist()  # แปลงเป็น list สำหรับ Pinecone
     
+    def _encode_cached(self, texts, encode_missing):
+        """ดึง embeddings จาก cache แล้ว encode เฉพาะ texts ที่ยังไม่มี (ถ้าไม่มี cache ก็ encode ทั้งหมด)
+        
+        คืน float32 array ขนาด (len(texts), embedding_dim)
+        """
+        if self.cache is None:
+            return encode_missing(texts)
+        
+        cached = self.cache.get_many(texts)
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        missing_idx = []
+        for i, embedding in enumerate(cached):
+            if embedding is None:
+                missing_idx.append(i)
+            else:
+                embeddings[i] = embedding
+        
+        if missing_idx:
+            missing_texts = [texts[i] for i in missing_idx]
+            new_embeddings = encode_missing(missing_texts)
+            self.cache.put_many(missing_texts, new_embeddings)
+            embeddings[missing_idx] = new_embeddings
+        
+        return embeddings
+    
+    def cache_stats(self):
+        """สถิติ hit/miss ของ embedding cache (None ถ้าไม่ได้เปิดใช้หรือยังไม่ได้โหลดโมเดล)"""
+        return self._cache.stats() if self._cache is not None else None
+    
+    def flush_cache(self):
+        """บันทึก index ของ embedding cache ลง disk"""
+        if self._cache is not None:
+            self._cache.flush()
+    
     def batch_encode(self, texts, batch_size=32):
-        """แปลง texts เป็น embeddings แบบ batch"""
-        all_embeddings = []
+        """แปลง texts เป็น embeddings แบบ batch คืน float32 array (len(texts), embedding_dim)
         
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            embeddings = self.encode(batch)
-            all_embeddings.extend(embeddings.tolist())
+        แปลงเป็น list เฉพาะตอนส่งเข้า Pinecone (ดู upsert_writer.serialize_vectors)
+        """
+        def encode_missing(missing):
+            all_embeddings = np.empty((len(missing), self.embedding_dim), dtype=np.float32)
+            for i in range(0, len(missing), batch_size):
+                batch = missing[i:i + batch_size]
+                all_embeddings[i:i + len(batch)] = self.encode(batch, show_progress_bar=False)
+            return all_embeddings
+        
+        return self._encode_cached(texts, encode_missing)
+    
+    def encode_packed(self, texts, batch_size=64, show_progress_bar=False):
+        """แปลง texts จำนวนมาก (จากหลายเอกสาร) โดยเรียงตามความยาวแล้วจัดเป็น batch เต็มๆ
+        
+        ข้อความที่ยาวใกล้เคียงกันอยู่ batch เดียวกัน ทำให้ padding น้อยลง
+        ผลลัพธ์เป็น float32 array ที่เรียงกลับตามลำดับเดิมของ texts
+        """
+        if not texts:
+            return np.empty((0, self.embedding_dim), dtype=np.float32)
+        return self._encode_cached(
+            texts,
+            lambda missing: self._encode_packed_uncached(missing, batch_size, show_progress_bar)
+        )
+    
+    def _encode_packed_uncached(self, texts, batch_size, show_progress_bar):
+        # เรียง index ตามความยาวข้อความ (ยาวก่อน เพื่อให้ batch แรกเจอ memory สูงสุดเร็ว)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        all_embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        
+        batch_starts = range(0, len(order), batch_size)
+        if show_progress_bar:
+            batch_starts = tqdm(batch_starts, desc="Encoding batches")
+        
+        for start in batch_starts:
+            batch_idx = order[start:start + batch_size]
+            all_embeddings[batch_idx] = self.encode(
+                [texts[i] for i in batch_idx],
+                batch_size=batch_size,
+                show_progress_bar=False
+            )
         
         return all_embeddings
 
+# EmbeddingModel ที่ใช้ร่วมกันใน process (upserter และ searcher ใน process เดียวกันใช้โมเดลตัวเดียว)
+_shared_models = {}
+_shared_lock = threading.Lock()
+
+def get_embedding_model(model_name=DEFAULT_MODEL, **kwargs) -> EmbeddingModel:
+    """คืน EmbeddingModel ของ model_name + kwargs ตัวเดียวกันทุกครั้งภายใน process (สร้างแบบ lazy)"""
+    key = (model_name, tuple(sorted(kwargs.items())))
+    with _shared_lock:
+        embedder = _shared_models.get(key)
+        if embedder is None:
+            embedder = EmbeddingModel(model_name, **kwargs)
+            _shared_models[key] = embedder
+    return embedder
+
 # ทดสอบการใช้งาน
 if __name__ == "__main__":
     embedder = EmbeddingModel()
@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from metadata_filter import match_metadata
+
+class FakeThrottleError(Exception):
+    """จำลอง HTTP 429 จาก Pinecone"""
+    status = 429
+
+class FakeIndex:
+    """Index จำลองใน process สำหรับทดสอบ/benchmark โดยไม่ต้องต่อ network
+
+    รองรับ upsert / query / fetch / delete / describe_index_stats แบบเดียวกับ Pinecone index
+    และเพิ่ม latency เทียม (latency ± jitter วินาที) กับโอกาสโดน throttle (throttle_rate)
+    """
+
+    def __init__(self, latency=0.05, jitter=0.01, throttle_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._vectors: Dict[str, tuple] = {}
+        self.upsert_calls = 0
+        self.throttled_calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _simulate_network(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            throttled = self._rng.random() < self.throttle_rate
+        try:
+            time.sleep(delay)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if throttled:
+            with self._lock:
+                self.throttled_calls += 1
+            raise FakeThrottleError("(429) Too Many Requests")
+
+    def upsert(self, vectors: List, **kwargs):
+        self._simulate_network()
+        with self._lock:
+            self.upsert_calls += 1
+            for vector in vectors:
+                if isinstance(vector, dict):
+                    vector_id, values, metadata = vector['id'], vector['values'], vector.get('metadata')
+                else:
+                    vector_id, values = vector[0], vector[1]
+                    metadata = vector[2] if len(vector) > 2 else None
+                self._vectors[vector_id] = (np.asarray(values, dtype=np.float32), metadata or {})
+        return {'upserted_count': len(vectors)}
+
+    def query(self, vector, top_k=10, filter: Optional[Dict[str, Any]] = None,
+              include_metadata=False, include_values=False, **kwargs):
+        self._simulate_network()
+        with self._lock:
+            items = [(vector_id, item) for vector_id, item in self._vectors.items()
+                     if not filter or match_metadata(item[1], filter)]
+        if not items:
+            return {'matches': []}
+
+        matrix = np.stack([values for _, (values, _) in items])
+        query = np.asarray(vector, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        scores = matrix @ query / np.where(norms == 0, 1.0, norms)
+        top = np.argsort(-scores)[:top_k]
+
+        matches = []
+        for row in top:
+            vector_id, (values, metadata) = items[row]
+            match = {'id': vector_id, 'score': float(scores[row])}
+            if include_metadata:
+                match['metadata'] = metadata
+            if include_values:
+                match['values'] = values.tolist()
+            matches.append(match)
+        return {'matches': matches}
+
+    def fetch(self, ids: List[str], **kwargs):
+        self._simulate_network()
+        with self._lock:
+            return {'vectors': {
+                vector_id: {'id': vector_id, 'values': self._vectors[vector_id][0].tolist(),
+                            'metadata': self._vectors[vector_id][1]}
+                for vector_id in ids if vector_id in self._vectors
+            }}
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all=False,
+               filter: Optional[Dict[str, Any]] = None, **kwargs):
+        self._simulate_network()
+        with self._lock:
+            if delete_all:
+                self._vectors.clear()
+            if filter:
+                ids = list(ids or []) + [vector_id for vector_id, (_, metadata) in self._vectors.items()
+                                         if match_metadata(metadata, filter)]
+            for vector_id in ids or []:
+                self._vectors.pop(vector_id, None)
+        return {}
+
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            return {'total_vector_count': len(self._vectors), 'namespaces': {}}
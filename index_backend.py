@@ -0,0 +1,40 @@
+import os
+import threading
+
+from metrics import get_logger, log_event
+
+logger = get_logger('index')
+
+# LocalIndex ที่เปิดแล้วใน process นี้ (upserter และ searcher ต้องใช้ object เดียวกัน)
+_local_indexes = {}
+_lock = threading.Lock()
+
+def open_index(index_name: str, backend: str = None):
+    """เปิด index ตาม backend หรือ VECTOR_BACKEND
+    
+    - 'pinecone' (default): Pinecone index ผ่าน PineconeClient (ต้องมี PINECONE_API_KEY)
+    - 'local': LocalIndex ใน process บันทึกที่ LOCAL_INDEX_DIR/<index_name> (ไม่ต้องใช้ network)
+      LOCAL_INDEX_ANN=ivf เปิดการค้นหาแบบประมาณสำหรับ collection ขนาดใหญ่
+      LOCAL_INDEX_STORAGE=float16/int8 เก็บ vectors แบบ quantize เพื่อลดหน่วยความจำ
+    """
+    backend = backend or os.getenv('VECTOR_BACKEND', 'pinecone')
+    
+    if backend == 'pinecone':
+        from pinecone_client import PineconeClient
+        return PineconeClient().get_index(index_name)
+    
+    if backend == 'local':
+        from local_index import LocalIndex
+        path = os.path.join(os.getenv('LOCAL_INDEX_DIR', '.local_index'), index_name)
+        with _lock:
+            index = _local_indexes.get(path)
+            if index is None:
+                index = LocalIndex(path, ann=os.getenv('LOCAL_INDEX_ANN') or None,
+                                   storage=os.getenv('LOCAL_INDEX_STORAGE', 'float32'))
+                _local_indexes[path] = index
+                count = index.describe_index_stats()['total_vector_count']
+                log_event(logger, f"Opened local index: {path} ({count} vectors)",
+                          event='local_index_opened', path=path, vectors=count)
+        return index
+    
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend} (expected 'pinecone' or 'local')")
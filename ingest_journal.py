@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from sync_manifest import SyncManifest
+from vectorizer import document_id
+
+class IngestJournal:
+    """บันทึกความคืบหน้าของ bulk ingest ระดับ window/batch ใน SQLite เพื่อให้ job ที่ค้างทำต่อได้
+
+    - windows: window ที่ chunk + encode แล้ว (doc_ids, จำนวน chunks, จำนวน upsert batches)
+      embeddings ของ window ถูก spill เป็น <key>.npy + ids/metadata เป็น <key>.json ใน spill directory
+    - batches: upsert batch ที่ index ตอบรับแล้ว (window เป็น done เมื่อครบทุก batch แล้วลบไฟล์ spill)
+    - key ของ window คือ hash ของ id + content hash ทุกเอกสารใน window (รวม ingest config)
+      เอกสารชุดเดิมจึงได้ key เดิม ส่วน window ที่เนื้อหาเปลี่ยนจะถูกประมวลผลใหม่
+    รอบที่ resume: window ที่ done ถูกข้าม, window ที่ spill แล้วส่งเฉพาะ batches ที่ยังไม่ถูกตอบรับ
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.spill_dir = path + '.spill'
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # ack มาจาก upsert threads จึงใช้ connection เดียวร่วมกันภายใต้ lock
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS windows (
+                window_key TEXT PRIMARY KEY,
+                doc_ids TEXT NOT NULL,
+                chunk_counts TEXT NOT NULL,
+                vectors INTEGER NOT NULL,
+                batches INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS batches (
+                window_key TEXT NOT NULL,
+                batch_no INTEGER NOT NULL,
+                PRIMARY KEY (window_key, batch_no)
+            );
+        """)
+        self._conn.commit()
+        self.config = None
+        self.resumed_windows = 0
+        self.skipped_windows = 0
+
+    # ---------- job ----------
+
+    def begin(self, config: str):
+        """เริ่ม/ทำต่อ job ที่ใช้ ingest config นี้ (config ไม่ตรงกับของเดิม = เริ่มใหม่ทั้งหมด)"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'config'").fetchone()
+            if row is not None and row[0] != config:
+                self._clear_locked()
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('config', ?)", (config,))
+                self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('started_at', ?)", (str(time.time()),))
+        self.config = config
+        self.resumed_windows = 0
+        self.skipped_windows = 0
+
+    def _clear_locked(self):
+        with self._conn:
+            self._conn.execute("DELETE FROM windows")
+            self._conn.execute("DELETE FROM batches")
+            self._conn.execute("DELETE FROM meta")
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+        os.makedirs(self.spill_dir, exist_ok=True)
+
+    def finish(self):
+        """job เสร็จครบ: ลบ journal และไฟล์ spill ทั้งหมด"""
+        with self._lock:
+            self._conn.close()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    # ---------- windows ----------
+
+    def window_key(self, window: List[Dict[str, Any]]) -> str:
+        digest = hashlib.sha1()
+        for document in window:
+            digest.update(document_id(document).encode('utf-8'))
+            digest.update(SyncManifest.content_hash(document, self.config or '').encode('ascii'))
+        return digest.hexdigest()
+
+    def _spill_paths(self, key: str) -> Tuple[str, str]:
+        return os.path.join(self.spill_dir, key + '.npy'), os.path.join(self.spill_dir, key + '.json')
+
+    def state(self, key: str) -> Optional[str]:
+        """'done', 'spilled' หรือ None (ยังไม่เคย encode)"""
+        with self._lock:
+            row = self._conn.execute("SELECT done FROM windows WHERE window_key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return 'done' if row[0] else 'spilled'
+
+    def filter_windows(self, windows: Iterable[List[Dict[str, Any]]],
+                       resumed: List[Tuple[str, List[Dict[str, Any]]]]) -> Iterator[List[Dict[str, Any]]]:
+        """ส่งต่อเฉพาะ windows ที่ต้อง encode, ข้าม windows ที่ done และเก็บ windows ที่ spill แล้วไว้ใน resumed"""
+        for window in windows:
+            key = self.window_key(window)
+            state = self.state(key)
+            if state == 'done':
+                self.skipped_windows += 1
+            elif state == 'spilled':
+                resumed.append((key, window))
+            else:
+                yield window
+
+    def spill(self, window: List[Dict[str, Any]], doc_ids: List[str], chunk_counts: List[int],
+              vectors: List[tuple], batch_size: int) -> str:
+        """เขียน embeddings ของ window ลง disk แล้วบันทึกว่า encode แล้ว คืน window key"""
+        key = self.window_key(window)
+        npy_path, json_path = self._spill_paths(key)
+        values = np.stack([np.asarray(values, dtype=np.float32) for _, values, _ in vectors]) if vectors \
+            else np.empty((0, 0), dtype=np.float32)
+        with open(npy_path + '.tmp', 'wb') as f:
+            np.save(f, values)
+        os.replace(npy_path + '.tmp', npy_path)
+        with open(json_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump([[vector_id, metadata] for vector_id, _, metadata in vectors], f, ensure_ascii=False,
+                      default=str)
+        os.replace(json_path + '.tmp', json_path)
+
+        batches = (len(vectors) + batch_size - 1) // batch_size
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO windows VALUES (?, ?, ?, ?, ?, 0, ?)",
+                (key, json.dumps(doc_ids), json.dumps(chunk_counts), len(vectors), batches, time.time())
+            )
+        if batches == 0:
+            self._mark_done(key)
+        return key
+
+    def load(self, key: str) -> Tuple[List[str], List[int], List[tuple]]:
+        """อ่าน window ที่ spill ไว้ คืน (doc_ids, chunk_counts, vectors) โดยไม่ต้อง encode ใหม่"""
+        with self._lock:
+            doc_ids, chunk_counts = self._conn.execute(
+                "SELECT doc_ids, chunk_counts FROM windows WHERE window_key = ?", (key,)
+            ).fetchone()
+        npy_path, json_path = self._spill_paths(key)
+        values = np.load(npy_path)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        vectors = [(vector_id, values[i], metadata) for i, (vector_id, metadata) in enumerate(items)]
+        self.resumed_windows += 1
+        return json.loads(doc_ids), json.loads(chunk_counts), vectors
+
+    # ---------- batches ----------
+
+    def acked_batches(self, key: str) -> Set[int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT batch_no FROM batches WHERE window_key = ?", (key,)).fetchall()
+        return {batch_no for batch_no, in rows}
+
+    def ack(self, key: str, batch_no: int):
+        """บันทึกว่า index ตอบรับ batch แล้ว (เรียกจาก upsert thread)"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT OR IGNORE INTO batches VALUES (?, ?)", (key, batch_no))
+            acked, = self._conn.execute("SELECT COUNT(*) FROM batches WHERE window_key = ?", (key,)).fetchone()
+            total, = self._conn.execute("SELECT batches FROM windows WHERE window_key = ?", (key,)).fetchone()
+            done = acked >= total and self._mark_done_locked(key)
+        if done:
+            self._remove_spill(key)
+
+    def _mark_done(self, key: str):
+        with self._lock:
+            done = self._mark_done_locked(key)
+        if done:
+            self._remove_spill(key)
+
+    def _mark_done_locked(self, key: str) -> bool:
+        """เปลี่ยน window เป็น done คืน True เฉพาะ thread ที่เปลี่ยนได้ (ack batch สุดท้ายซ้ำจะได้ False)"""
+        with self._conn:
+            changed = self._conn.execute(
+                "UPDATE windows SET done = 1, updated_at = ? WHERE window_key = ? AND done = 0", (time.time(), key)
+            ).rowcount
+            if changed:
+                self._conn.execute("DELETE FROM batches WHERE window_key = ?", (key,))
+        return bool(changed)
+
+    def _remove_spill(self, key: str):
+        for path in self._spill_paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            done, spilled, vectors = self._conn.execute(
+                "SELECT COALESCE(SUM(done), 0), COALESCE(SUM(1 - done), 0), COALESCE(SUM(vectors), 0) FROM windows"
+            ).fetchone()
+        spill_bytes = sum(entry.stat().st_size for entry in os.scandir(self.spill_dir))
+        return {
+            'windows_done': done,
+            'windows_spilled': spilled,
+            'vectors': vectors,
+            'spill_bytes': spill_bytes,
+            'resumed_windows': self.resumed_windows,
+            'skipped_windows': self.skipped_windows,
+        }
+
+def open_journal(index_name: str, source: str, path: Optional[str] = None) -> IngestJournal:
+    """journal ของ job (index_name, source) ที่ path หรือ INGEST_JOURNAL_DIR (default .ingest_journal)"""
+    if path is None:
+        job = hashlib.sha1(f"{index_name}|{source}".encode('utf-8')).hexdigest()[:16]
+        path = os.path.join(os.getenv('INGEST_JOURNAL_DIR', '.ingest_journal'), f"{index_name}-{job}.db")
+    return IngestJournal(path)
@@ -0,0 +1,109 @@
+import json
+from typing import Any, Dict, Iterator, TextIO
+
+_WHITESPACE = ' \t\n\r'
+# ตัวอักษรที่ตามหลัง value ได้ใน JSON ที่ถูกต้อง (':' ตามหลัง key ของ object)
+_DELIMITERS = ',]}:' + _WHITESPACE
+
+class _JSONStreamReader:
+    """อ่าน JSON จากไฟล์ทีละส่วน โดยถือ buffer แค่ขนาดของ value ที่กำลัง decode"""
+
+    def __init__(self, f: TextIO, buffer_size: int = 1 << 20):
+        self.f = f
+        self.buffer_size = buffer_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size: int) -> bool:
+        """อ่านข้อมูลเพิ่มต่อท้าย buffer (ทิ้งส่วนที่ใช้ไปแล้ว)"""
+        if self.eof:
+            return False
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """ตัวอักษรถัดไปที่ไม่ใช่ whitespace ('' ถ้าจบไฟล์)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill(self.buffer_size):
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at JSON stream position, got {self.peek()!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """decode value ถัดไป ถ้า buffer ยังไม่พอจะอ่านเพิ่ม (ขนาดเพิ่มเป็นเท่าตัว)"""
+        self.peek()
+        read_size = self.buffer_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # ตัวเลขที่ถูกตัดกลางทาง ('1' จาก '1.5' หรือ '1e3') decode ได้เหมือนกัน
+                # จึงรับ value เมื่อตัวถัดไปเป็นตัวคั่นหรือจบไฟล์แล้วเท่านั้น
+                if (end < len(self.buf) and self.buf[end] in _DELIMITERS) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill(read_size):
+                continue
+            read_size *= 2
+
+    def iter_array(self) -> Iterator[Any]:
+        """วนทีละ element ของ array (ตำแหน่งปัจจุบันต้องอยู่ที่ '[')"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
+
+def iter_json_documents(f: TextIO, buffer_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """อ่านเอกสารจาก JSON แบบ streaming รองรับ 3 รูปแบบเหมือน json.load เดิม
+
+    - [ {...}, {...} ]             -> ทีละ element
+    - {"documents": [ {...} ], ...} -> ทีละ element ของ documents
+    - { ...เอกสารเดียว... }          -> ทั้ง object
+    """
+    reader = _JSONStreamReader(f, buffer_size)
+    first = reader.peek()
+
+    if first == '[':
+        yield from reader.iter_array()
+        return
+
+    if first != '{':
+        raise ValueError(f"Unsupported JSON document structure starting with {first!r}")
+
+    # object: หา key "documents" ระหว่างอ่าน ถ้าไม่เจอถือว่าทั้ง object เป็นเอกสารเดียว
+    reader.pos += 1
+    fields = {}
+    while reader.peek() != '}':
+        key = reader.value()
+        reader.expect(':')
+        if key == 'documents' and reader.peek() == '[':
+            yield from reader.iter_array()
+            return
+        fields[key] = reader.value()
+        if reader.peek() == ',':
+            reader.pos += 1
+    reader.pos += 1
+    yield fields
@@ -0,0 +1,542 @@
+import atexit
+import json
+import os
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from metadata_filter import MetadataIndex
+from quantization import check_storage, matvec, quantize_int8
+
+class _MetadataColumn:
+    """metadata ต่อแถวที่อ่านจาก metadata.jsonl (memory-mapped) และ decode เฉพาะแถวที่ใช้
+
+    แถวที่แก้ไขหรือเพิ่มหลังโหลดเก็บไว้ในหน่วยความจำ ใช้แทน list ของ metadata ได้
+    (get/set ด้วยแถว, slice และ append)
+    """
+
+    def __init__(self, path: str, offsets: np.ndarray):
+        self._data = np.memmap(path, dtype=np.uint8, mode='r') if offsets[-1] else np.empty(0, dtype=np.uint8)
+        self._offsets = offsets
+        self._stored = len(offsets) - 1
+        self._changed: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._appended: List[Optional[Dict[str, Any]]] = []
+
+    def __len__(self):
+        return self._stored + len(self._appended)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row >= self._stored:
+            return self._appended[row - self._stored]
+        if row in self._changed:
+            return self._changed[row]
+        return json.loads(self._data[self._offsets[row]:self._offsets[row + 1]].tobytes())
+
+    def __setitem__(self, row: int, metadata: Optional[Dict[str, Any]]):
+        if row >= self._stored:
+            self._appended[row - self._stored] = metadata
+        else:
+            self._changed[row] = metadata
+
+    def append(self, metadata: Optional[Dict[str, Any]]):
+        self._appended.append(metadata)
+
+class LocalIndex:
+    """Vector index ใน process ที่ใช้แทน Pinecone index ได้ (upsert / query / fetch / delete / describe_index_stats)
+
+    - exact: cosine/dot product ของทุก vector ด้วย matrix-vector product บน float32 matrix ต่อเนื่อง
+    - ann='ivf': แบ่ง vectors เป็น nlist กลุ่มด้วย k-means แล้วค้นหาเฉพาะ nprobe กลุ่มที่ใกล้ query ที่สุด
+      (เปิดใช้เมื่อมี vectors ตั้งแต่ ann_min_vectors ขึ้นไป ต่ำกว่านั้น exact เร็วพออยู่แล้ว)
+    - storage: 'float32' (default), 'float16' หรือ 'int8' (scale ต่อแถว) ลดหน่วยความจำ 2-4 เท่า
+      แลกกับ recall ที่ลดลงเล็กน้อย (ดู quantization.py)
+    - path: โฟลเดอร์ที่บันทึก index (vectors.npy ถูกเปิดแบบ memory-mapped ตอนโหลด จึงเริ่มได้ทันที)
+      บันทึกเมื่อเรียก save() และตอนจบโปรแกรม index.json เก็บเฉพาะ header ส่วน ids อยู่ใน ids.npy
+      และ metadata อยู่ใน metadata.jsonl (แถวละบรรทัด) ที่ decode เฉพาะแถวที่ใช้
+    """
+
+    # รับ values เป็น numpy array ได้โดยตรง (ConcurrentUpsertWriter ไม่ต้องแปลงเป็น list)
+    accepts_arrays = True
+
+    def __init__(self, path: Optional[str] = None, dimension: Optional[int] = None, metric: str = 'cosine',
+                 ann: Optional[str] = None, nlist: Optional[int] = None, nprobe: int = 8,
+                 ann_min_vectors: int = 20000, storage: str = 'float32'):
+        if metric not in ('cosine', 'dotproduct'):
+            raise ValueError(f"Unsupported metric for LocalIndex: {metric}")
+        if ann not in (None, 'ivf'):
+            raise ValueError(f"Unsupported ann mode for LocalIndex: {ann}")
+
+        self.path = path
+        self.dimension = dimension
+        self.metric = metric
+        self.ann = ann
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ann_min_vectors = ann_min_vectors
+        self.storage = check_storage(storage)
+
+        self._lock = threading.RLock()
+        self._reset()
+
+        if path and os.path.exists(os.path.join(path, 'index.json')):
+            self._load()
+        if path:
+            atexit.register(self.save)
+
+    def _reset(self):
+        dimension = self.dimension or 0
+        self._ids: List[Optional[str]] = []
+        self._metadata: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._vectors = np.empty((0, dimension), dtype=self.storage)
+        # scale ของ int8 (ค่าจริง ≈ codes * qscale) ส่วน float32/float16 เป็น 1
+        self._qscales = np.empty(0, dtype=np.float32)
+        # ตัวคูณ score ของแต่ละแถว: qscale/norm สำหรับ cosine, qscale สำหรับ dot product
+        self._scales = np.empty(0, dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        self._size = 0
+        self._centroids = None
+        self._assign = np.empty(0, dtype=np.int32)
+        self._lists = None
+        self._trained_size = 0
+        # inverted index ของ metadata สร้างเมื่อใช้ filter ครั้งแรก แล้วอัปเดตตามการเขียน
+        self._metadata_index = None
+        self._dirty = False
+
+    # ---------- storage ----------
+
+    def _ensure_capacity(self, extra: int):
+        """ขยาย arrays (เท่าตัว) และแปลง memmap แบบอ่านอย่างเดียวเป็น array ในหน่วยความจำก่อนเขียน"""
+        capacity = len(self._vectors)
+        needed = self._size + extra
+        if needed <= capacity and self._vectors.flags.writeable:
+            return
+        capacity = max(needed, capacity * 2 if needed > capacity else capacity, 1024)
+
+        vectors = np.empty((capacity, self.dimension), dtype=self.storage)
+        vectors[:self._size] = self._vectors[:self._size]
+        qscales = np.ones(capacity, dtype=np.float32)
+        qscales[:self._size] = self._qscales[:self._size]
+        scales = np.zeros(capacity, dtype=np.float32)
+        scales[:self._size] = self._scales[:self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        assign = np.full(capacity, -1, dtype=np.int32)
+        assign[:self._size] = self._assign[:self._size]
+
+        self._vectors, self._qscales, self._scales = vectors, qscales, scales
+        self._alive, self._assign = alive, assign
+
+    def _quantize(self, values: np.ndarray):
+        """float32 -> (ค่าที่เก็บตาม storage, qscale ต่อแถว)"""
+        if self.storage == 'int8':
+            return quantize_int8(values)
+        return values.astype(self.storage, copy=False), np.ones(len(values), dtype=np.float32)
+
+    def _decode(self, rows) -> np.ndarray:
+        """vectors ของแถวที่ระบุกลับเป็น float32"""
+        return self._vectors[rows].astype(np.float32) * self._qscales[rows, None]
+
+    def _row_scales(self, values: np.ndarray) -> np.ndarray:
+        if self.metric == 'dotproduct':
+            return np.ones(len(values), dtype=np.float32)
+        norms = np.linalg.norm(values, axis=1)
+        return np.where(norms > 0, 1.0 / np.where(norms > 0, norms, 1.0), 0.0).astype(np.float32)
+
+    @staticmethod
+    def _parse_vectors(vectors: List):
+        """รองรับทั้ง tuple (id, values, metadata) และ dict {'id', 'values', 'metadata'}"""
+        ids, values, metadata = [], [], []
+        for vector in vectors:
+            if isinstance(vector, dict):
+                ids.append(vector['id'])
+                values.append(vector['values'])
+                metadata.append(vector.get('metadata') or {})
+            else:
+                ids.append(vector[0])
+                values.append(vector[1])
+                metadata.append((vector[2] if len(vector) > 2 else None) or {})
+        return ids, values, metadata
+
+    def upsert(self, vectors: List, **kwargs):
+        ids, values, metadata = self._parse_vectors(vectors)
+        if not ids:
+            return {'upserted_count': 0}
+        values = np.asarray(values, dtype=np.float32).reshape(len(ids), -1)
+
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = values.shape[1]
+                self._vectors = self._vectors.reshape(0, self.dimension)
+            if values.shape[1] != self.dimension:
+                raise ValueError(f"Vector dimension {values.shape[1]} does not match index dimension {self.dimension}")
+
+            self._ensure_capacity(len(ids))
+            rows = np.empty(len(ids), dtype=np.int64)
+            for i, (vector_id, meta) in enumerate(zip(ids, metadata)):
+                row = self._rows.get(vector_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[vector_id] = row
+                    self._ids.append(vector_id)
+                    self._metadata.append(meta)
+                else:
+                    if self._metadata_index is not None:
+                        self._metadata_index.remove(row, self._metadata[row])
+                    self._metadata[row] = meta
+                if self._metadata_index is not None:
+                    self._metadata_index.add(row, meta)
+                rows[i] = row
+
+            stored, qscales = self._quantize(values)
+            row_scales = self._row_scales(values)
+            self._vectors[rows] = stored
+            self._qscales[rows] = qscales
+            self._scales[rows] = row_scales * qscales
+            self._alive[rows] = True
+            if self._centroids is not None:
+                self._assign[rows] = self._nearest_centroids(values * row_scales[:, None])
+            self._lists = None
+            self._dirty = True
+
+        return {'upserted_count': len(ids)}
+
+    def fetch(self, ids: List[str], **kwargs):
+        with self._lock:
+            vectors = {}
+            for vector_id in ids:
+                row = self._rows.get(vector_id)
+                if row is not None:
+                    vectors[vector_id] = {
+                        'id': vector_id,
+                        'values': self._decode([row])[0].tolist(),
+                        'metadata': self._metadata[row],
+                    }
+            return {'vectors': vectors}
+
+    def _filter_index(self) -> MetadataIndex:
+        if self._metadata_index is None:
+            self._metadata_index = MetadataIndex()
+            for row, metadata in enumerate(self._metadata[:self._size]):
+                if metadata is not None:
+                    self._metadata_index.add(row, metadata)
+        return self._metadata_index
+
+    def _filter_rows(self, filter_dict: Dict[str, Any]) -> np.ndarray:
+        """bitmap ของแถวที่ metadata ตรงกับ filter (ประเมินจาก inverted index ไม่ได้วนทุกแถว)"""
+        return self._filter_index().mask(filter_dict, self._size)
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False,
+               filter: Optional[Dict[str, Any]] = None, **kwargs):
+        with self._lock:
+            if delete_all:
+                self._reset()
+                self._dirty = True
+                return {}
+
+            rows = [self._rows[vector_id] for vector_id in ids or [] if vector_id in self._rows]
+            if filter:
+                mask = self._alive[:self._size] & self._filter_rows(filter)
+                rows.extend(np.flatnonzero(mask).tolist())
+
+            for row in rows:
+                vector_id = self._ids[row]
+                if vector_id is None:
+                    continue
+                del self._rows[vector_id]
+                if self._metadata_index is not None:
+                    self._metadata_index.remove(row, self._metadata[row])
+                self._ids[row] = None
+                self._metadata[row] = None
+                self._alive[row] = False
+
+            if rows:
+                self._lists = None
+                self._dirty = True
+                if self._size - len(self._rows) > max(1024, len(self._rows)):
+                    self._compact()
+        return {}
+
+    def _compact(self):
+        """ย้ายแถวที่ยังอยู่มาต่อกัน ตัดแถวที่ถูกลบทิ้ง"""
+        keep = np.flatnonzero(self._alive[:self._size])
+        self._vectors = self._vectors[keep]
+        self._qscales = self._qscales[keep]
+        self._scales = self._scales[keep]
+        self._alive = self._alive[keep]
+        self._assign = self._assign[keep]
+        self._ids = [self._ids[row] for row in keep]
+        self._metadata = [self._metadata[row] for row in keep]
+        self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        self._size = len(keep)
+        self._lists = None
+        self._metadata_index = None
+
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            return {
+                'dimension': self.dimension,
+                'index_fullness': 0.0,
+                'total_vector_count': len(self._rows),
+                'namespaces': {},
+            }
+
+    # ---------- IVF ----------
+
+    def _nearest_centroids(self, unit_vectors: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        labels = np.empty(len(unit_vectors), dtype=np.int32)
+        for start in range(0, len(unit_vectors), chunk_size):
+            block = unit_vectors[start:start + chunk_size]
+            labels[start:start + chunk_size] = np.argmax(block @ self._centroids.T, axis=1)
+        return labels
+
+    def train_ivf(self, nlist: Optional[int] = None, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+        """สร้าง centroids ด้วย spherical k-means จาก sample ของ vectors แล้วจัดทุกแถวเข้ากลุ่ม"""
+        with self._lock:
+            live = np.flatnonzero(self._alive[:self._size])
+            if len(live) == 0:
+                return
+            nlist = min(nlist or self.nlist or max(1, int(np.sqrt(len(live)))), len(live))
+            rng = np.random.default_rng(seed)
+
+            sample = live if len(live) <= sample_size else rng.choice(live, sample_size, replace=False)
+            data = self._vectors[sample] * self._scales[sample, None]
+            centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+
+            for _ in range(iterations):
+                labels = np.argmax(data @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, data)
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                # กลุ่มที่ว่างใช้ centroid เดิม
+                centroids = np.where(norms > 0, sums / np.where(norms > 0, norms, 1.0), centroids)
+
+            self._centroids = centroids.astype(np.float32)
+            if not self._assign.flags.writeable:
+                self._assign = np.array(self._assign)
+            self._assign[live] = self._nearest_centroids(self._vectors[live] * self._scales[live, None])
+            self._trained_size = len(live)
+            self._lists = None
+            self._dirty = True
+
+    def _ivf_ready(self) -> bool:
+        """ใช้ IVF ได้ไหม (train ใหม่เมื่อจำนวน vectors เพิ่มเกินเท่าตัวจากตอน train)"""
+        if self.ann != 'ivf' or len(self._rows) < self.ann_min_vectors:
+            return False
+        if self._centroids is None or len(self._rows) > 2 * self._trained_size:
+            self.train_ivf()
+        return True
+
+    def _probe_rows(self, unit_query: np.ndarray, nprobe: int) -> np.ndarray:
+        """แถวใน nprobe กลุ่มที่ centroid ใกล้ query ที่สุด"""
+        if self._lists is None:
+            order = np.argsort(self._assign[:self._size], kind='stable')
+            offsets = np.searchsorted(self._assign[:self._size][order], np.arange(len(self._centroids) + 1))
+            self._lists = (order, offsets)
+        order, offsets = self._lists
+
+        nprobe = min(nprobe, len(self._centroids))
+        probes = np.argpartition(-(self._centroids @ unit_query), nprobe - 1)[:nprobe]
+        return np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probes])
+
+    # ---------- query ----------
+
+    def _scan(self, query: np.ndarray, rows: Optional[np.ndarray], filter_dict: Optional[Dict[str, Any]], top_k: int):
+        """คืน (rows, scores) ของ top_k แถวที่ดีที่สุดในชุด rows (None = ทุกแถว)"""
+        size = self._size
+        if rows is None:
+            mask = self._alive[:size]
+            if filter_dict:
+                mask = mask & self._filter_rows(filter_dict)
+            candidates = np.flatnonzero(mask)
+            if len(candidates) < size // 2:
+                # pre-filter: คำนวณ score เฉพาะแถวที่ผ่าน filter ยิ่ง filter เลือกน้อยยิ่งเร็ว
+                rows = candidates
+            else:
+                scores = matvec(self._vectors[:size], query)
+                scores *= self._scales[:size]
+                scores = scores[candidates]
+        else:
+            mask = self._alive[rows]
+            if filter_dict:
+                mask &= self._filter_rows(filter_dict)[rows]
+            rows = rows[mask]
+
+        if rows is not None:
+            candidates = rows
+            scores = matvec(self._vectors[rows], query)
+            scores *= self._scales[rows]
+
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return candidates[best], scores[best]
+
+    def query(self, vector=None, top_k: int = 10, filter: Optional[Dict[str, Any]] = None,
+              include_metadata: bool = False, include_values: bool = False, id: Optional[str] = None,
+              nprobe: Optional[int] = None, **kwargs):
+        with self._lock:
+            if vector is None and id is not None:
+                row = self._rows.get(id)
+                if row is None:
+                    return {'matches': []}
+                vector = self._decode([row])[0]
+            if self._size == 0 or top_k <= 0:
+                return {'matches': []}
+
+            query = np.asarray(vector, dtype=np.float32)
+            if self.metric == 'cosine':
+                norm = np.linalg.norm(query)
+                query = query / norm if norm > 0 else query
+
+            rows, scores = None, None
+            if self._ivf_ready():
+                rows, scores = self._scan(query, self._probe_rows(query, nprobe or self.nprobe), filter, top_k)
+                # filter ที่เลือกน้อยมากอาจไม่เจอครบใน nprobe กลุ่ม ให้ค้นหาแบบ exact แทน
+                if len(rows) < top_k and len(rows) < len(self._rows):
+                    rows = None
+            if rows is None:
+                rows, scores = self._scan(query, None, filter, top_k)
+
+            matches = []
+            for row, score in zip(rows.tolist(), scores.tolist()):
+                match = {'id': self._ids[row], 'score': score}
+                if include_metadata:
+                    match['metadata'] = self._metadata[row]
+                if include_values:
+                    match['values'] = self._decode([row])[0].tolist()
+                matches.append(match)
+            return {'matches': matches}
+
+    # ---------- persistence ----------
+
+    def _save_array(self, name: str, array: np.ndarray):
+        tmp_path = os.path.join(self.path, name + '.tmp.npy')
+        np.save(tmp_path, array)
+        os.replace(tmp_path, os.path.join(self.path, name + '.npy'))
+
+    def save(self):
+        """บันทึก index ลง path (เขียนไฟล์ชั่วคราวแล้ว rename)"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            if self._size != len(self._rows):
+                self._compact()
+            os.makedirs(self.path, exist_ok=True)
+
+            self._save_array('vectors', self._vectors[:self._size])
+            self._save_array('scales', self._scales[:self._size])
+            if self.storage == 'int8':
+                self._save_array('qscales', self._qscales[:self._size])
+            self._save_array('assign', self._assign[:self._size])
+            if self._centroids is not None:
+                self._save_array('centroids', self._centroids)
+            self._save_array('ids', np.array(self._ids[:self._size], dtype=str))
+            self._save_metadata()
+
+            info = {
+                'dimension': self.dimension,
+                'metric': self.metric,
+                'storage': self.storage,
+                'count': self._size,
+                'trained_size': self._trained_size if self._centroids is not None else 0,
+                'saved_at': time.time(),
+            }
+            tmp_path = os.path.join(self.path, 'index.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, os.path.join(self.path, 'index.json'))
+            self._dirty = False
+
+    def _save_metadata(self):
+        """metadata.jsonl แถวละบรรทัด + ตำแหน่งเริ่มของแต่ละแถว (metadata_offsets.npy) สำหรับอ่านทีละแถว"""
+        offsets = np.zeros(self._size + 1, dtype=np.int64)
+        tmp_path = os.path.join(self.path, 'metadata.jsonl.tmp')
+        with open(tmp_path, 'wb') as f:
+            for row, metadata in enumerate(self._metadata[:self._size]):
+                line = json.dumps(metadata, ensure_ascii=False, default=str).encode('utf-8') + b'\n'
+                f.write(line)
+                offsets[row + 1] = offsets[row] + len(line)
+        os.replace(tmp_path, os.path.join(self.path, 'metadata.jsonl'))
+        self._save_array('metadata_offsets', offsets)
+
+    def _load(self):
+        with open(os.path.join(self.path, 'index.json'), 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        if info['metric'] != self.metric:
+            raise ValueError(f"Index at {self.path} uses metric {info['metric']}, not {self.metric}")
+        # index ที่บันทึกก่อนมี storage เป็น float32
+        if info.get('storage', 'float32') != self.storage:
+            raise ValueError(f"Index at {self.path} uses storage {info.get('storage', 'float32')}, not {self.storage}")
+
+        self.dimension = info['dimension']
+        self._vectors = np.load(os.path.join(self.path, 'vectors.npy'), mmap_mode='r')
+        if len(self._vectors) != info['count']:
+            raise ValueError(f"Index at {self.path} is inconsistent: {len(self._vectors)} vectors, {info['count']} ids")
+        self._scales = np.load(os.path.join(self.path, 'scales.npy'), mmap_mode='r')
+        if self.storage == 'int8':
+            self._qscales = np.load(os.path.join(self.path, 'qscales.npy'), mmap_mode='r')
+        else:
+            self._qscales = np.ones(info['count'], dtype=np.float32)
+        self._assign = np.load(os.path.join(self.path, 'assign.npy'), mmap_mode='r')
+        self._alive = np.ones(info['count'], dtype=bool)
+        if 'ids' in info:
+            # index ที่บันทึกก่อนแยก ids/metadata ออกจาก index.json
+            self._ids, self._metadata = info['ids'], info['metadata']
+        else:
+            self._ids = np.load(os.path.join(self.path, 'ids.npy')).tolist()
+            offsets = np.load(os.path.join(self.path, 'metadata_offsets.npy'))
+            if len(self._ids) != info['count'] or len(offsets) != info['count'] + 1:
+                raise ValueError(f"Index at {self.path} is inconsistent: {len(self._ids)} ids, {info['count']} vectors")
+            self._metadata = _MetadataColumn(os.path.join(self.path, 'metadata.jsonl'), offsets)
+        self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        self._size = info['count']
+
+        centroids_path = os.path.join(self.path, 'centroids.npy')
+        if info['trained_size'] and os.path.exists(centroids_path):
+            self._centroids = np.load(centroids_path)
+            self._trained_size = info['trained_size']
+
+# ทดสอบ: exact vs IVF บน vectors สุ่ม
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    count, dimension = 200000, 384
+    print(f"Generating {count:,} x {dimension} vectors...")
+    # embeddings จริงจับกลุ่มตามหัวข้อ จึงสร้างเป็นกลุ่มรอบ ๆ จุดศูนย์กลางสุ่ม
+    topics = rng.normal(size=(2000, dimension)).astype(np.float32)
+    data = topics[rng.integers(0, len(topics), count)] + rng.normal(scale=0.6, size=(count, dimension)).astype(np.float32)
+
+    exact = LocalIndex(dimension=dimension)
+    ivf = LocalIndex(dimension=dimension, ann='ivf', nprobe=16)
+    for start in range(0, count, 10000):
+        batch = [(f"v{i}", data[i], {'group': i % 10}) for i in range(start, min(start + 10000, count))]
+        exact.upsert(batch)
+        ivf.upsert(batch)
+
+    started = time.perf_counter()
+    ivf.train_ivf()
+    print(f"IVF trained in {time.perf_counter() - started:.1f} s ({len(ivf._centroids)} lists)")
+
+    queries = data[rng.choice(count, 100, replace=False)] + rng.normal(scale=0.3, size=(100, dimension)).astype(np.float32)
+    for name, index in (('exact', exact), ('ivf', ivf)):
+        started = time.perf_counter()
+        results = [index.query(vector=q, top_k=10) for q in queries]
+        elapsed = (time.perf_counter() - started) / len(queries)
+        print(f"{name:6s} {elapsed * 1000:.2f} ms/query")
+        if name == 'exact':
+            truth = [{m['id'] for m in r['matches']} for r in results]
+        else:
+            recall = np.mean([len(truth[i] & {m['id'] for m in r['matches']}) / 10 for i, r in enumerate(results)])
+            print(f"IVF recall@10 = {recall:.3f}")
+
+    started = time.perf_counter()
+    filtered = exact.query(vector=queries[0], top_k=5, filter={'group': {'$in': [1, 2]}})
+    print(f"Filtered query: {(time.perf_counter() - started) * 1000:.1f} ms, {len(filtered['matches'])} matches")
@@ -0,0 +1,228 @@
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+_MISSING = object()
+
+def _as_values(value):
+    """metadata field ที่เป็น list ถือว่าตรงถ้า element ใดตรง (เหมือน Pinecone)"""
+    return value if isinstance(value, list) else [value]
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _value_key(value):
+    """key ของค่าใน inverted index: ตัวเลขทุกชนิดเทียบกันด้วย float และ bool ไม่ชนกับ 0/1"""
+    if isinstance(value, bool):
+        return ('b', value)
+    if _is_number(value):
+        return ('n', float(value))
+    return ('v', value)
+
+def _compare(op: str, value, operand) -> bool:
+    if value is _MISSING:
+        # field ที่ไม่มีตรงกับ $ne/$nin และ $exists: false เท่านั้น
+        return op in ('$ne', '$nin') or (op == '$exists' and not operand)
+    if op == '$exists':
+        return bool(operand)
+    if op == '$eq':
+        return any(_value_key(v) == _value_key(operand) for v in _as_values(value))
+    if op == '$ne':
+        return all(_value_key(v) != _value_key(operand) for v in _as_values(value))
+    if op in ('$in', '$nin'):
+        keys = [_value_key(item) for item in operand]
+        found = any(_value_key(v) in keys for v in _as_values(value))
+        return found if op == '$in' else not found
+    if op in ('$gt', '$gte', '$lt', '$lte'):
+        if not _is_number(value) or not _is_number(operand):
+            return False
+        if op == '$gt':
+            return value > operand
+        if op == '$gte':
+            return value >= operand
+        if op == '$lt':
+            return value < operand
+        return value <= operand
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+def match_metadata(metadata: Dict[str, Any], filter_dict: Optional[Dict[str, Any]]) -> bool:
+    """ตรวจว่า metadata ตรงกับ filter รูปแบบ Pinecone หรือไม่
+
+    รองรับ {"field": value}, {"field": {"$op": value}} และ $and / $or
+    """
+    if not filter_dict:
+        return True
+    for key, condition in filter_dict.items():
+        if key == '$and':
+            if not all(match_metadata(metadata, sub) for sub in condition):
+                return False
+        elif key == '$or':
+            if not any(match_metadata(metadata, sub) for sub in condition):
+                return False
+        else:
+            value = metadata.get(key, _MISSING)
+            conditions = condition if isinstance(condition, dict) else {'$eq': condition}
+            if not all(_compare(op, value, operand) for op, operand in conditions.items()):
+                return False
+    return True
+
+def filter_fields(filter_dict: Optional[Dict[str, Any]]) -> Set[str]:
+    """ชื่อ field ทั้งหมดที่ filter ใช้ (รวมใน $and / $or)"""
+    fields = set()
+    for key, condition in (filter_dict or {}).items():
+        if key in ('$and', '$or'):
+            for sub in condition:
+                fields |= filter_fields(sub)
+        else:
+            fields.add(key)
+    return fields
+
+def required_values(filter_dict: Optional[Dict[str, Any]], field: str) -> Optional[List[Any]]:
+    """ค่าที่ field ต้องเป็นถึงจะตรงกับ filter ($eq/$in ที่ระดับบนสุดหรือใน $and)
+
+    คืน None ถ้า filter ไม่ได้บังคับค่าของ field นี้ (ใช้เลือกแถวจาก index ของ field ก่อนตรวจทั้ง filter)
+    """
+    for key, condition in (filter_dict or {}).items():
+        if key == '$and':
+            for sub in condition:
+                values = required_values(sub, field)
+                if values is not None:
+                    return values
+        elif key == field:
+            if not isinstance(condition, dict):
+                return [condition]
+            if '$eq' in condition:
+                return [condition['$eq']]
+            if '$in' in condition:
+                return list(condition['$in'])
+    return None
+
+class MetadataIndex:
+    """Inverted index ของ metadata ต่อ field สำหรับประเมิน filter เป็น bitmap โดยไม่ต้องวนทุกแถว
+
+    - ค่าที่เท่ากัน ($eq/$in/$ne/$nin): field -> value -> set ของแถว
+    - ช่วงตัวเลข ($gt/$gte/$lt/$lte): ค่าตัวเลขของ field เรียงไว้ (สร้างเมื่อใช้ครั้งแรกหลังมีการแก้ไข)
+    - $exists: field -> set ของแถวที่มี field นี้
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[Any, set]] = {}
+        self._present: Dict[str, set] = {}
+        self._numbers: Dict[str, Dict[int, float]] = {}
+        self._sorted: Dict[str, tuple] = {}
+        # posting lists ที่แปลงเป็น numpy แล้ว: field -> key -> array
+        self._arrays: Dict[str, Dict[Any, np.ndarray]] = {}
+
+    def add(self, row: int, metadata: Dict[str, Any]):
+        for field, value in metadata.items():
+            self._present.setdefault(field, set()).add(row)
+            postings = self._postings.setdefault(field, {})
+            for v in _as_values(value):
+                try:
+                    postings.setdefault(_value_key(v), set()).add(row)
+                except TypeError:
+                    continue  # ค่าที่ hash ไม่ได้ (เช่น dict) ใช้ filter ไม่ได้อยู่แล้ว
+            if _is_number(value):
+                self._numbers.setdefault(field, {})[row] = value
+                self._sorted.pop(field, None)
+            self._arrays.pop(field, None)
+
+    def remove(self, row: int, metadata: Dict[str, Any]):
+        for field, value in metadata.items():
+            self._present.get(field, set()).discard(row)
+            postings = self._postings.get(field, {})
+            for v in _as_values(value):
+                try:
+                    key = _value_key(v)
+                except TypeError:
+                    continue
+                rows = postings.get(key)
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del postings[key]
+            if _is_number(value):
+                self._numbers.get(field, {}).pop(row, None)
+                self._sorted.pop(field, None)
+            self._arrays.pop(field, None)
+
+    def _rows_array(self, field: str, value=_MISSING) -> np.ndarray:
+        """posting list ของ field=value (หรือแถวที่มี field ถ้าไม่ส่ง value) เป็น numpy array
+
+        cache ไว้จนกว่า field นั้นจะถูกแก้ไข
+        """
+        try:
+            key = _value_key(value) if value is not _MISSING else _MISSING
+            arrays = self._arrays.setdefault(field, {})
+            rows = arrays.get(key)
+        except TypeError:
+            return np.empty(0, dtype=np.int64)
+        if rows is None:
+            if key is _MISSING:
+                source = self._present.get(field, ())
+            else:
+                source = self._postings.get(field, {}).get(key, ())
+            rows = np.fromiter(source, dtype=np.int64, count=len(source))
+            arrays[key] = rows
+        return rows
+
+    def _range_rows(self, field: str, op: str, operand) -> np.ndarray:
+        if not _is_number(operand):
+            return np.empty(0, dtype=np.int64)
+        if field not in self._sorted:
+            numbers = self._numbers.get(field, {})
+            rows = np.fromiter(numbers.keys(), dtype=np.int64, count=len(numbers))
+            values = np.fromiter(numbers.values(), dtype=np.float64, count=len(numbers))
+            order = np.argsort(values, kind='stable')
+            self._sorted[field] = (values[order], rows[order])
+        values, rows = self._sorted[field]
+        if op == '$gt':
+            return rows[np.searchsorted(values, operand, side='right'):]
+        if op == '$gte':
+            return rows[np.searchsorted(values, operand, side='left'):]
+        if op == '$lt':
+            return rows[:np.searchsorted(values, operand, side='left')]
+        return rows[:np.searchsorted(values, operand, side='right')]
+
+    def _mask(self, rows: np.ndarray, size: int) -> np.ndarray:
+        mask = np.zeros(size, dtype=bool)
+        mask[rows[rows < size]] = True
+        return mask
+
+    def _condition_mask(self, field: str, op: str, operand, size: int) -> np.ndarray:
+        if op == '$eq':
+            return self._mask(self._rows_array(field, operand), size)
+        if op == '$ne':
+            return ~self._mask(self._rows_array(field, operand), size)
+        if op in ('$in', '$nin'):
+            mask = np.zeros(size, dtype=bool)
+            for value in operand:
+                mask |= self._mask(self._rows_array(field, value), size)
+            return mask if op == '$in' else ~mask
+        if op == '$exists':
+            mask = self._mask(self._rows_array(field), size)
+            return mask if operand else ~mask
+        if op in ('$gt', '$gte', '$lt', '$lte'):
+            return self._mask(self._range_rows(field, op, operand), size)
+        raise ValueError(f"Unsupported filter operator: {op}")
+
+    def mask(self, filter_dict: Optional[Dict[str, Any]], size: int) -> np.ndarray:
+        """bitmap (bool array ยาว size) ของแถวที่ตรงกับ filter รูปแบบ Pinecone
+
+        ผลลัพธ์อาจรวมแถวที่ถูกลบแล้ว (เช่นจาก $ne) ผู้เรียกต้อง AND กับแถวที่ยังอยู่
+        """
+        mask = np.ones(size, dtype=bool)
+        for key, condition in (filter_dict or {}).items():
+            if key == '$and':
+                for sub in condition:
+                    mask &= self.mask(sub, size)
+            elif key == '$or':
+                any_mask = np.zeros(size, dtype=bool)
+                for sub in condition:
+                    any_mask |= self.mask(sub, size)
+                mask &= any_mask
+            else:
+                conditions = condition if isinstance(condition, dict) else {'$eq': condition}
+                for op, operand in conditions.items():
+                    mask &= self._condition_mask(key, op, operand, size)
+        return mask
@@ -0,0 +1,389 @@
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+def _percentile(sorted_samples: List[float], p: float) -> float:
+    """nearest-rank percentile (0-100) จาก list ที่เรียงแล้ว"""
+    if not sorted_samples:
+        return 0.0
+    rank = int(round(p / 100 * (len(sorted_samples) - 1)))
+    return sorted_samples[min(len(sorted_samples) - 1, max(0, rank))]
+
+class LatencyStats:
+    """เก็บ latency ล่าสุด (วินาที) แล้วสรุปเป็น percentiles แบบ thread-safe"""
+
+    def __init__(self, max_samples=10000):
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds: float):
+        """บันทึก latency หนึ่งครั้ง"""
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+
+    def percentile(self, p: float) -> float:
+        """คืนค่า percentile ของ samples ที่เก็บไว้ หน่วยวินาที"""
+        with self._lock:
+            samples = sorted(self._samples)
+        return _percentile(samples, p)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self.count = 0
+            self.total = 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """สรุป latency เป็น milliseconds"""
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total = self.count, self.total
+
+        return {
+            'count': count,
+            'mean_ms': (total / count * 1000) if count else 0.0,
+            'p50_ms': _percentile(samples, 50) * 1000,
+            'p95_ms': _percentile(samples, 95) * 1000,
+            'p99_ms': _percentile(samples, 99) * 1000,
+            'max_ms': (samples[-1] * 1000) if samples else 0.0,
+        }
+
+# ---------- pipeline instrumentation ----------
+
+# ขอบบน (วินาที) ของ histogram buckets สำหรับเวลาของแต่ละขั้นตอน
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """นับจำนวนค่าใน buckets สะสมแบบ Prometheus (ใช้ memory คงที่ ไม่เก็บ samples)"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """[(le, จำนวนค่าที่ <= le)] รวม '+Inf'"""
+        result, total = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append(('+Inf' if bound == float('inf') else repr(bound), total))
+        return result
+
+class _NullTimer:
+    """timer ตอนปิด metrics: ไม่อ่านนาฬิกาและไม่ lock"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _StageTimer:
+    __slots__ = ('registry', 'stage', 'started')
+
+    def __init__(self, registry, stage: str):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+class MetricsRegistry:
+    """เวลาต่อขั้นตอน (histogram) และ counters ของ pipeline ภายใน process
+
+    - ปิดอยู่โดย default (METRICS_ENABLED=1 หรือ enable() เพื่อเปิด) ตอนปิด timer()/inc() แทบไม่มี overhead
+    - stages ซ้อนกันได้ เช่น tokenize อยู่ใน chunk และ hydrate อยู่ใน search
+    - workers ของ parallel_ingest เป็น process แยก metrics ของ chunk/encode ในนั้นไม่ถูกรวมมาที่นี่
+    """
+
+    def __init__(self, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.getenv('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self._lock:
+            self._histograms: Dict[str, Histogram] = {}
+            self._counters: Dict[str, float] = {}
+            self._started_at = time.time()
+
+    def timer(self, stage: str):
+        """context manager จับเวลาของขั้นตอน stage"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, stage)
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1):
+        """เพิ่ม counter (เช่น documents, chunks, vectors_upserted)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """สรุปเป็น dict: เวลาต่อ stage และ counters พร้อม rate ต่อวินาทีนับจาก reset()"""
+        with self._lock:
+            elapsed = max(time.time() - self._started_at, 1e-9)
+            return {
+                'started_at': self._started_at,
+                'elapsed_s': elapsed,
+                'stages': {
+                    stage: {
+                        'count': histogram.count,
+                        'total_s': histogram.sum,
+                        'mean_ms': histogram.sum / histogram.count * 1000 if histogram.count else 0.0,
+                        'buckets': histogram.cumulative(),
+                    }
+                    for stage, histogram in self._histograms.items()
+                },
+                'counters': {
+                    name: {'value': value, 'per_s': value / elapsed}
+                    for name, value in self._counters.items()
+                },
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix: str = 'rag') -> str:
+        """metrics ในรูปแบบ Prometheus text exposition (version 0.0.4)"""
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent per pipeline stage",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        for stage, stats in sorted(snapshot['stages'].items()):
+            for bound, count in stats['buckets']:
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {stats["total_s"]}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        for name, stats in sorted(snapshot['counters'].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {stats['value']}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: Optional[str] = None) -> Optional[str]:
+        """เขียน snapshot เป็น JSON ที่ path หรือ METRICS_DUMP (ไม่กำหนด = ไม่เขียน)"""
+        path = path or os.getenv('METRICS_DUMP')
+        if not path or not self.enabled:
+            return None
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json())
+        os.replace(tmp_path, path)
+        return path
+
+# registry เดียวของ process (import timer / inc ไปใช้ตรงๆ)
+registry = MetricsRegistry()
+timer = registry.timer
+inc = registry.inc
+
+def serve_metrics(port: Optional[int] = None, host: str = '127.0.0.1'):
+    """เปิด HTTP endpoint /metrics (Prometheus) และ /metrics.json ใน daemon thread
+
+    port: None = ใช้ METRICS_PORT (ไม่กำหนด = ไม่เปิด) สำหรับงาน ingest ที่ไม่มี SearchHTTPServer
+    """
+    port = port or int(os.getenv('METRICS_PORT', '0'))
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = registry.to_prometheus().encode(), 'text/plain; version=0.0.4'
+            elif self.path == '/metrics.json':
+                body, content_type = registry.to_json().encode(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
+
+# ---------- structured logging ----------
+
+class _StructuredFormatter(logging.Formatter):
+    """LOG_FORMAT=json: หนึ่ง JSON object ต่อบรรทัด (message + fields) อื่นๆ: ข้อความอย่างเดียวแบบ print เดิม"""
+
+    def __init__(self, as_json: bool):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not self.as_json:
+            return record.getMessage()
+        payload = {
+            'ts': record.created,
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage(),
+            **getattr(record, 'fields', {}),
+        }
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+_logging_lock = threading.Lock()
+
+def get_logger(name: str) -> logging.Logger:
+    """logger ใต้ 'rag' ถ้าแอปยังไม่ได้ตั้ง handler เอง จะเขียนลง stdout ตาม LOG_FORMAT / LOG_LEVEL"""
+    root = logging.getLogger('rag')
+    with _logging_lock:
+        if not root.handlers:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(_StructuredFormatter(os.getenv('LOG_FORMAT', 'text').lower() == 'json'))
+            root.addHandler(handler)
+            root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+            root.propagate = False
+    return logging.getLogger(f'rag.{name}')
+
+def log_event(logger: logging.Logger, message: str, level: int = logging.INFO, **fields):
+    """log ข้อความพร้อม fields (ออกเป็น key ของ JSON เมื่อ LOG_FORMAT=json)"""
+    logger.log(level, message, extra={'fields': fields})
+
+# ---------- sampling profiler ----------
+
+# frame บนสุดของ thread ที่รองานอยู่เฉยๆ (thread pool / lock / socket) ไม่นับเป็น sample
+_IDLE_LEAVES = ('threading.py:wait', 'thread.py:_worker', 'queue.py:get', 'selectors.py:select',
+                'socket.py:accept', 'socketserver.py:serve_forever')
+
+class SamplingProfiler:
+    """สุ่มดู stack ของทุก thread ทุก interval วินาที แล้วนับเป็น collapsed stacks (ใช้ทำ flamegraph ได้)
+
+    ใช้แค่ stdlib (sys._current_frames) overhead ขึ้นกับ interval ไม่ใช่จำนวน function calls
+    thread ที่กำลังรอ (_IDLE_LEAVES) ถูกข้าม stacks จึงเป็นเวลาที่ทำงานจริง
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if names[0] in _IDLE_LEAVES:
+                    continue
+                key = ';'.join(reversed(names))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str):
+        """เขียน collapsed stacks (รูปแบบของ flamegraph.pl / speedscope)"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+
+    def top(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """functions ที่อยู่บนสุดของ stack บ่อยที่สุด (self time)"""
+        leaves: Dict[str, int] = {}
+        for stack, count in self.stacks.items():
+            leaf = stack.rsplit(';', 1)[-1]
+            leaves[leaf] = leaves.get(leaf, 0) + count
+        return sorted(leaves.items(), key=lambda item: -item[1])[:limit]
+
+@contextmanager
+def profile_run(name: str, mode: Optional[str] = None, output_dir: Optional[str] = None):
+    """profile โค้ดใน with-block ตาม mode (None = ใช้ PROFILE)
+
+    - 'sample': SamplingProfiler -> <output_dir>/<name>-<time>.folded
+    - 'cprofile': cProfile (deterministic ช้ากว่า) -> <output_dir>/<name>-<time>.prof
+    - ค่าว่าง: ไม่ profile
+    output_dir: None = ใช้ PROFILE_DIR หรือ .cache/profiles
+    """
+    mode = (mode if mode is not None else os.getenv('PROFILE', '')).lower()
+    if not mode:
+        yield None
+        return
+    if mode not in ('sample', 'cprofile'):
+        raise ValueError(f"Unknown profile mode {mode!r}, expected 'sample' or 'cprofile'")
+
+    output_dir = output_dir or os.getenv('PROFILE_DIR', '.cache/profiles')
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    logger = get_logger('profile')
+
+    if mode == 'cprofile':
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            profiler.dump_stats(base + '.prof')
+            log_event(logger, f"Profile written: {base}.prof", path=base + '.prof', mode=mode)
+        return
+
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        profiler.write(base + '.folded')
+        log_event(logger, f"Profile written: {base}.folded ({profiler.samples} samples)",
+                  path=base + '.folded', mode=mode, samples=profiler.samples, top=profiler.top(5))
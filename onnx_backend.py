@@ -0,0 +1,256 @@
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from tqdm import tqdm
+
+from metrics import get_logger, log_event
+
+logger = get_logger('onnx')
+
+# backend ของ EmbeddingModel: PyTorch (เดิม), ONNX Runtime float32 และ ONNX Runtime + dynamic int8 quantization
+BACKENDS = ('torch', 'onnx', 'onnx-int8')
+
+# ข้อความที่ใช้ pre-warm และตรวจผลลัพธ์เทียบกับ PyTorch ตอน export
+_CHECK_TEXTS = [
+    "การเรียนรู้ของเครื่องเป็นสาขาหนึ่งของปัญญาประดิษฐ์",
+    "Python is a popular programming language for data science.",
+    "ระบบ RAG ใช้ vector search ค้นหาเอกสารที่เกี่ยวข้องก่อนส่งให้ LLM",
+    "สวัสดี",
+]
+
+# ค่าที่ยอมรับได้ของ cosine similarity ต่ำสุดเทียบกับ PyTorch
+_MIN_COSINE = {'onnx': 0.9999, 'onnx-int8': 0.98}
+
+def check_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+    return backend
+
+def _import_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError("ONNX backend requires onnxruntime: pip install onnxruntime onnx") from e
+    return onnxruntime
+
+def _pooling_config(st_model):
+    """อ่าน pooling (mean/cls/max) และ normalize จาก modules ของ SentenceTransformer"""
+    pooling_mode, normalize = None, False
+    for module in list(st_model)[1:]:
+        name = type(module).__name__
+        if name == 'Pooling':
+            config = module.get_config_dict()
+            pooling_mode = config.get('pooling_mode')
+            if pooling_mode is None:
+                # sentence-transformers รุ่นเก่าเก็บเป็น flag แยก
+                for mode in ('cls', 'max', 'mean'):
+                    if config.get(f'pooling_mode_{mode}_token') or config.get(f'pooling_mode_{mode}_tokens'):
+                        pooling_mode = mode
+        elif name == 'Normalize':
+            normalize = True
+        else:
+            raise ValueError(f"ONNX backend does not support module {name} in {st_model}")
+    if pooling_mode not in ('mean', 'cls', 'max'):
+        raise ValueError(f"ONNX backend does not support pooling mode {pooling_mode!r}")
+    return pooling_mode, normalize
+
+def export_onnx(st_model, path: Path):
+    """export transformer ของ SentenceTransformer เป็น ONNX (input: token ids, output: last_hidden_state)
+
+    pooling/normalize ทำใน numpy ฝั่ง OnnxEncoder จึง export เฉพาะส่วน transformer
+    """
+    import torch
+
+    input_names = list(st_model.tokenizer.model_input_names)
+    transformer = st_model[0].auto_model.eval()
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    sample = st_model.tokenizer(_CHECK_TEXTS[:2], padding=True, return_tensors='pt')
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['last_hidden_state']}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp.onnx')
+    kwargs = dict(
+        input_names=input_names,
+        output_names=['last_hidden_state'],
+        dynamic_axes=dynamic_axes,
+        opset_version=17,
+    )
+    with torch.no_grad():
+        try:
+            torch.onnx.export(HiddenStates(transformer), tuple(sample[name] for name in input_names),
+                              str(tmp_path), dynamo=False, **kwargs)
+        except TypeError:
+            # torch รุ่นเก่าไม่มี argument dynamo
+            torch.onnx.export(HiddenStates(transformer), tuple(sample[name] for name in input_names),
+                              str(tmp_path), **kwargs)
+    os.replace(tmp_path, path)
+
+def quantize_onnx(source: Path, target: Path):
+    """dynamic int8 quantization ของ weights (MatMul/Gemm) activations ยังเป็น float32"""
+    _import_onnxruntime()
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    tmp_path = target.with_suffix('.tmp.onnx')
+    quantize_dynamic(str(source), str(tmp_path), weight_type=QuantType.QInt8)
+    os.replace(tmp_path, target)
+
+def compare_embeddings(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """ความต่างระหว่าง embeddings สองชุด (max abs error และ cosine similarity ต่ำสุดต่อแถว)"""
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    cosine = np.sum(reference * candidate, axis=1) / np.where(norms > 0, norms, 1.0)
+    return {
+        'max_abs_error': float(np.abs(reference - candidate).max()),
+        'min_cosine': float(cosine.min()),
+    }
+
+class OnnxEncoder:
+    """รัน embedding ด้วย ONNX Runtime บน CPU แทน PyTorch
+
+    - export โมเดลครั้งแรกไว้ที่ cache_dir (default ONNX_CACHE_DIR หรือ .cache/onnx) แล้วใช้ซ้ำ
+    - quantize=True: dynamic int8 quantization (เร็วขึ้นบน CPU แลกกับความแม่นยำเล็กน้อย)
+    - num_threads: จำนวน threads ของ ONNX Runtime (None = ให้ runtime เลือกตามจำนวน cores)
+    - ตอน export จะตรวจผลลัพธ์เทียบกับ PyTorch ถ้าต่างเกิน _MIN_COSINE จะไม่ใช้ไฟล์นั้น
+    """
+
+    def __init__(self, st_model, model_name: str, quantize: bool = False, num_threads: Optional[int] = None,
+                 cache_dir: Optional[str] = None):
+        ort = _import_onnxruntime()
+        self.backend = 'onnx-int8' if quantize else 'onnx'
+        self.tokenizer = st_model.tokenizer
+        self.max_seq_length = st_model.max_seq_length
+        self.input_names = list(self.tokenizer.model_input_names)
+        self.pooling_mode, self.normalize = _pooling_config(st_model)
+
+        cache_dir = cache_dir or os.getenv('ONNX_CACHE_DIR', '.cache/onnx')
+        self.path = Path(cache_dir) / re.sub(r'[^A-Za-z0-9._-]+', '_', model_name)
+        model_path = self.path / ('model_int8.onnx' if quantize else 'model.onnx')
+        if not model_path.exists():
+            self._build(st_model, model_path, quantize)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(str(model_path), options, providers=['CPUExecutionProvider'])
+
+    def _build(self, st_model, model_path: Path, quantize: bool):
+        float_path = self.path / 'model.onnx'
+        if not float_path.exists():
+            started = time.perf_counter()
+            export_onnx(st_model, float_path)
+            export_seconds = time.perf_counter() - started
+            log_event(logger, f"Exported ONNX model: {float_path} ({export_seconds:.1f}s)",
+                      event='onnx_exported', path=str(float_path), seconds=export_seconds)
+        if quantize:
+            quantize_onnx(float_path, model_path)
+            log_event(logger, f"Quantized ONNX model: {model_path}", event='onnx_quantized', path=str(model_path))
+
+        # ตรวจผลลัพธ์เทียบกับ PyTorch ก่อนใช้งานจริง
+        ort = _import_onnxruntime()
+        self.session = ort.InferenceSession(str(model_path), providers=['CPUExecutionProvider'])
+        reference = st_model.encode(_CHECK_TEXTS, convert_to_tensor=False, show_progress_bar=False)
+        result = compare_embeddings(reference, self.encode(_CHECK_TEXTS, show_progress_bar=False))
+        (self.path / f'{model_path.stem}.check.json').write_text(json.dumps(result))
+        log_event(logger,
+                  f"ONNX check vs PyTorch ({self.backend}): max abs error {result['max_abs_error']:.2e}, "
+                  f"min cosine {result['min_cosine']:.5f}",
+                  event='onnx_checked', backend=self.backend, **result)
+        if result['min_cosine'] < _MIN_COSINE[self.backend]:
+            model_path.unlink(missing_ok=True)
+            raise ValueError(f"ONNX model {model_path} differs from PyTorch (min cosine {result['min_cosine']:.5f})")
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling_mode == 'cls':
+            pooled = hidden[:, 0]
+        elif self.pooling_mode == 'max':
+            pooled = np.where(attention_mask[:, :, None] > 0, hidden, -1e9).max(axis=1)
+        else:
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.normalize:
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            pooled = pooled / np.maximum(norms, 1e-12)
+        return pooled.astype(np.float32, copy=False)
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        """แปลง texts เป็น float32 array (len(texts), dim) แบบเดียวกับ SentenceTransformer.encode"""
+        embeddings = None
+        batch_starts = range(0, len(texts), batch_size)
+        if show_progress_bar:
+            batch_starts = tqdm(batch_starts, desc="Batches")
+        for start in batch_starts:
+            batch = list(texts[start:start + batch_size])
+            encoded = self.tokenizer(batch, padding=True, truncation=True, max_length=self.max_seq_length,
+                                     return_tensors='np')
+            inputs = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, inputs)[0]
+            pooled = self._pool(hidden, encoded['attention_mask'])
+            if embeddings is None:
+                embeddings = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            embeddings[start:start + len(batch)] = pooled
+        return embeddings
+
+def benchmark(model_name: str, texts: List[str], batch_size: int = 32, num_threads: Optional[int] = None,
+              backends=BACKENDS) -> Dict[str, Dict[str, float]]:
+    """วัด throughput ของ batch_encode และ latency ของ encode_single ต่อ backend (ไม่ใช้ cache)"""
+    from embedding_model import EmbeddingModel
+
+    results = {}
+    reference = None
+    for backend in backends:
+        try:
+            embedder = EmbeddingModel(model_name, cache_dir=False, backend=backend, num_threads=num_threads)
+        except ImportError as e:
+            log_event(logger, f"{backend:10s} skipped ({e})", level=logging.WARNING,
+                      event='backend_skipped', backend=backend, error=str(e))
+            continue
+
+        started = time.perf_counter()
+        embeddings = embedder.batch_encode(texts, batch_size=batch_size)
+        batch_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for text in texts[:100]:
+            embedder.encode_single(text)
+        single_ms = (time.perf_counter() - started) / min(len(texts), 100) * 1000
+
+        if reference is None:
+            reference = embeddings
+        results[backend] = {
+            'texts_per_second': len(texts) / batch_seconds,
+            'single_ms': single_ms,
+            **compare_embeddings(reference, embeddings),
+        }
+    return results
+
+# ทดสอบ: เปรียบเทียบ torch / onnx / onnx-int8 บนข้อความเดียวกัน
+if __name__ == "__main__":
+    import sys
+
+    model_name = sys.argv[1] if len(sys.argv) > 1 else 'all-MiniLM-L6-v2'
+    texts = [f"{text} ({i})" for i in range(250) for text in _CHECK_TEXTS]
+    results = benchmark(model_name, texts, num_threads=int(os.getenv('EMBEDDING_THREADS', '0')) or None)
+
+    base = results.get('torch', {}).get('texts_per_second')
+    for backend, result in results.items():
+        speedup = f"{result['texts_per_second'] / base:.2f}x" if base else "-"
+        print(f"{backend:10s} {result['texts_per_second']:8.1f} texts/s ({speedup})  "
+              f"single {result['single_ms']:.2f} ms  "
+              f"max abs error {result['max_abs_error']:.2e}  min cosine {result['min_cosine']:.5f}")
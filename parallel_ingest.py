@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Iterator, Tuple
+
+from metrics import get_logger, log_event
+
+logger = get_logger('ingest')
+
+# vectorizer ของแต่ละ worker process (สร้างครั้งเดียวตอนเริ่ม worker)
+_worker_vectorizer = None
+
+def _init_worker(model_name, chunker, encode_batch_size, num_threads, backend=None):
+    """โหลด EmbeddingModel ของตัวเองใน worker"""
+    global _worker_vectorizer
+
+    # ให้ process หลักจัดการ Ctrl-C อย่างเดียว worker จะไม่ตายกลางคัน
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    import torch
+    torch.set_num_threads(num_threads)
+
+    from embedding_model import EmbeddingModel
+    from vectorizer import DocumentVectorizer
+
+    # embedding cache บน disk เขียนพร้อมกันหลาย process ไม่ได้ จึงปิดใน worker
+    embedder = EmbeddingModel(model_name, cache_dir=False, backend=backend, num_threads=num_threads)
+    _worker_vectorizer = DocumentVectorizer(embedder, chunker, encode_batch_size)
+
+def _vectorize_window(documents: List[Dict[str, Any]]):
+    return _worker_vectorizer.vectorize(documents)
+
+class ParallelVectorizer:
+    """กระจาย windows ของเอกสารไปให้ process pool ทำ chunk + encode
+
+    แต่ละ worker โหลดโมเดลของตัวเองและใช้ torch threads = cores / workers
+    ผลลัพธ์คืนมาที่ process หลักเพื่อส่งเข้า upsert writer ตัวเดียวกัน
+    """
+
+    def __init__(self, workers: int, model_name: str, chunker, encode_batch_size=64, max_in_flight=None,
+                 backend=None):
+        self.workers = workers
+        self.model_name = model_name
+        self.chunker = chunker
+        self.encode_batch_size = encode_batch_size
+        self.backend = backend
+        self.max_in_flight = max_in_flight or workers * 2
+        self.num_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    def map_windows(self, windows: Iterator[List[Dict[str, Any]]]) -> Iterator[Tuple[List[Dict[str, Any]], List[str], List[int], List[tuple]]]:
+        """คืน (window, doc_ids, chunk_counts, vectors) ตามลำดับที่ทำเสร็จ (ไม่ใช่ลำดับ input)"""
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            # spawn: ไม่ fork process ที่มี torch threads อยู่แล้ว (เลี่ยง deadlock)
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.model_name, self.chunker, self.encode_batch_size, self.num_threads, self.backend)
+        )
+        pending = {}
+
+        def submit_next():
+            window = next(windows, None)
+            if window is None:
+                return False
+            pending[pool.submit(_vectorize_window, window)] = window
+            return True
+
+        try:
+            for _ in range(self.max_in_flight):
+                if not submit_next():
+                    break
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    window = pending.pop(future)
+                    doc_ids, chunk_counts, vectors = future.result()
+                    yield window, doc_ids, chunk_counts, vectors
+                    submit_next()
+        except KeyboardInterrupt:
+            log_event(logger, "Interrupted: cancelling pending windows...", event='ingest_interrupted',
+                      pending=len(pending))
+            raise
+        finally:
+            # ยกเลิก windows ที่ยังไม่เริ่ม แล้วรอ worker ทำ window ปัจจุบันให้จบ
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -2,8 +2,12 @@ from pinecone import Pinecone, ServerlessSpec, CloudProvider, AwsRegion
 import os
 from dotenv import load_dotenv
 
+from metrics import get_logger, log_event
+
 load_dotenv()
 
+logger = get_logger('pinecone')
+
 class PineconeClient:
     def __init__(self):
         self.api_key = os.getenv('PINECONE_API_KEY')
@@ -13,7 +17,7 @@ class PineconeClient:
         
         # Initialize Pinecone v7.x
         self.pc = Pinecone(api_key=self.api_key)
-        print("Connected to Pinecone v7.x")
+        log_event(logger, "Connected to Pinecone v7.x", event='connected')
     
     def list_indexes(self):
         """แสดงรายการ indexes ทั้งหมด"""
@@ -32,9 +36,10 @@ class PineconeClient:
                     region=AwsRegion.US_EAST_1
                 )
             )
-            print(f"Created serverless index: {index_name}")
+            log_event(logger, f"Created serverless index: {index_name}", event='index_created',
+                      index=index_name, dimension=dimension)
         else:
-            print(f"Index {index_name} already exists")
+            log_event(logger, f"Index {index_name} already exists", event='index_exists', index=index_name)
     
     def get_index(self, index_name):
         """เชื่อมต่อกับ index"""
@@ -44,7 +49,7 @@ class PineconeClient:
         """ลบ index"""
         if index_name in self.list_indexes():
             self.pc.delete_index(index_name)
-            print(f"Deleted index: {index_name}")
+            log_event(logger, f"Deleted index: {index_name}", event='index_deleted', index=index_name)
     
     def describe_index(self, index_name):
         """ดูรายละเอียด index"""
@@ -0,0 +1,104 @@
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+
+# รูปแบบการเก็บ vectors: float32 (เดิม), float16 (ครึ่งหนึ่ง), int8 + scale ต่อ vector (ประมาณหนึ่งในสี่)
+STORAGE_TYPES = ('float32', 'float16', 'int8')
+
+def check_storage(storage: str) -> str:
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unsupported vector storage {storage!r}, expected one of {STORAGE_TYPES}")
+    return storage
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """scalar quantization แบบสมมาตรต่อ vector: x ≈ codes * scale โดย scale = max|x| / 127"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    safe = np.where(scales > 0, scales, 1.0)
+    codes = np.clip(np.rint(vectors / safe[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+class VectorCodec:
+    """แปลง float32 vectors <-> แถวที่เก็บลงไฟล์ตาม storage
+
+    int8 เก็บเป็น structured row (scale float32 + codes int8) เพื่อให้อ่านผ่าน memmap ได้ทีละแถว
+    """
+
+    def __init__(self, storage: str, dim: int):
+        self.storage = check_storage(storage)
+        self.dim = dim
+        if storage == 'int8':
+            self.row_dtype = np.dtype([('scale', '<f4'), ('codes', 'i1', (dim,))])
+        else:
+            self.row_dtype = np.dtype('<f2' if storage == 'float16' else '<f4')
+        self.row_bytes = self.row_dtype.itemsize * (1 if storage == 'int8' else dim)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if self.storage != 'int8':
+            return np.ascontiguousarray(vectors, dtype=self.row_dtype)
+        codes, scales = quantize_int8(vectors)
+        rows = np.empty(len(vectors), dtype=self.row_dtype)
+        rows['scale'] = scales
+        rows['codes'] = codes
+        return rows
+
+    def decode(self, rows: np.ndarray) -> np.ndarray:
+        if self.storage != 'int8':
+            return np.asarray(rows, dtype=np.float32).reshape(-1, self.dim)
+        return rows['codes'].astype(np.float32) * rows['scale'][:, None]
+
+    def memmap(self, path, count: int) -> np.ndarray:
+        """เปิดไฟล์ที่มี count แถวแบบอ่านอย่างเดียว"""
+        if self.storage == 'int8':
+            return np.memmap(path, dtype=self.row_dtype, mode='r', shape=(count,))
+        return np.memmap(path, dtype=self.row_dtype, mode='r', shape=(count, self.dim))
+
+def matvec(matrix: np.ndarray, vector: np.ndarray, block_rows: int = 65536) -> np.ndarray:
+    """matrix @ vector เป็น float32 โดยแปลง matrix ที่ไม่ใช่ float32 ทีละ block (ไม่สร้างสำเนาทั้งก้อน)"""
+    if matrix.dtype == np.float32:
+        return matrix @ vector
+    out = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), block_rows):
+        out[start:start + block_rows] = matrix[start:start + block_rows].astype(np.float32) @ vector
+    return out
+
+def measure_recall(corpus: np.ndarray, queries: np.ndarray, storage: str, k: int = 10) -> Dict[str, float]:
+    """recall@k ของการค้นหา cosine บน vectors ที่ quantize แล้ว เทียบกับ float32 exact"""
+    codec = VectorCodec(storage, corpus.shape[1])
+    decoded = codec.decode(codec.encode(corpus))
+
+    def top_k(matrix):
+        unit = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+        scores = queries @ unit.T
+        return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+    truth = top_k(corpus)
+    found = top_k(decoded)
+    recall = np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)])
+    return {
+        'storage': storage,
+        'bytes_per_vector': codec.row_bytes,
+        f'recall@{k}': float(recall),
+        'max_abs_error': float(np.abs(decoded - corpus).max()),
+    }
+
+# ทดสอบ: recall และขนาดของแต่ละ storage บน embeddings จำลอง
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    count, dim = 100000, 384
+    topics = rng.normal(size=(1000, dim)).astype(np.float32)
+    corpus = topics[rng.integers(0, len(topics), count)] + rng.normal(scale=0.6, size=(count, dim)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries = corpus[rng.choice(count, 200, replace=False)] + rng.normal(scale=0.02, size=(200, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    python_list_bytes = dim * 32  # list ของ Python float: pointer 8 + float object 24 ต่อค่า
+    print(f"Python list[float]: ~{python_list_bytes:,} bytes/vector")
+    for storage in STORAGE_TYPES:
+        started = time.perf_counter()
+        result = measure_recall(corpus, queries, storage)
+        print(f"{storage:8s} {result['bytes_per_vector']:>6,} bytes/vector  "
+              f"recall@10={result['recall@10']:.4f}  max error={result['max_abs_error']:.5f}  "
+              f"({time.perf_counter() - started:.1f}s)")
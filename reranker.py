@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from metrics import get_logger, log_event
+
+logger = get_logger('reranker')
+
+# วิธี rerank ที่ VectorSearcher(reranker=...) รับเป็นชื่อได้
+RERANKERS = ('cosine', 'cross-encoder')
+
+# cross-encoder หลายภาษา (รองรับภาษาไทย) ขนาดเล็กพอจะรันบน CPU
+DEFAULT_CROSS_ENCODER = 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1'
+
+class Reranker:
+    """ให้คะแนน candidates ใหม่แล้วคืน top_k ภายในเวลาที่กำหนด
+
+    subclass เขียน score() ให้คะแนนทีละ batch ส่วน rerank() จัดการ budget:
+    - ให้คะแนนตามลำดับเดิมทีละ batch_size รายการ และหยุดเมื่อใช้เวลาเกิน budget_ms
+    - candidates ที่ได้คะแนนเรียงตามคะแนนใหม่ ตามด้วยตัวที่ไม่ทันได้คะแนนในลำดับเดิม
+    """
+
+    name = 'base'
+
+    def __init__(self, batch_size: int = 16):
+        self.batch_size = batch_size
+
+    def score(self, query: str, query_vector, candidates: List[Dict[str, Any]]) -> np.ndarray:
+        raise NotImplementedError
+
+    def rerank(self, query: str, query_vector, candidates: List[Dict[str, Any]], top_k: int,
+               budget_ms: Optional[float] = None) -> Dict[str, Any]:
+        """คืน {'results', 'scored', 'truncated', 'seconds'}
+
+        แต่ละผลลัพธ์มี rerank_score (None ถ้าไม่ทันได้คะแนน) ส่วน score ยังเป็นคะแนนจาก index
+        """
+        started = time.perf_counter()
+        deadline = started + budget_ms / 1000 if budget_ms is not None else None
+        scores = []
+        scored = 0
+        while scored < len(candidates):
+            if deadline is not None and scored and time.perf_counter() >= deadline:
+                break
+            batch = candidates[scored:scored + self.batch_size]
+            scores.extend(np.asarray(self.score(query, query_vector, batch), dtype=np.float32).tolist())
+            scored += len(batch)
+
+        # sort แบบ stable: คะแนนเท่ากันคงลำดับเดิมจาก index
+        order = sorted(range(scored), key=lambda i: -scores[i]) + list(range(scored, len(candidates)))
+        results = []
+        for i in order[:top_k]:
+            result = dict(candidates[i])
+            result['rerank_score'] = scores[i] if i < scored else None
+            results.append(result)
+        return {
+            'results': results,
+            'scored': scored,
+            'truncated': scored < len(candidates),
+            'seconds': time.perf_counter() - started,
+        }
+
+class CosineReranker(Reranker):
+    """cosine similarity แบบ exact (float32) ระหว่าง query vector กับ embeddings ของ chunks
+
+    ใช้ได้ราคาถูกเมื่อ index ให้คะแนนแบบประมาณ (IVF, int8/float16 storage)
+    - embeddings ของ chunks อ่านจาก embedding cache ของ embedder (key = ข้อความของ chunk)
+    - chunks ที่ไม่อยู่ใน cache ดึง values จาก index ด้วย fetch ครั้งเดียวต่อ batch
+    """
+
+    name = 'cosine'
+
+    def __init__(self, embedder=None, fetch: Optional[Callable[[List[str]], Dict]] = None, batch_size: int = 256):
+        super().__init__(batch_size)
+        self.embedder = embedder
+        self.fetch = fetch
+
+    def _vectors(self, candidates: List[Dict[str, Any]]) -> List[Optional[np.ndarray]]:
+        cache = self.embedder.cache if self.embedder is not None else None
+        if cache is not None:
+            vectors = cache.get_many([candidate.get('content', '') for candidate in candidates])
+        else:
+            vectors = [None] * len(candidates)
+
+        missing = [candidate['id'] for candidate, vector in zip(candidates, vectors) if vector is None]
+        if missing and self.fetch is not None:
+            fetched = self.fetch(missing)['vectors']
+            vectors = [
+                np.asarray(fetched[candidate['id']]['values'], dtype=np.float32)
+                if vector is None and candidate['id'] in fetched else vector
+                for candidate, vector in zip(candidates, vectors)
+            ]
+        return vectors
+
+    def score(self, query: str, query_vector, candidates: List[Dict[str, Any]]) -> np.ndarray:
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+        scores = np.empty(len(candidates), dtype=np.float32)
+        for i, (candidate, vector) in enumerate(zip(candidates, self._vectors(candidates))):
+            if vector is None:
+                # ไม่มี vector ให้เทียบ ใช้คะแนนเดิมจาก index
+                scores[i] = candidate['score']
+            else:
+                scores[i] = vector @ query_vector / max(float(np.linalg.norm(vector)), 1e-12)
+        return scores
+
+class CrossEncoderReranker(Reranker):
+    """ให้คะแนนคู่ (query, chunk) ด้วย cross-encoder บน CPU (แม่นกว่า cosine แต่ช้ากว่ามาก)
+
+    model_name: None = ใช้ RERANK_MODEL หรือ DEFAULT_CROSS_ENCODER (โหลดเมื่อ rerank ครั้งแรก)
+    """
+
+    name = 'cross-encoder'
+
+    def __init__(self, model_name: Optional[str] = None, batch_size: int = 16, max_length: int = 512):
+        super().__init__(batch_size)
+        self.model_name = model_name or os.getenv('RERANK_MODEL', DEFAULT_CROSS_ENCODER)
+        self.max_length = max_length
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+
+                    log_event(logger, f"Loading cross-encoder: {self.model_name}",
+                              event='reranker_loading', model=self.model_name)
+                    self._model = CrossEncoder(self.model_name, max_length=self.max_length)
+        return self._model
+
+    def score(self, query: str, query_vector, candidates: List[Dict[str, Any]]) -> np.ndarray:
+        pairs = [(query, candidate.get('content', '')) for candidate in candidates]
+        return self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+
+# reranker ที่ใช้ร่วมกันใน process (cross-encoder โหลดครั้งเดียว)
+_shared_rerankers: Dict[str, Reranker] = {}
+_shared_lock = threading.Lock()
+
+def get_cross_encoder(model_name: Optional[str] = None) -> CrossEncoderReranker:
+    """CrossEncoderReranker ของ model_name ตัวเดียวกันทุกครั้งภายใน process"""
+    model_name = model_name or os.getenv('RERANK_MODEL', DEFAULT_CROSS_ENCODER)
+    with _shared_lock:
+        reranker = _shared_rerankers.get(model_name)
+        if reranker is None:
+            reranker = CrossEncoderReranker(model_name)
+            _shared_rerankers[model_name] = reranker
+    return reranker
+
+# ทดสอบ: rerank candidates จำลองด้วย cosine และดูผลของ budget
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    dim, count = 384, 200
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    query_vector = vectors[7] + rng.normal(scale=0.3, size=dim).astype(np.float32)
+    store = {f"chunk_{i}": {'values': vectors[i].tolist()} for i in range(count)}
+    candidates = [{'id': f"chunk_{i}", 'score': 0.0, 'content': ''} for i in rng.permutation(count)]
+
+    reranker = CosineReranker(fetch=lambda ids: {'vectors': {i: store[i] for i in ids}}, batch_size=32)
+    for budget_ms in (None, 0.0):
+        outcome = reranker.rerank("query", query_vector, candidates, top_k=3, budget_ms=budget_ms)
+        print(f"budget={budget_ms}: scored {outcome['scored']}/{count} truncated={outcome['truncated']} "
+              f"{outcome['seconds'] * 1000:.2f} ms -> {[r['id'] for r in outcome['results']]}")
@@ -0,0 +1,218 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from lru_cache import LRUCache
+
+class MemoryResultBackend:
+    """เก็บผลการค้นหาใน LRUCache ของ process นี้
+
+    generation อยู่ในหน่วยความจำ จึงเห็นเฉพาะการเขียนจาก process เดียวกัน
+    (server หลาย process หรือ ingest แยก process ให้ใช้ SQLiteResultBackend)
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: Optional[float] = 300):
+        self._results = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        # deep copy ทั้งตอนเก็บและตอนคืน: metadata ที่ซ้อนอยู่ในผลลัพธ์ไม่ถูกแชร์กับผู้เรียก
+        # (SQLiteResultBackend decode JSON ใหม่ทุกครั้งอยู่แล้ว)
+        value = self._results.get(key)
+        return copy.deepcopy(value) if value is not None else None
+
+    def put(self, key: str, value: List[Dict]):
+        self._results.put(key, copy.deepcopy(value))
+
+    def generation(self, index_name: str) -> int:
+        return self._generations.get(index_name, 0)
+
+    def bump_generation(self, index_name: str) -> int:
+        with self._lock:
+            self._generations[index_name] = self._generations.get(index_name, 0) + 1
+            return self._generations[index_name]
+
+    def stats(self) -> Dict[str, Any]:
+        return self._results.stats()
+
+class SQLiteResultBackend:
+    """เก็บผลการค้นหาและ generation ในไฟล์ SQLite (WAL) ที่หลาย process ใช้ร่วมกันได้
+
+    ทิ้ง entries ที่ไม่ได้อ่านนานที่สุดเมื่อเกิน max_entries (ตรวจทุก ๆ prune_every ครั้งที่เขียน)
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl: Optional[float] = 300,
+                 prune_every: int = 256):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations (index_name TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """connection ของ thread นี้ (sqlite3 connection ใช้ข้าม thread ไม่ได้)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value FROM results WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, now)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key: str, value: List[Dict]):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO results (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False, default=str), expires_at, now)
+        )
+        with self._lock:
+            self._puts += 1
+            prune = self._puts % self.prune_every == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """ลบ entries ที่หมดอายุ และตัวที่เก่าที่สุดจนเหลือไม่เกิน max_entries"""
+        conn = self._conn()
+        conn.execute("DELETE FROM results WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM results WHERE key IN ("
+            "SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def generation(self, index_name: str) -> int:
+        row = self._conn().execute(
+            "SELECT generation FROM generations WHERE index_name = ?", (index_name,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump_generation(self, index_name: str) -> int:
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO generations (index_name, generation) VALUES (?, 1) "
+            "ON CONFLICT(index_name) DO UPDATE SET generation = generation + 1",
+            (index_name,)
+        )
+        return self.generation(index_name)
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._conn().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+class ResultCache:
+    """cache ผลลัพธ์ของ VectorSearcher.search ต่อ index
+
+    key = hash ของ (generation, query vector, filter, top_k, include_metadata)
+    ทุกครั้งที่ upsert/delete จะเพิ่ม generation ของ index ผลลัพธ์ที่ cache ไว้ก่อนการเขียน
+    จึงไม่ถูกใช้อีก (และจะถูกทิ้งไปเองตาม LRU/TTL)
+    """
+
+    def __init__(self, index_name: str, backend):
+        self.index_name = index_name
+        self.backend = backend
+
+    def key(self, vector, filter_dict: Optional[Dict[str, Any]], top_k: int, include_metadata: bool) -> str:
+        h = hashlib.sha1()
+        h.update(f"{self.index_name}|{self.generation()}|{top_k}|{include_metadata}|".encode('utf-8'))
+        h.update(json.dumps(filter_dict, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+        h.update(np.asarray(vector, dtype=np.float32).tobytes())
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        return self.backend.get(key)
+
+    def put(self, key: str, results: List[Dict]):
+        self.backend.put(key, results)
+
+    def generation(self) -> str:
+        """generation ของ index ใน process นี้ รวมกับ generation ใน backend (ที่ process อื่นเพิ่มได้)"""
+        return f"{_process_generations.get(self.index_name, 0)}.{self.backend.generation(self.index_name)}"
+
+    def invalidate(self) -> str:
+        """เพิ่ม generation ของ index (เรียกหลัง upsert/delete)"""
+        with _shared_lock:
+            _process_generations[self.index_name] = _process_generations.get(self.index_name, 0) + 1
+        self.backend.bump_generation(self.index_name)
+        return self.generation()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.backend.stats()
+        stats['generation'] = self.generation()
+        return stats
+
+# backend ที่ใช้ร่วมกันภายใน process แยกตาม path และค่า max_entries/ttl ของผู้เรียก
+_shared_backends: Dict[tuple, Any] = {}
+# generation ต่อ index ของ process นี้: ทุก ResultCache ของ index เดียวกันเห็นการ invalidate
+# แม้จะใช้ backend คนละตัว (เช่น upserter ใช้หน่วยความจำ แต่ searcher ใช้ไฟล์ SQLite)
+_process_generations: Dict[str, int] = {}
+_shared_lock = threading.Lock()
+
+def open_result_cache(index_name: str, path: Optional[str] = None, max_entries: int = 10000,
+                      ttl: Optional[float] = 300) -> ResultCache:
+    """เปิด ResultCache ของ index
+
+    path: ไฟล์ SQLite ที่ใช้ร่วมกันข้าม process (None = ใช้ RESULT_CACHE_PATH ถ้าไม่มีใช้หน่วยความจำ)
+    ผู้เรียกที่ใช้ path และ max_entries/ttl เดียวกันได้ backend ตัวเดียวกัน
+    """
+    if path is None:
+        path = os.getenv('RESULT_CACHE_PATH')
+    backend_key = (os.path.abspath(path) if path else None, max_entries, ttl)
+
+    with _shared_lock:
+        backend = _shared_backends.get(backend_key)
+        if backend is None:
+            if path:
+                backend = SQLiteResultBackend(path, max_entries=max_entries, ttl=ttl)
+            else:
+                backend = MemoryResultBackend(max_entries=max_entries, ttl=ttl)
+            _shared_backends[backend_key] = backend
+    return ResultCache(index_name, backend)
@@ -0,0 +1,443 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from metrics import LatencyStats, registry, get_logger, log_event
+
+logger = get_logger('service')
+
+class ServiceOverloaded(Exception):
+    """มี request ค้างเกิน max_pending (HTTP 503)"""
+
+class _Request:
+    __slots__ = ('query', 'top_k', 'filter_dict', 'include_metadata', 'future', 'arrived')
+
+    def __init__(self, query, top_k, filter_dict, include_metadata, future):
+        self.query = query
+        self.top_k = top_k
+        self.filter_dict = filter_dict
+        self.include_metadata = include_metadata
+        self.future = future
+        self.arrived = time.perf_counter()
+
+class SearchService:
+    """บริการค้นหาแบบ asyncio ที่รวม queries ที่เข้ามาพร้อมกันเป็น micro-batch
+
+    - รอ request เพิ่มไม่เกิน batch_window_ms หลัง request แรกของ batch (หรือจนครบ max_batch_size)
+    - encode ทั้ง batch ใน forward pass เดียวบน encode thread (event loop ไม่ถูก block)
+      ระหว่างที่ batch หนึ่ง encode อยู่ requests ใหม่จะรอรวมเป็น batch ถัดไป (ยิ่งโหลดสูง batch ยิ่งใหญ่)
+    - query index ของแต่ละ request พร้อมกันผ่าน thread pool (max_query_workers)
+    - admission control: มี request ค้าง (รอ + กำลังทำ) ถึง max_pending แล้วจะปฏิเสธทันทีด้วย ServiceOverloaded
+    """
+
+    def __init__(self, searcher=None, batch_window_ms: float = 5.0, max_batch_size: int = 64,
+                 max_pending: int = 1024, max_query_workers: int = 16):
+        if searcher is None:
+            from vector_search import VectorSearcher
+            searcher = VectorSearcher()
+        self.searcher = searcher
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_pending = max_pending
+        self.max_query_workers = max_query_workers
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._batch_tasks = set()
+        self._encoder_free: Optional[asyncio.Semaphore] = None
+        self._encode_pool = None
+        self._query_pool = None
+        self.pending = 0
+
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched_queries = 0
+        self.latency = {
+            'queue': LatencyStats(),
+            'encode': LatencyStats(),
+            'request': LatencyStats(),
+        }
+
+    async def start(self):
+        """เริ่ม batcher (เรียกใน event loop ที่จะใช้งาน)"""
+        if self._batcher is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._encoder_free = asyncio.Semaphore(1)
+        # encode ทีละ batch (โมเดลใช้ทุก core อยู่แล้ว) ส่วน query index เป็น I/O จึงทำพร้อมกันหลาย thread
+        self._encode_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='encode')
+        self._query_pool = ThreadPoolExecutor(max_workers=self.max_query_workers, thread_name_prefix='search')
+        # โหลดโมเดลก่อนรับ request แรก
+        await asyncio.get_running_loop().run_in_executor(self._encode_pool, self.searcher.embedder.load)
+        self._batcher = asyncio.create_task(self._batch_loop())
+
+    async def stop(self):
+        """หยุดรับ batch ใหม่ รอ batch ที่กำลังทำให้เสร็จ แล้วปิด thread pools"""
+        if self._batcher is None:
+            return
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+        self._batcher = None
+        if self._batch_tasks:
+            await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+        while not self._queue.empty():
+            request = self._queue.get_nowait()
+            if not request.future.done():
+                request.future.set_exception(ServiceOverloaded("Search service stopped"))
+        self._encode_pool.shutdown(wait=True)
+        self._query_pool.shutdown(wait=True)
+
+    async def search(self, query: str, top_k: int = 5, filter_dict: Optional[Dict[str, Any]] = None,
+                     include_metadata: bool = True) -> List[Dict]:
+        """ค้นหาแบบเดียวกับ VectorSearcher.search แต่รวม batch กับ requests อื่นที่เข้ามาพร้อมกัน"""
+        if self._batcher is None:
+            await self.start()
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ServiceOverloaded(f"{self.pending} requests pending (max_pending={self.max_pending})")
+
+        self.pending += 1
+        self.requests += 1
+        request = _Request(query, top_k, filter_dict, include_metadata, asyncio.get_running_loop().create_future())
+        try:
+            self._queue.put_nowait(request)
+            return await request.future
+        finally:
+            self.pending -= 1
+            self.latency['request'].record(time.perf_counter() - request.arrived)
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                batch.append(await self._queue.get())
+                # รอให้ batch ก่อนหน้า encode เสร็จก่อนปิด batch นี้ requests ที่เข้ามาระหว่างนั้นจะได้รวมกัน
+                await self._encoder_free.acquire()
+                deadline = loop.time() + self.batch_window
+                while len(batch) < self.max_batch_size:
+                    # ดึง request ที่รออยู่แล้วทั้งหมดก่อน แล้วค่อยรอจนหมดเวลา window
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # stop() ระหว่างรวบรวม batch: requests ที่ดึงออกจากคิวแล้วต้องได้คำตอบ
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(ServiceOverloaded("Search service stopped"))
+                raise
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: List[_Request]):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        for request in batch:
+            self.latency['queue'].record(started - request.arrived)
+        self.batches += 1
+        self.batched_queries += len(batch)
+
+        try:
+            vectors = await loop.run_in_executor(
+                self._encode_pool, self.searcher.embed_queries, [request.query for request in batch]
+            )
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        finally:
+            self._encoder_free.release()
+        self.latency['encode'].record(time.perf_counter() - started)
+
+        async def query_one(request, vector):
+            try:
+                results = await loop.run_in_executor(
+                    self._query_pool, self.searcher.search_embedding,
+                    request.query, vector, request.top_k, request.filter_dict, request.include_metadata
+                )
+            except Exception as e:
+                if not request.future.done():
+                    request.future.set_exception(e)
+                return
+            if not request.future.done():
+                request.future.set_result(results)
+
+        await asyncio.gather(*(query_one(request, vector) for request, vector in zip(batch, vectors)))
+
+    def stats(self) -> Dict[str, Any]:
+        """สถิติของ service: ขนาด batch เฉลี่ย, จำนวนที่ถูกปฏิเสธ และ latency (ms)"""
+        return {
+            'requests': self.requests,
+            'rejected': self.rejected,
+            'pending': self.pending,
+            'batches': self.batches,
+            'mean_batch_size': self.batched_queries / self.batches if self.batches else 0.0,
+            'latency': {stage: stats.summary() for stage, stats in self.latency.items()},
+            'searcher': self.searcher.search_stats(),
+        }
+
+# ---------- HTTP ----------
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+def _http_response(status: int, payload: Any, keep_alive: bool) -> bytes:
+    """payload เป็น str: ส่งเป็น text/plain (Prometheus) นอกนั้นส่งเป็น JSON"""
+    if isinstance(payload, str):
+        body, content_type = payload.encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body, content_type = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8'), \
+            "application/json; charset=utf-8"
+    headers = [
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if status == 503:
+        headers.append("Retry-After: 1")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode('latin-1') + body
+
+class SearchHTTPServer:
+    """HTTP/1.1 server ขนาดเล็กบน asyncio (ไม่ต้องใช้ web framework) รองรับ keep-alive
+
+    - POST /search  body: {"query": "...", "top_k": 5, "filter": {...}}
+    - GET  /search?q=...&top_k=5
+    - GET  /stats, GET /health
+    - GET  /metrics (Prometheus text ของ metrics.registry, เปิดด้วย METRICS_ENABLED=1)
+    """
+
+    def __init__(self, service: SearchService, host: str = '127.0.0.1', port: int = 8080):
+        self.service = service
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        await self.service.start()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        log_event(logger, f"Search service listening on http://{self.host}:{self.port}",
+                  event='service_listening', host=self.host, port=self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.service.stop()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                request_line, *header_lines = head.decode('latin-1').split("\r\n")
+                method, target, version = request_line.split(' ', 2)
+                headers = {}
+                for line in header_lines:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+                status, payload = await self._route(method, target, body)
+                writer.write(_http_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, target: str, body: bytes):
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, {'status': 'ok'}
+        if url.path == '/stats':
+            return 200, self.service.stats()
+        if url.path == '/metrics':
+            return 200, registry.to_prometheus()
+        if url.path != '/search':
+            return 404, {'error': f"Unknown path {url.path}"}
+
+        try:
+            if method == 'POST':
+                params = json.loads(body or b'{}')
+                if not isinstance(params, dict):
+                    return 400, {'error': "Request body must be a JSON object"}
+                query, top_k, filter_dict = params.get('query'), int(params.get('top_k', 5)), params.get('filter')
+                if filter_dict is not None and not isinstance(filter_dict, dict):
+                    return 400, {'error': "filter must be a JSON object"}
+            elif method == 'GET':
+                params = parse_qs(url.query)
+                query, top_k, filter_dict = params.get('q', [None])[0], int(params.get('top_k', ['5'])[0]), None
+            else:
+                return 405, {'error': f"Method {method} not allowed"}
+        except (ValueError, TypeError) as e:
+            return 400, {'error': f"Invalid request: {e}"}
+        if not query or not isinstance(query, str):
+            return 400, {'error': "query is required"}
+
+        try:
+            results = await self.service.search(query, top_k=top_k, filter_dict=filter_dict)
+        except ServiceOverloaded as e:
+            return 503, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': str(e)}
+        return 200, {'query': query, 'results': results}
+
+# ---------- load generator ----------
+
+async def _http_search(reader, writer, host: str, query: str, top_k: int) -> int:
+    body = json.dumps({'query': query, 'top_k': top_k}, ensure_ascii=False).encode('utf-8')
+    writer.write((f"POST /search HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode('latin-1') + body)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.decode('latin-1').split("\r\n"):
+        if line.lower().startswith('content-length:'):
+            length = int(line.split(':', 1)[1])
+    await reader.readexactly(length)
+    return status
+
+async def run_load(queries: List[str], concurrency: int = 32, total_requests: int = 2000,
+                   service: Optional[SearchService] = None, host: str = '127.0.0.1', port: Optional[int] = None,
+                   top_k: int = 5) -> Dict[str, float]:
+    """ยิง total_requests queries ด้วย concurrency clients พร้อมกัน
+
+    ส่ง service: เรียก SearchService.search โดยตรง, ส่ง port: ยิงผ่าน HTTP (keep-alive connection ต่อ client)
+    queries ถูกใช้วนซ้ำ ถ้าไม่อยากให้โดน cache ให้ส่ง queries ที่ไม่ซ้ำกันมากพอ
+    """
+    latency = LatencyStats(max_samples=total_requests)
+    counter = iter(range(total_requests))
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        connection = await asyncio.open_connection(host, port) if port else None
+        try:
+            for i in counter:
+                started = time.perf_counter()
+                try:
+                    if connection:
+                        ok = await _http_search(*connection, host, queries[i % len(queries)], top_k) == 200
+                    else:
+                        await service.search(queries[i % len(queries)], top_k=top_k)
+                        ok = True
+                except ServiceOverloaded:
+                    ok = False
+                if ok:
+                    latency.record(time.perf_counter() - started)
+                else:
+                    errors += 1
+        finally:
+            if connection:
+                connection[1].close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    summary = latency.summary()
+    return {
+        'requests': total_requests,
+        'errors': errors,
+        'seconds': elapsed,
+        'qps': summary['count'] / elapsed if elapsed else 0.0,
+        'p50_ms': summary['p50_ms'],
+        'p95_ms': summary['p95_ms'],
+        'p99_ms': summary['p99_ms'],
+    }
+
+def _benchmark(args):
+    """เทียบ batch ละ 1 query (เหมือนเรียก search ทีละ request) กับ micro-batching ที่ concurrency เท่ากัน"""
+    from vector_search import VectorSearcher
+
+    # query ไม่ซ้ำกันเพื่อวัดการ encode จริง (ไม่ให้โดน query/result cache)
+    queries = [f"{text} {i}" for i in range(args.requests) for text in (
+        "การเรียนรู้ของเครื่อง", "Python programming language", "vector database สำหรับ RAG")][:args.requests]
+
+    async def run(batch_window_ms, max_batch_size):
+        searcher = VectorSearcher(args.index, result_cache=False, query_cache_size=0)
+        service = SearchService(searcher, batch_window_ms=batch_window_ms, max_batch_size=max_batch_size)
+        await service.start()
+        try:
+            if args.http:
+                server = SearchHTTPServer(service, port=0)
+                await server.start()
+                result = await run_load(queries, args.concurrency, args.requests, port=server.port)
+                await server.stop()
+            else:
+                result = await run_load(queries, args.concurrency, args.requests, service=service)
+        finally:
+            await service.stop()
+        result['mean_batch_size'] = service.stats()['mean_batch_size']
+        return result
+
+    for name, window, size in (('batch of 1', 0.0, 1), (f'micro-batch {args.window:g} ms', args.window, args.max_batch)):
+        result = asyncio.run(run(window, size))
+        print(f"{name:20s} {result['qps']:8.1f} qps  p50 {result['p50_ms']:7.1f} ms  "
+              f"p95 {result['p95_ms']:7.1f} ms  mean batch {result['mean_batch_size']:.1f}  errors {result['errors']}")
+
+def main(argv=None):
+    """CLI: python search_service.py serve [--port 8080] | bench [--concurrency 32] [--http]"""
+    parser = argparse.ArgumentParser(description="Async micro-batching search service")
+    parser.add_argument('command', choices=['serve', 'bench'])
+    parser.add_argument('--index', default="rag-documents", help="ชื่อ index")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--window', type=float, default=5.0, help="batch window (ms)")
+    parser.add_argument('--max-batch', type=int, default=64, help="จำนวน queries สูงสุดต่อ batch")
+    parser.add_argument('--max-pending', type=int, default=1024, help="จำนวน requests ค้างสูงสุดก่อนตอบ 503")
+    parser.add_argument('--concurrency', type=int, default=32, help="(bench) จำนวน clients พร้อมกัน")
+    parser.add_argument('--requests', type=int, default=2000, help="(bench) จำนวน requests ทั้งหมด")
+    parser.add_argument('--http', action='store_true', help="(bench) ยิงผ่าน HTTP แทนการเรียกตรง")
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        _benchmark(args)
+        return
+
+    from vector_search import VectorSearcher
+    service = SearchService(VectorSearcher(args.index), batch_window_ms=args.window,
+                            max_batch_size=args.max_batch, max_pending=args.max_pending)
+    server = SearchHTTPServer(service, host=args.host, port=args.port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+# ทดสอบ: python search_service.py bench --concurrency 32
+if __name__ == "__main__":
+    main()
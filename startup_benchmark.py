@@ -0,0 +1,86 @@
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List
+
+# modules ที่ใช้เวลา import นาน ต้องไม่ถูก import จนกว่าจะใช้งานจริง (โหลดโมเดล / เชื่อมต่อ / อ่าน CSV)
+HEAVY_MODULES = ('torch', 'transformers', 'sentence_transformers', 'onnxruntime', 'pandas', 'pinecone')
+
+# (ชื่อ, โค้ดที่วัด) แต่ละตัวรันใน process ใหม่ จึงวัด cold start จริง
+SCENARIOS = [
+    ('import data_importer', "import data_importer"),
+    ('import data_upserter', "import data_upserter"),
+    ('import vector_search', "import vector_search"),
+    ('FileDataImporter()', "import data_importer; data_importer.FileDataImporter()"),
+    ('VectorSearcher()', "import vector_search; vector_search.VectorSearcher()"),
+    ('upserter + searcher share model',
+     "import data_upserter, vector_search\n"
+     "assert data_upserter.PineconeDataUpserter().embedder is vector_search.VectorSearcher().embedder"),
+]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def run_scenario(code: str) -> Dict:
+    """รันโค้ดใน interpreter ใหม่ คืนเวลาที่ใช้และ heavy modules ที่ถูก import"""
+    probe = _PROBE.format(code=code, heavy=HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {'seconds': None, 'heavy': [], 'error': completed.stderr.strip().splitlines()[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def slowest_imports(module: str, limit: int = 10) -> List[tuple]:
+    """modules ที่ใช้เวลา import (รวม sub-imports) มากที่สุดจาก python -X importtime"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                               capture_output=True, text=True)
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+def main(argv=None) -> int:
+    """CLI: python startup_benchmark.py [--budget 1.0] [--repeat 3] [--profile data_importer]
+
+    exit code 1 ถ้า scenario ใดช้ากว่า budget หรือ import heavy modules ตอนเริ่มต้น
+    """
+    parser = argparse.ArgumentParser(description="Measure cold-start time of CLI entry points")
+    parser.add_argument('--budget', type=float, default=1.0, help="เวลาสูงสุด (วินาที) ต่อ scenario")
+    parser.add_argument('--repeat', type=int, default=3, help="จำนวนรอบต่อ scenario (ใช้ค่าที่เร็วที่สุด)")
+    parser.add_argument('--profile', help="แสดง modules ที่ import ช้าที่สุดของ module นี้")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for name, code in SCENARIOS:
+        runs = [run_scenario(code) for _ in range(args.repeat)]
+        errors = [run['error'] for run in runs if run.get('error')]
+        if errors:
+            print(f"FAIL {name:34s} {errors[0]}")
+            failures += 1
+            continue
+
+        best = min(run['seconds'] for run in runs)
+        heavy = sorted({module for run in runs for module in run['heavy']})
+        ok = best <= args.budget and not heavy
+        failures += not ok
+        note = f"  heavy imports: {', '.join(heavy)}" if heavy else ""
+        print(f"{'ok  ' if ok else 'FAIL'} {name:34s} {best * 1000:8.1f} ms{note}")
+
+    if args.profile:
+        print(f"\nSlowest imports of {args.profile}:")
+        for seconds, module in slowest_imports(args.profile):
+            print(f"  {seconds * 1000:8.1f} ms  {module}")
+
+    return 1 if failures else 0
+
+# ทดสอบ: python startup_benchmark.py --profile data_importer
+if __name__ == "__main__":
+    sys.exit(main())
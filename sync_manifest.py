@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, Optional, List
+
+# field ของเอกสารที่มีผลต่อ vectors/metadata (created_at ไม่นับ เพราะเปลี่ยนทุกครั้งที่ import)
+HASHED_FIELDS = ('title', 'content', 'source_url', 'type')
+
+class SyncManifest:
+    """Manifest สำหรับ incremental sync เก็บเป็น JSON บน disk
+
+    แต่ละเอกสาร: doc_id -> {'hash', 'chunks', 'config', 'source', 'mtime_ns', 'size'}
+    - hash: content hash ของเอกสาร (รวม config ของ chunker/model) ใช้ตัดสินว่าต้อง upsert ใหม่ไหม
+    - chunks: จำนวน chunks ที่ upsert ไว้ ใช้ลบ {doc_id}_{i} ที่เกินออกเมื่อเอกสารสั้นลง
+    - mtime_ns/size: ของไฟล์ต้นทาง ถ้าตรงกันจะข้ามไฟล์โดยไม่ต้องอ่าน
+    """
+
+    def __init__(self, path: str = '.sync_manifest.json'):
+        self.path = Path(path)
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.documents = json.load(f).get('documents', {})
+
+    @staticmethod
+    def content_hash(document: Dict[str, Any], config: str = '') -> str:
+        """hash ของ field ที่มีผลต่อ vectors รวมกับ config ของ pipeline"""
+        payload = {field: document.get(field) for field in HASHED_FIELDS}
+        payload['config'] = config
+        data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        return self.documents.get(doc_id)
+
+    def file_unchanged(self, doc_id: str, mtime_ns: int, size: int, config: str) -> bool:
+        """ไฟล์ไม่เปลี่ยนถ้า mtime/size ตรงกับที่บันทึกไว้ และ config ของ pipeline เหมือนเดิม"""
+        entry = self.documents.get(doc_id)
+        return (
+            entry is not None
+            and entry.get('config') == config
+            and entry.get('mtime_ns') == mtime_ns
+            and entry.get('size') == size
+        )
+
+    def update(self, doc_id: str, **fields):
+        self.documents.setdefault(doc_id, {}).update(fields)
+
+    def remove(self, doc_id: str):
+        self.documents.pop(doc_id, None)
+
+    def doc_ids_for_source(self, source: str) -> List[str]:
+        return [doc_id for doc_id, entry in self.documents.items() if entry.get('source') == source]
+
+    def save(self):
+        """เขียน manifest แบบ atomic (เขียนไฟล์ชั่วคราวแล้ว rename)"""
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'documents': self.documents}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,89 @@
+import pytest
+
+from bm25_index import BM25Index
+from metadata_filter import match_metadata
+from vector_search import VectorSearcher
+
+FILTERS = [
+    {'document_type': 'guide'},
+    {'document_type': {'$ne': 'guide'}},
+    {'source_url': {'$ne': 'https://example.com/1'}},
+    {'source_url': {'$nin': ['https://example.com/1', 'https://example.com/2']}},
+    {'source_url': {'$exists': False}},
+    {'priority': {'$gte': 2}},
+    {'priority': {'$lt': 2}},
+    {'$or': [{'document_type': 'faq'}, {'priority': {'$gt': 3}}]},
+    {'$and': [{'document_type': {'$in': ['guide', 'faq']}}, {'source_url': {'$ne': 'https://example.com/3'}}]},
+]
+
+def _rows():
+    """chunks ที่บางตัวไม่มี source_url / priority (ตัวดำเนินการเชิงลบต้องไม่ match ผิดเพราะ field หาย)"""
+    rows = []
+    for i in range(12):
+        metadata = {'doc_id': f"d{i}", 'chunk_index': 0, 'document_type': ('guide', 'faq', 'note')[i % 3],
+                    'title': f"widget {i}"}
+        if i % 4:
+            metadata['source_url'] = f"https://example.com/{i % 5}"
+        if i % 2:
+            metadata['priority'] = i % 5
+        rows.append((f"d{i}_0", f"widget manual part {i}", metadata))
+    return rows
+
+@pytest.mark.parametrize('filter_dict', FILTERS)
+def test_search_filter_matches_match_metadata(filter_dict):
+    index = BM25Index()
+    rows = _rows()
+    index.add_many(rows)
+    expected = {vector_id for vector_id, _, metadata in rows if match_metadata(metadata, filter_dict)}
+    assert {vector_id for vector_id, _ in index.search('widget', top_k=100, filter_dict=filter_dict)} == expected
+
+@pytest.mark.parametrize('filter_dict', FILTERS)
+def test_delete_filter_matches_match_metadata(filter_dict):
+    index = BM25Index()
+    rows = _rows()
+    index.add_many(rows)
+    index.delete(filter=filter_dict)
+    expected = {vector_id for vector_id, _, metadata in rows if not match_metadata(metadata, filter_dict)}
+    assert {vector_id for vector_id, _ in index.search('widget', top_k=100)} == expected
+
+def test_filter_on_unstored_field_raises():
+    index = BM25Index()
+    index.add_many(_rows())
+    with pytest.raises(ValueError):
+        index.search('widget', filter_dict={'content': 'widget'})
+    with pytest.raises(ValueError):
+        index.delete(filter={'content': {'$ne': 'x'}})
+    assert index.stats()['documents'] == 12
+
+def test_saved_index_keeps_filterable_fields(tmp_path):
+    index = BM25Index(str(tmp_path / 'bm25'))
+    index.add_many(_rows())
+    index.save()
+    loaded = BM25Index(str(tmp_path / 'bm25'))
+    filter_dict = {'source_url': {'$ne': 'https://example.com/1'}}
+    assert loaded.search('widget', top_k=100, filter_dict=filter_dict) == \
+        index.search('widget', top_k=100, filter_dict=filter_dict)
+
+@pytest.mark.parametrize('filter_dict', [
+    {'source_url': {'$ne': 'https://example.com/1'}},
+    {'document_type': 'faq'},
+])
+def test_delete_by_filter_keeps_index_and_bm25_in_sync(index_name, fake_index, embedder, make_upserter,
+                                                       documents, filter_dict):
+    upserter = make_upserter(lexical=True)
+    docs = documents(6)
+    for i, document in enumerate(docs):
+        document['source_url'] = f"https://example.com/{i % 3}"
+        document['type'] = ('guide', 'faq')[i % 2]
+    upserter.upsert_documents(docs)
+
+    upserter.delete_by_filter(filter_dict)
+    remaining = {vector_id for vector_id, _ in upserter.lexical_index.search('document', top_k=1000)}
+    assert remaining == set(fake_index._vectors)
+    assert remaining
+
+    searcher = VectorSearcher(index_name, index=fake_index, embedder=embedder, result_cache=False)
+    hits = searcher.hybrid_search('document sentence', top_k=50, filter_dict={'document_type': 'guide'})
+    assert hits and all(hit['metadata']['document_type'] == 'guide' for hit in hits)
+    with pytest.raises(ValueError):
+        searcher.hybrid_search('document', filter_dict={'content': 'x'})
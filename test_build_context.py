@@ -0,0 +1,73 @@
+import pytest
+
+from vector_search import VectorSearcher
+
+QUERY = "Document d1 sentence 20 mentions item 171."
+
+def count_chars(texts):
+    return [len(text) for text in texts]
+
+@pytest.fixture
+def docs(documents):
+    return documents(3, sentences=40)
+
+@pytest.fixture
+def searcher(index_name, fake_index, embedder, make_upserter, docs):
+    make_upserter().upsert_documents(docs)
+    searcher = VectorSearcher(index_name, index=fake_index, embedder=embedder)
+    searcher.fetches = []
+    fetch = fake_index.fetch
+
+    def recorded(ids, **kwargs):
+        searcher.fetches.append(list(ids))
+        return fetch(ids, **kwargs)
+
+    fake_index.fetch = recorded
+    return searcher
+
+def test_neighbors_are_fetched_once_and_merged(searcher, fake_index, docs):
+    hit = searcher.search(QUERY, top_k=1)[0]
+    chunk_index = hit['chunk_index']
+    assert 0 < chunk_index < fake_index._vectors[hit['id']][1]['total_chunks'] - 1
+
+    context = searcher.build_context(QUERY, token_budget=10000, top_k=1, neighbors=1, count_tokens=count_chars)
+    assert searcher.fetches == [[f"d1_{chunk_index - 1}", f"d1_{chunk_index + 1}"]]
+    [passage] = context['passages']
+    assert (passage['doc_id'], passage['chunk_start'], passage['chunk_end']) == \
+        ('d1', chunk_index - 1, chunk_index + 1)
+    assert passage['hits'] == [hit['id']] and passage['score'] == hit['score']
+    # ส่วนที่ซ้อนกัน (chunk overlap) ถูกตัดออก: passage คือข้อความต่อเนื่องของเอกสารพอดี
+    assert passage['content'] == docs[1]['content'][passage['char_start']:passage['char_end']]
+    assert context['context'] == f"[1] d title 1\n{passage['content']}"
+
+def test_adjacent_hits_share_a_passage(searcher):
+    hits = searcher.search(QUERY, top_k=8, filter_dict={'title': 'd title 1'})
+    context = searcher.build_context(QUERY, token_budget=10000, top_k=8, neighbors=0,
+                                     filter_dict={'title': 'd title 1'}, count_tokens=count_chars)
+    assert searcher.fetches == []
+    [passage] = context['passages']
+    assert sorted(passage['hits']) == sorted(hit['id'] for hit in hits)
+    assert (passage['chunk_start'], passage['chunk_end']) == (0, len(hits) - 1)
+    assert passage['score'] == max(hit['score'] for hit in hits)
+
+@pytest.mark.parametrize('token_budget', [0, 200, 600, 1200, 2500, 10000])
+def test_context_respects_token_budget(searcher, token_budget):
+    context = searcher.build_context(QUERY, token_budget=token_budget, top_k=4, count_tokens=count_chars)
+    assert context['tokens'] <= token_budget
+    # นับด้วยตัวอักษร: tokens ที่รายงานต้องตรงกับ context ที่ประกอบจริง
+    assert len(context['context']) == context['tokens']
+    assert sum(passage['tokens'] for passage in context['passages']) == context['tokens']
+    scores = [passage['score'] for passage in context['passages']]
+    assert scores == sorted(scores, reverse=True)
+
+def test_oversized_passage_shrinks_to_best_chunk(searcher):
+    full = searcher.build_context(QUERY, token_budget=10000, top_k=1, count_tokens=count_chars)
+    assert full['passages'][0]['chunk_end'] - full['passages'][0]['chunk_start'] == 2
+
+    context = searcher.build_context(QUERY, token_budget=full['tokens'] // 2, top_k=1, count_tokens=count_chars)
+    [passage] = context['passages']
+    assert passage['chunk_start'] == passage['chunk_end'] and passage['hits'] == full['passages'][0]['hits']
+    assert 0 < context['tokens'] <= full['tokens'] // 2
+
+    empty = searcher.build_context(QUERY, token_budget=10, top_k=1, count_tokens=count_chars)
+    assert (empty['context'], empty['passages'], empty['dropped']) == ('', [], 1)
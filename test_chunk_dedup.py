@@ -0,0 +1,142 @@
+import json
+
+import numpy as np
+import pytest
+
+from chunk_dedup import ChunkDeduplicator
+from metadata_filter import match_metadata
+from vector_search import VectorSearcher
+
+BOILERPLATE = 'Copyright 2024 Example Co. All rights reserved. Contact support for help. ' * 12
+
+def _documents():
+    """A และ B ขึ้นต้นด้วย boilerplate เดียวกัน chunk แรกของ B จึงเป็น reference ของ A_0"""
+    return [
+        {'id': 'A', 'title': 'Apples', 'type': 'a',
+         'content': BOILERPLATE + '\n\n' + ' '.join(f"Apple fact {i} says orchard {i * 13} grows kind {i * 7}."
+                                                    for i in range(40))},
+        {'id': 'B', 'title': 'Bananas', 'type': 'b',
+         'content': BOILERPLATE + '\n\n' + ' '.join(f"Banana note {i} says plantation {i * 17} ships crate {i * 3}."
+                                                    for i in range(40))},
+    ]
+
+@pytest.fixture(params=[False, True], ids=['full-metadata', 'compact-metadata'])
+def ingested(request, index_name, fake_index, embedder, make_upserter, tmp_path):
+    chunk_store_path = str(tmp_path / 'chunks.db')
+    upserter = make_upserter(dedup=True, compact_metadata=request.param, chunk_store_path=chunk_store_path)
+    upserter.upsert_documents(_documents())
+    searcher = VectorSearcher(index_name, index=fake_index, embedder=embedder, result_cache=False,
+                              chunk_store_path=chunk_store_path if request.param else None)
+    return upserter, searcher
+
+def test_duplicate_chunk_is_stored_as_reference(ingested, fake_index):
+    upserter, _ = ingested
+    assert 'A_0' in fake_index._vectors
+    assert 'B_0' not in fake_index._vectors
+    assert 'B_0' in upserter.dedup.references(['A_0'])['A_0']
+
+@pytest.mark.parametrize('filter_dict', [{'document_type': 'b'}, {'title': 'Bananas'}])
+def test_reference_is_visible_under_its_own_filter(ingested, filter_dict):
+    _, searcher = ingested
+    hits = searcher.search('Copyright Example Co all rights reserved', top_k=3, filter_dict=filter_dict)
+    assert hits[0]['id'] == 'B_0'
+    assert hits[0]['duplicate_of'] == 'A_0'
+    assert hits[0]['metadata']['title'] == 'Bananas'
+
+def test_unfiltered_search_returns_only_canonical(ingested):
+    _, searcher = ingested
+    ids = [hit['id'] for hit in searcher.search('Copyright Example Co all rights reserved', top_k=5)]
+    assert 'A_0' in ids and 'B_0' not in ids
+
+def test_context_neighbours_include_references(ingested):
+    _, searcher = ingested
+    context = searcher.build_context('Banana note 1 says plantation 17 ships crate 3', token_budget=100000,
+                                     top_k=1, filter_dict={'document_type': 'b'},
+                                     count_tokens=lambda texts: [len(text.split()) for text in texts])
+    assert 'Copyright 2024 Example Co.' in context['context']
+    assert context['passages'][0]['doc_id'] == 'B'
+
+def test_deleting_canonical_restores_reference(ingested, fake_index):
+    upserter, searcher = ingested
+    upserter.delete_by_filter({'document_type': 'a'})
+    assert not any(vector_id.startswith('A_') for vector_id in fake_index._vectors)
+    assert 'B_0' in fake_index._vectors
+    assert searcher.search('Copyright Example Co', top_k=1)[0]['id'] == 'B_0'
+
+def test_near_duplicates_use_threshold(tmp_path):
+    dedup = ChunkDeduplicator(str(tmp_path / 'dedup.db'), threshold=0.95)
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=64).astype(np.float32)
+    near = base + rng.normal(scale=0.01, size=64).astype(np.float32)
+    far = rng.normal(size=64).astype(np.float32)
+    vectors = [(f"d{i}_0", values, {'content': f"chunk {i}"}) for i, values in enumerate((base, near, far))]
+
+    unique, demoted = dedup.deduplicate(vectors)
+    assert [vector_id for vector_id, _, _ in unique] == ['d0_0', 'd2_0']
+    assert demoted == []
+    assert dedup.get_references(['d1_0'])['d1_0'][0] == 'd0_0'
+
+def _dedup_vectors(count, start=0, seed=0):
+    """chunks ที่ข้อความซ้ำกับ chunk อื่นทุก 25 ตัว (exact duplicates) และ metadata ต่างกัน"""
+    rng = np.random.default_rng(seed)
+    return [(f"doc{j}_{j % 3}", rng.normal(size=16).astype(np.float32),
+             {'content': f"shared text {j % 25}", 'title': f"t{j % 7}", 'chunk_index': j % 5,
+              'document_type': 'x' if j % 2 else 'y', 'tags': [f"g{j % 4}"]})
+            for j in range(start, start + count)]
+
+FILTERS = [
+    {'title': 't3'},
+    {'chunk_index': {'$gte': 3}},
+    {'$or': [{'title': {'$in': ['t1', 't2']}}, {'tags': 'g0'}]},
+    {'title': {'$ne': 't0'}, 'chunk_index': {'$lt': 2}},
+    {'missing': {'$exists': False}, 'title': 't6'},
+]
+
+def _brute_force(dedup, table, filter_dict):
+    rows = dedup._conn.execute(f"SELECT vector_id, metadata FROM {table}").fetchall()
+    return sorted(vector_id for vector_id, metadata in rows
+                  if match_metadata(dedup._filter_metadata(vector_id, json.loads(metadata)), filter_dict))
+
+def _indexed(dedup, table, filter_dict):
+    return sorted(row[0] for row in dedup._matching_rows(table, 'vector_id, metadata', filter_dict))
+
+def test_filter_index_tracks_writes(tmp_path):
+    dedup = ChunkDeduplicator(str(tmp_path / 'dedup.db'))
+    dedup.deduplicate(_dedup_vectors(300))
+    assert dedup.stats()['references'] == 275
+    for filter_dict in FILTERS:
+        for table in ('canonical', 'refs'):
+            assert _indexed(dedup, table, filter_dict) == _brute_force(dedup, table, filter_dict)
+
+    # index ที่สร้างแล้วต้องแก้ตาม deduplicate (รวม ID เดิมที่ ingest ซ้ำ) และ forget
+    dedup.deduplicate(_dedup_vectors(100, start=250, seed=1))
+    dedup.forget([f"doc{j}_{j % 3}" for j in range(0, 60, 4)])
+    dedup.forget_matching({'title': 't5', 'chunk_index': {'$gt': 1}})
+    for filter_dict in FILTERS:
+        for table in ('canonical', 'refs'):
+            assert _indexed(dedup, table, filter_dict) == _brute_force(dedup, table, filter_dict)
+
+def test_filtered_lookup_reads_only_matching_rows(tmp_path, monkeypatch):
+    dedup = ChunkDeduplicator(str(tmp_path / 'dedup.db'))
+    dedup.deduplicate(_dedup_vectors(500))
+    query = np.ones(16, dtype=np.float32)
+    dedup.search_references(query, 5, {'title': 't0'})
+
+    decoded = []
+    real_loads = json.loads
+    monkeypatch.setattr('chunk_dedup.json.loads', lambda text: decoded.append(text) or real_loads(text))
+    found = dedup.search_references(query, 500, {'title': 't0', 'chunk_index': 4})
+    # หลังสร้าง index แล้ว decode เฉพาะแถวที่ตรงกับ filter และ canonical ของมัน ไม่ใช่ทั้ง table
+    assert found and all(metadata['title'] == 't0' and metadata['chunk_index'] == 4 for _, _, _, metadata in found)
+    assert len(decoded) <= 3 * len(found)
+
+def test_filter_index_sees_writes_from_other_connections(tmp_path):
+    path = str(tmp_path / 'dedup.db')
+    searcher_side = ChunkDeduplicator(path)
+    ingest_side = ChunkDeduplicator(path)
+    ingest_side.deduplicate(_dedup_vectors(100))
+    assert _indexed(searcher_side, 'refs', {'title': 't2'}) == _brute_force(searcher_side, 'refs', {'title': 't2'})
+
+    ingest_side.deduplicate(_dedup_vectors(100, start=100, seed=1))
+    ingest_side.forget(['doc2_2', 'doc9_0'])
+    assert _indexed(searcher_side, 'refs', {'title': 't2'}) == _brute_force(searcher_side, 'refs', {'title': 't2'})
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from chunk_store import COMPACT_METADATA_FIELDS, ChunkStore
+from metadata_filter import match_metadata
+from vector_search import VectorSearcher
+
+def _stored_ids(index, filter_dict=None):
+    return {vector_id for vector_id, (_, metadata) in index._vectors.items() if match_metadata(metadata, filter_dict)}
+
+@pytest.fixture
+def compact_upserter(make_upserter, documents):
+    upserter = make_upserter(compact_metadata=True)
+    upserter.upsert_documents(documents(3, type='faq') + documents(2, prefix='m', type='manual'))
+    return upserter
+
+def test_index_keeps_only_compact_fields(compact_upserter, fake_index):
+    for vector_id, (_, metadata) in fake_index._vectors.items():
+        assert set(metadata) <= set(COMPACT_METADATA_FIELDS)
+        assert metadata['doc_id'] == vector_id.rsplit('_', 1)[0]
+    assert compact_upserter.chunk_store.count() == len(fake_index._vectors)
+
+def test_search_hydrates_from_store(compact_upserter, make_upserter, make_fake_index, index_name, fake_index,
+                                    embedder, documents):
+    full_index = make_fake_index()
+    make_upserter(index=full_index).upsert_documents(
+        documents(3, type='faq') + documents(2, prefix='m', type='manual'))
+
+    query = "Document m1 sentence 4 mentions item 59."
+    compact = VectorSearcher(index_name, index=fake_index, embedder=embedder).search(query, top_k=5)
+    full = VectorSearcher(index_name, index=full_index, embedder=embedder).search(query, top_k=5)
+    assert [hit['id'] for hit in compact] == [hit['id'] for hit in full]
+    for compact_hit, full_hit in zip(compact, full):
+        assert compact_hit['content'] == full_hit['content'] and compact_hit['content']
+        assert compact_hit['title'] == full_hit['title']
+        assert {key: value for key, value in compact_hit['metadata'].items() if key != 'doc_id'} == \
+            full_hit['metadata']
+
+def test_get_many_and_delete_in_batches(tmp_path):
+    store = ChunkStore(str(tmp_path / 'chunks.db'))
+    vectors = [(f"doc{i // 10}_{i % 10}", None,
+                {'title': f"title {i // 10}", 'content': f"chunk {i}", 'chunk_index': i % 10, 'total_chunks': 10})
+               for i in range(2000)]
+    store.put_vectors(vectors)
+    found = store.get_many([vector_id for vector_id, _, _ in vectors] + ['missing_0'])
+    assert len(found) == 2000
+    assert found['doc7_3']['content'] == 'chunk 73' and found['doc7_3']['title'] == 'title 7'
+
+    # ลบ chunks ทั้งหมดของ doc0-doc99 และบางส่วนของ doc100: เอกสารที่ไม่เหลือ chunk ถูกลบด้วย
+    store.delete([vector_id for vector_id, _, _ in vectors[:1005]])
+    assert store.count() == 995
+    documents = store._conn().execute("SELECT doc_id FROM documents").fetchall()
+    assert len(documents) == 100 and ('doc0',) not in documents and ('doc100',) in documents
+
+def test_delete_ids_removes_store_rows(compact_upserter, fake_index):
+    ids = sorted(_stored_ids(fake_index, {'doc_id': 'd1'}))
+    compact_upserter.delete_ids(ids)
+    assert compact_upserter.chunk_store.get_many(ids) == {}
+    assert compact_upserter.chunk_store.count() == len(fake_index._vectors)
+
+@pytest.mark.parametrize('filter_dict', [
+    {'title': 'd title 1'},
+    {'document_type': 'manual'},
+    {'doc_id': {'$in': ['d0', 'm1']}},
+    {'$or': [{'title': 'm title 0'}, {'chunk_index': {'$gte': 2}}]},
+    {'document_type': 'faq', 'chunk_index': 0},
+])
+def test_delete_by_filter_leaves_no_orphans(compact_upserter, fake_index, filter_dict):
+    """regression: delete_by_filter เคยลบเฉพาะใน index ทำให้ข้อความของ chunks ที่ถูกลบค้างใน store"""
+    expected = _stored_ids(fake_index, filter_dict)
+    assert expected
+    assert set(compact_upserter.chunk_store.find(filter_dict)) == expected
+
+    compact_upserter.delete_by_filter(filter_dict)
+    assert not _stored_ids(fake_index, filter_dict)
+    assert compact_upserter.chunk_store.get_many(sorted(expected)) == {}
+    remaining = sorted(fake_index._vectors)
+    assert set(compact_upserter.chunk_store.get_many(remaining)) == set(remaining)
+    assert compact_upserter.chunk_store.count() == len(remaining)
+
+def test_search_without_store_returns_index_metadata(index_name, fake_index, embedder):
+    fake_index.upsert([('x_0', np.ones(embedder.embedding_dim), {'doc_id': 'x', 'title': 't'})])
+    searcher = VectorSearcher(index_name, index=fake_index, embedder=embedder,
+                              chunk_store_path='missing/chunks.db')
+    assert searcher.search('anything', top_k=1)[0]['metadata'] == {'doc_id': 'x', 'title': 't'}
@@ -0,0 +1,107 @@
+import zlib
+
+import numpy as np
+import pytest
+
+from embedding_cache import EmbeddingCache
+
+DIM = 8
+
+def _embeddings(texts):
+    """embedding ที่ได้จาก text ได้เสมอ ใช้ตรวจว่า cache คืน vector ของ text ที่ถูกตัว"""
+    return np.stack([np.random.default_rng(zlib.crc32(text.encode("utf-8"))).normal(size=DIM) for text in texts]
+                    ).astype(np.float32)
+
+def _texts(count, prefix='t'):
+    return [f"{prefix}{i}" for i in range(count)]
+
+@pytest.mark.parametrize('storage', ['float32', 'float16', 'int8'])
+def test_hits_misses_and_reopen(tmp_path, storage):
+    cache = EmbeddingCache(str(tmp_path), 'model', DIM, storage=storage)
+    texts = _texts(5)
+    assert cache.get_many(texts) == [None] * 5
+    cache.put_many(texts, _embeddings(texts))
+
+    atol = 1e-6 if storage == 'float32' else 0.05
+    found = cache.get_many(texts[:3] + ['unknown'])
+    assert found[3] is None
+    assert np.allclose(np.stack(found[:3]), _embeddings(texts[:3]), atol=atol)
+    assert cache.stats()['hits'] == 3 and cache.stats()['misses'] == 6
+    cache.flush()
+
+    reopened = EmbeddingCache(str(tmp_path), 'model', DIM, storage=storage)
+    assert np.allclose(np.stack(reopened.get_many(texts)), _embeddings(texts), atol=atol)
+
+def test_model_change_discards_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model', DIM)
+    cache.put_many(['a'], _embeddings(['a']))
+    cache.flush()
+    assert EmbeddingCache(str(tmp_path), 'model', DIM, storage='float16').get_many(['a']) == [None]
+
+def test_partial_trailing_row_is_truncated(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model', DIM)
+    texts = _texts(3)
+    cache.put_many(texts, _embeddings(texts))
+    with open(cache._vectors_path, 'ab') as f:
+        f.write(b'\x01\x02\x03')  # append ที่ crash กลางแถว
+
+    reopened = EmbeddingCache(str(tmp_path), 'model', DIM)
+    reopened.put_many(['new'], _embeddings(['new']))
+    reopened.flush()
+
+    final = EmbeddingCache(str(tmp_path), 'model', DIM)
+    assert final._vectors_path.stat().st_size == 4 * final.codec.row_bytes
+    assert np.allclose(np.stack(final.get_many(texts + ['new'])), _embeddings(texts + ['new']))
+
+def test_compaction_keeps_recent_entries(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model', DIM, max_entries=10)
+    texts = _texts(1100)
+    for i in range(0, len(texts), 100):
+        cache.put_many(texts[i:i + 100], _embeddings(texts[i:i + 100]))
+    assert cache._generation > 0
+    assert cache._num_slots < 1100
+    recent = texts[-10:]
+    assert np.allclose(np.stack(cache.get_many(recent)), _embeddings(recent))
+    assert cache.get_many(texts[:1]) == [None]
+    cache.flush()
+
+    reopened = EmbeddingCache(str(tmp_path), 'model', DIM, max_entries=10)
+    assert np.allclose(np.stack(reopened.get_many(recent)), _embeddings(recent))
+    assert sorted(path.name for path in tmp_path.joinpath('model').glob('vectors.*')) == \
+        [reopened._vectors_path.name]
+
+def test_crash_during_compaction_keeps_old_index_consistent(tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path), 'model', DIM, max_entries=10)
+    texts = _texts(1000)
+    cache.put_many(texts, _embeddings(texts))
+    cache.flush()
+
+    def crash(*args, **kwargs):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(cache, '_write_index', crash)
+    more = _texts(200, prefix='m')
+    with pytest.raises(KeyboardInterrupt):
+        cache.put_many(more, _embeddings(more))
+    monkeypatch.undo()
+
+    # ไฟล์ vectors ของ generation ใหม่ถูกเขียนแล้ว แต่ index ยังเป็นของเดิม
+    reopened = EmbeddingCache(str(tmp_path), 'model', DIM, max_entries=10_000)
+    assert reopened._generation == 0
+    kept = texts[-10:] + more
+    found = reopened.get_many(kept)
+    assert all(vector is not None for vector in found)
+    assert np.allclose(np.stack(found), _embeddings(kept))
+    assert [path.name for path in tmp_path.joinpath('model').glob('vectors.*')] == ['vectors.f32']
+
+def test_index_pointing_at_missing_generation_is_rejected(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model', DIM, max_entries=10)
+    texts = _texts(1100)
+    cache.put_many(texts, _embeddings(texts))
+    cache.flush()
+    cache._vectors_path.unlink()
+
+    reopened = EmbeddingCache(str(tmp_path), 'model', DIM)
+    assert reopened.get_many(texts[-3:]) == [None] * 3
+    reopened.put_many(['a'], _embeddings(['a']))
+    reopened.flush()
+    assert np.allclose(EmbeddingCache(str(tmp_path), 'model', DIM).get_many(['a'])[0], _embeddings(['a'])[0])
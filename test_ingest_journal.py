@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+
+import pytest
+
+from fake_index import FakeIndex
+from ingest_journal import open_journal
+
+class CrashingIndex(FakeIndex):
+    """index ที่ล่ม (error ที่ retry ไม่ได้) เมื่อ upsert ครบ crash_after ครั้ง"""
+
+    crash_after = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sent_ids = []
+
+    def upsert(self, vectors, **kwargs):
+        if self.crash_after is not None and self.upsert_calls >= self.crash_after:
+            raise RuntimeError("simulated crash")
+        self.sent_ids.extend(vector[0] for vector in vectors)
+        return super().upsert(vectors, **kwargs)
+
+@pytest.fixture
+def crashing_index():
+    return CrashingIndex(latency=0, jitter=0)
+
+@pytest.fixture
+def counting_embedder(embedder):
+    """นับจำนวน texts ที่ถูก encode (resume ต้องไม่ encode windows ที่ spill ไว้แล้วซ้ำ)"""
+    embedder.encoded = 0
+    encode_packed = embedder.encode_packed
+
+    def counted(texts, *args, **kwargs):
+        embedder.encoded += len(texts)
+        return encode_packed(texts, *args, **kwargs)
+
+    embedder.encode_packed = counted
+    return embedder
+
+def _upserter(make_upserter, index, embedder, **kwargs):
+    upserter = make_upserter(index=index, embedder=embedder, upsert_workers=1, **kwargs)
+    upserter.window_size = 5
+    upserter.upsert_batch_size = 3
+    return upserter
+
+def test_resume_after_crash(index_name, make_fake_index, crashing_index, counting_embedder, make_upserter,
+                            documents):
+    docs = documents(40, sentences=12)
+    reference = make_upserter(index=make_fake_index())
+    expected_ids = {vector_id for document in docs for vector_id, _, _ in reference.prepare_vectors(document)}
+
+    upserter = _upserter(make_upserter, crashing_index, counting_embedder, lexical=True)
+    crashing_index.crash_after = 20
+    with pytest.raises(RuntimeError):
+        upserter.upsert_stream(docs, journal=open_journal(index_name, 'docs.jsonl'))
+    acked_before_crash = set(crashing_index._vectors)
+    assert 0 < len(acked_before_crash) < len(expected_ids)
+
+    # process ใหม่: upserter และ journal ใหม่บน index เดิม
+    crashing_index.crash_after = None
+    crashing_index.sent_ids = []
+    counting_embedder.encoded = 0
+    upserter = _upserter(make_upserter, crashing_index, counting_embedder, lexical=True)
+    journal = open_journal(index_name, 'docs.jsonl')
+    stats = {}
+    finish = journal.finish
+    journal.finish = lambda: (stats.update(journal.stats()), finish())
+    result = upserter.upsert_stream(docs, journal=journal)
+
+    assert set(crashing_index._vectors) == expected_ids
+    # windows ที่เสร็จแล้วถูกข้าม และ window ที่ spill ไว้ถูกโหลดกลับโดยไม่ encode ใหม่
+    assert stats['skipped_windows'] > 0 and stats['resumed_windows'] > 0
+    assert result['documents'] + stats['skipped_windows'] * upserter.window_size == len(docs)
+    assert counting_embedder.encoded < len(expected_ids) - len(acked_before_crash)
+    # batch ที่ index ตอบรับแล้วไม่ถูกส่งซ้ำ
+    assert not acked_before_crash & set(crashing_index.sent_ids)
+    assert not os.path.exists(journal.path)
+    # BM25 index ที่บันทึกตอน crash + ส่วนที่ resume ตรงกับ index
+    lexical_ids = {vector_id for vector_id, _ in upserter.lexical_index.search('document', top_k=10000)}
+    assert lexical_ids == expected_ids
+
+def test_changed_window_is_not_skipped(index_name, fake_index, embedder, make_upserter, documents):
+    docs = documents(10)
+    upserter = _upserter(make_upserter, fake_index, embedder)
+    journal = open_journal(index_name, 'docs.jsonl')
+    journal.begin(upserter.ingest_config())
+    windows = list(upserter._windows(docs))
+    assert journal.window_key(windows[0]) == journal.window_key(list(windows[0]))
+
+    changed = [dict(document) for document in windows[0]]
+    changed[0]['content'] += ' Edited.'
+    assert journal.window_key(changed) != journal.window_key(windows[0])
+
+def test_concurrent_acks_mark_window_done_once(index_name, monkeypatch):
+    journal = open_journal(index_name, 'acks.jsonl')
+    journal.begin('config')
+    window = [{'id': 'a', 'title': 'a', 'content': 'alpha'}]
+    vectors = [(f"a_{i}", [float(i)] * 4, {'chunk_index': i}) for i in range(8)]
+    key = journal.spill(window, ['a'], [8], vectors, batch_size=2)
+
+    remove = os.remove
+
+    def slow_remove(path):
+        # ขยายช่วงระหว่างตรวจกับลบไฟล์ spill ให้ threads ที่ ack batch สุดท้ายพร้อมกันชนกันได้
+        time.sleep(0.01)
+        remove(path)
+    monkeypatch.setattr(os, 'remove', slow_remove)
+
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def ack_all(offset):
+        barrier.wait()
+        try:
+            for batch_no in range(4):
+                journal.ack(key, (batch_no + offset) % 4)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=ack_all, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert journal.state(key) == 'done'
+    assert not any(os.path.exists(path) for path in journal._spill_paths(key))
+    journal._mark_done(key)  # ทำซ้ำหลัง done แล้วไม่ error
+    assert journal.stats()['windows_done'] == 1
@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+import random
+
+import pytest
+
+from data_importer import FileDataImporter
+from json_stream import iter_json_documents
+
+def _random_value(rng, depth=0):
+    kind = rng.choice(['int', 'float', 'exp', 'str', 'literal'] + (['list', 'dict'] if depth < 3 else []))
+    if kind == 'int':
+        return rng.randint(-10 ** 6, 10 ** 6)
+    if kind == 'float':
+        return round(rng.uniform(-1000, 1000), rng.randint(1, 6))
+    if kind == 'exp':
+        return rng.uniform(-1, 1) * 10 ** rng.randint(-30, 30)
+    if kind == 'str':
+        return ''.join(rng.choice('ab "\\/,:[]{}\nก๑€') for _ in range(rng.randint(0, 8)))
+    if kind == 'literal':
+        return rng.choice([True, False, None])
+    if kind == 'list':
+        return [_random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {f"k{i}": _random_value(rng, depth + 1) for i in range(rng.randint(0, 4))}
+
+def _dumps(rng, value):
+    if rng.random() < 0.5:
+        return json.dumps(value, ensure_ascii=rng.random() < 0.5)
+    return json.dumps(value, indent=rng.choice([None, 1, 2]), separators=rng.choice([(',', ':'), (' , ', ' : ')]))
+
+def _stream(text, buffer_size):
+    return list(iter_json_documents(io.StringIO(text), buffer_size=buffer_size))
+
+@pytest.mark.parametrize('text, expected', [
+    ('{"m": 1.5, "documents": [1]}', [1]),
+    ('[1.5, 2]', [1.5, 2]),
+    ('[-0.25e-3,1E+2, 12345678901234567890]', [-0.25e-3, 1e2, 12345678901234567890]),
+    ('{"n": 2.5e3, "title": "x"}', [{'n': 2500.0, 'title': 'x'}]),
+    ('[true,false,null]', [True, False, None]),
+])
+def test_numbers_split_across_reads(text, expected):
+    for buffer_size in (1, 2, 3):
+        assert _stream(text, buffer_size) == expected
+
+@pytest.mark.parametrize('buffer_size', [1, 2, 3, 5, 8, 64])
+def test_matches_json_loads(buffer_size):
+    rng = random.Random(buffer_size)
+    for _ in range(200):
+        shape = rng.choice(['list', 'documents', 'object'])
+        documents = [_random_value(rng) for _ in range(rng.randint(0, 5))]
+        if shape == 'list':
+            value = documents
+        elif shape == 'documents':
+            value = {'meta': _random_value(rng), 'documents': documents, 'after': 1}
+        else:
+            value = {f"f{i}": _random_value(rng) for i in range(rng.randint(0, 5))}
+        text = _dumps(rng, value)
+
+        loaded = json.loads(text)
+        expected = loaded if shape == 'list' else loaded['documents'] if shape == 'documents' else [loaded]
+        assert _stream(text, buffer_size) == expected, text
+
+def test_rejects_scalars_and_truncated_input():
+    with pytest.raises(ValueError):
+        _stream('1.5', 4)
+    with pytest.raises(json.JSONDecodeError):
+        _stream('[1, {"a": ', 2)
+
+def test_reads_documents_incrementally(tmp_path):
+    path = tmp_path / 'docs.json'
+    docs = [{'title': f"t{i}", 'content': 'x' * 100, 'score': i + 0.5} for i in range(1000)]
+    path.write_text(json.dumps({'documents': docs}), encoding='utf-8')
+
+    class CountingFile(io.StringIO):
+        read_chars = 0
+
+        def read(self, size=-1):
+            data = super().read(size)
+            self.read_chars += len(data)
+            return data
+
+    f = CountingFile(path.read_text(encoding='utf-8'))
+    stream = iter_json_documents(f, buffer_size=256)
+    assert next(stream) == docs[0]
+    assert f.read_chars < 1024
+    assert list(stream) == docs[1:]
+
+@pytest.fixture
+def importer(make_upserter):
+    return FileDataImporter(upserter=make_upserter())
+
+def test_json_import_fills_defaults(importer, tmp_path):
+    path = tmp_path / 'docs.json'
+    path.write_text(json.dumps([{'title': 'a', 'content': 'alpha 1.5'}, {'id': 'given', 'title': 'b', 'content': 'beta'}]),
+                    encoding='utf-8')
+    docs = list(importer.iter_json_documents(str(path)))
+    assert [doc['id'] for doc in docs] == ['json_0', 'given']
+    assert all('created_at' in doc for doc in docs)
+    assert importer.import_from_json(str(path)) == 2
+
+def test_jsonl_import_skips_blank_lines(importer, tmp_path):
+    path = tmp_path / 'docs.jsonl'
+    path.write_text('{"title": "a", "content": "alpha"}\n\n{"id": "b", "title": "b", "content": "beta"}\n', encoding='utf-8')
+    assert [doc['id'] for doc in importer.iter_jsonl_documents(str(path))] == ['jsonl_0', 'b']
+    assert importer.import_from_jsonl(str(path)) == 2
+
+def test_csv_import_reads_in_chunks(importer, tmp_path, fake_index):
+    pytest.importorskip('pandas')
+    path = tmp_path / 'docs.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['title', 'content', 'type'])
+        for i in range(5):
+            writer.writerow([f"row {i}", f"Row {i} content about item {i * 13}.", 'faq'])
+
+    docs = list(importer.iter_csv_documents(str(path), chunksize=2))
+    assert [doc['id'] for doc in docs] == [f"csv_{i}" for i in range(5)]
+    assert docs[3]['title'] == 'row 3' and docs[3]['type'] == 'faq'
+    assert importer.import_from_csv(str(path), chunksize=2) == 5
+    assert len(fake_index._vectors) == 5
+
+def test_folder_import_filters_types(importer, tmp_path):
+    folder = tmp_path / 'docs'
+    (folder / 'nested').mkdir(parents=True)
+    (folder / 'first_note.txt').write_text('first note content', encoding='utf-8')
+    (folder / 'nested' / 'second-note.md').write_text('second note content', encoding='utf-8')
+    (folder / 'ignored.csv').write_text('a,b', encoding='utf-8')
+
+    docs = {doc['id']: doc for doc in importer.iter_folder_documents(str(folder))}
+    assert set(docs) == {'folder_first_note', 'folder_second-note'}
+    assert docs['folder_first_note']['title'] == 'first note'
+    assert importer.import_from_folder(str(folder)) == 2
@@ -0,0 +1,160 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from local_index import LocalIndex
+
+DIM = 32
+
+def _data(count, seed=0, clusters=None):
+    rng = np.random.default_rng(seed)
+    if clusters is None:
+        return rng.normal(size=(count, DIM)).astype(np.float32)
+    centers = rng.normal(size=(clusters, DIM))
+    return (centers[rng.integers(0, clusters, count)] + rng.normal(scale=0.3, size=(count, DIM))).astype(np.float32)
+
+def _vectors(data, offset=0):
+    return [(f"v{offset + i}", data[i], {'group': (offset + i) % 5, 'rank': offset + i, 'title': f"t{offset + i}"})
+            for i in range(len(data))]
+
+def _brute_force(data, ids, query, top_k, metric='cosine', keep=None):
+    scores = data @ query
+    if metric == 'cosine':
+        scores = scores / np.linalg.norm(data, axis=1) / np.linalg.norm(query)
+    order = [i for i in np.argsort(-scores, kind='stable') if keep is None or keep(i)]
+    return [ids[i] for i in order[:top_k]], scores
+
+def _ids(result):
+    return [match['id'] for match in result['matches']]
+
+@pytest.mark.parametrize('metric', ['cosine', 'dotproduct'])
+def test_exact_matches_brute_force(metric):
+    data = _data(3000)
+    index = LocalIndex(metric=metric)
+    for start in range(0, len(data), 1000):
+        index.upsert(_vectors(data[start:start + 1000], start))
+    ids = [f"v{i}" for i in range(len(data))]
+
+    for query in _data(10, seed=1):
+        expected, scores = _brute_force(data, ids, query, 10, metric)
+        result = index.query(vector=query, top_k=10, include_metadata=True)
+        assert _ids(result) == expected
+        assert np.allclose([match['score'] for match in result['matches']],
+                           [scores[int(vector_id[1:])] for vector_id in expected], atol=1e-4)
+        assert result['matches'][0]['metadata']['title'] == expected[0].replace('v', 't')
+
+        # filter ทั้งแบบเลือกน้อย (pre-filter) และเลือกมาก
+        for filter_dict, keep in (({'group': 3}, lambda i: i % 5 == 3),
+                                  ({'rank': {'$gte': 100}}, lambda i: i >= 100)):
+            expected, _ = _brute_force(data, ids, query, 10, metric, keep)
+            assert _ids(index.query(vector=query, top_k=10, filter=filter_dict)) == expected
+
+@pytest.mark.parametrize('storage', ['float16', 'int8'])
+def test_quantized_storage_keeps_ranking(storage):
+    data = _data(2000, clusters=20)
+    exact, quantized = LocalIndex(), LocalIndex(storage=storage)
+    exact.upsert(_vectors(data))
+    quantized.upsert(_vectors(data))
+    recall = np.mean([len(set(_ids(exact.query(vector=q, top_k=10))) & set(_ids(quantized.query(vector=q, top_k=10))))
+                      / 10 for q in _data(20, seed=2)])
+    assert recall >= 0.9
+
+def test_ivf_recall_against_exact():
+    data = _data(20000, clusters=200)
+    exact = LocalIndex()
+    ivf = LocalIndex(ann='ivf', nprobe=8, ann_min_vectors=1000)
+    exact.upsert(_vectors(data))
+    ivf.upsert(_vectors(data))
+
+    queries = data[np.random.default_rng(3).choice(len(data), 50, replace=False)] + \
+        np.random.default_rng(4).normal(scale=0.1, size=(50, DIM)).astype(np.float32)
+    recall = np.mean([len(set(_ids(exact.query(vector=q, top_k=10))) & set(_ids(ivf.query(vector=q, top_k=10)))) / 10
+                      for q in queries])
+    assert ivf._centroids is not None
+    assert recall >= 0.9
+    # filter ที่เลือกน้อยจนหาไม่ครบใน nprobe กลุ่มกลับไปค้นแบบ exact
+    rare = {'rank': {'$in': [5, 17, 19999]}}
+    assert sorted(_ids(ivf.query(vector=queries[0], top_k=3, filter=rare))) == ['v17', 'v19999', 'v5']
+
+def test_delete_and_compact():
+    data = _data(5000)
+    index = LocalIndex()
+    index.upsert(_vectors(data))
+    index.delete(ids=[f"v{i}" for i in range(0, 3000)])
+    index.delete(filter={'group': 0})
+    assert index._size < 5000  # ลบเกินครึ่ง จึง compact แล้ว
+
+    alive = [i for i in range(3000, 5000) if i % 5 != 0]
+    assert index.describe_index_stats()['total_vector_count'] == len(alive)
+    ids = [f"v{i}" for i in range(len(data))]
+    for query in _data(5, seed=5):
+        expected, _ = _brute_force(data, ids, query, 10, keep=lambda i: i >= 3000 and i % 5 != 0)
+        assert _ids(index.query(vector=query, top_k=10)) == expected
+        assert _ids(index.query(vector=query, top_k=10, filter={'group': 2})) == \
+            _brute_force(data, ids, query, 10, keep=lambda i: i >= 3000 and i % 5 == 2)[0]
+    assert index.fetch(['v10', 'v3001'])['vectors'].keys() == {'v3001'}
+
+    # upsert ทับ id เดิมอัปเดตทั้ง vector และ metadata ใน inverted index
+    index.upsert([('v3001', data[0], {'group': 9})])
+    assert _ids(index.query(vector=data[0], top_k=1, filter={'group': 9})) == ['v3001']
+    assert index.query(vector=data[0], top_k=5, filter={'group': 1})['matches'][0]['id'] != 'v3001'
+
+    index.delete(delete_all=True)
+    assert index.describe_index_stats()['total_vector_count'] == 0
+
+@pytest.mark.parametrize('ann', [None, 'ivf'])
+def test_save_and_load_round_trip(tmp_path, ann):
+    path = str(tmp_path / 'index')
+    data = _data(3000, clusters=30)
+    index = LocalIndex(path, ann=ann, ann_min_vectors=1000)
+    index.upsert(_vectors(data))
+    index.delete(ids=['v1', 'v2'])
+    queries = _data(5, seed=6)
+    before = [index.query(vector=q, top_k=5, include_metadata=True, filter={'group': {'$ne': 4}}) for q in queries]
+    index.save()
+
+    with open(os.path.join(path, 'index.json'), encoding='utf-8') as f:
+        header = json.load(f)
+    assert 'ids' not in header and 'metadata' not in header
+    assert os.path.getsize(os.path.join(path, 'index.json')) < 1024
+
+    loaded = LocalIndex(path, ann=ann, ann_min_vectors=1000)
+    assert loaded.describe_index_stats()['total_vector_count'] == 2998
+    assert [loaded.query(vector=q, top_k=5, include_metadata=True, filter={'group': {'$ne': 4}})
+            for q in queries] == before
+    assert loaded.fetch(['v1'])['vectors'] == {}
+    assert loaded.fetch(['v7'])['vectors']['v7']['metadata'] == {'group': 2, 'rank': 7, 'title': 't7'}
+
+    # เขียนต่อหลังโหลด (แถวที่โหลดมาถูกแก้ไข ลบ และเพิ่มแถวใหม่) แล้วบันทึกซ้ำ
+    loaded.upsert([('v7', data[7], {'group': 7}), ('new', data[8], {'group': 8})])
+    loaded.delete(filter={'group': 3})
+    loaded.save()
+    reloaded = LocalIndex(path, ann=ann, ann_min_vectors=1000)
+    assert reloaded.fetch(['v7', 'new', 'v3'])['vectors'].keys() == {'v7', 'new'}
+    assert reloaded.fetch(['v7'])['vectors']['v7']['metadata'] == {'group': 7}
+    assert reloaded.describe_index_stats()['total_vector_count'] == 2998 - 600 + 1
+
+def test_loads_index_saved_with_ids_in_header(tmp_path):
+    path = str(tmp_path / 'index')
+    data = _data(10)
+    index = LocalIndex(path)
+    index.upsert(_vectors(data))
+    index.save()
+
+    # รูปแบบเดิม: ids และ metadata อยู่ใน index.json
+    header_path = os.path.join(path, 'index.json')
+    with open(header_path, encoding='utf-8') as f:
+        header = json.load(f)
+    header['ids'] = [f"v{i}" for i in range(10)]
+    header['metadata'] = [{'rank': i} for i in range(10)]
+    with open(header_path, 'w', encoding='utf-8') as f:
+        json.dump(header, f)
+    for name in ('ids.npy', 'metadata.jsonl', 'metadata_offsets.npy'):
+        os.remove(os.path.join(path, name))
+
+    loaded = LocalIndex(path)
+    assert _ids(loaded.query(vector=data[4], top_k=1)) == ['v4']
+    assert loaded.query(vector=data[4], top_k=1, filter={'rank': 4}, include_metadata=True)['matches'][0]['metadata'] \
+        == {'rank': 4}
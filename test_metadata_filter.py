@@ -0,0 +1,77 @@
+import random
+
+import numpy as np
+import pytest
+
+from metadata_filter import MetadataIndex, filter_fields, match_metadata, required_values
+
+FIELDS = {
+    'document_type': ['faq', 'manual', 'blog'],
+    'title': ['a', 'b', 'c', 'd'],
+    'chunk_index': [0, 1, 2, 3.0, 10],
+    'score': [0.5, 1, 2.5, -1],
+    'tags': [['x'], ['x', 'y'], [], ['z']],
+    'flag': [True, False, 0, 1],
+}
+
+def _random_metadata(rng):
+    return {field: rng.choice(values) for field, values in FIELDS.items() if rng.random() < 0.8}
+
+def _random_condition(rng):
+    field = rng.choice(list(FIELDS) + ['missing'])
+    values = [v for value in FIELDS.get(field, ['q']) for v in (value if isinstance(value, list) else [value])] \
+        or ['x']
+    op = rng.choice(['eq', '$eq', '$ne', '$in', '$nin', '$gt', '$gte', '$lt', '$lte', '$exists'])
+    if op == 'eq':
+        return {field: rng.choice(values)}
+    if op in ('$in', '$nin'):
+        return {field: {op: rng.sample(values, min(len(values), rng.randint(1, 3)))}}
+    if op == '$exists':
+        return {field: {op: rng.random() < 0.5}}
+    if op.startswith(('$gt', '$lt')):
+        return {field: {op: rng.choice([-1, 0, 1, 2.5, 5])}}
+    return {field: {op: rng.choice(values)}}
+
+def _random_filter(rng, depth=0):
+    if depth < 2 and rng.random() < 0.3:
+        return {rng.choice(['$and', '$or']): [_random_filter(rng, depth + 1) for _ in range(rng.randint(1, 3))]}
+    condition = _random_condition(rng)
+    if rng.random() < 0.3:
+        condition.update(_random_condition(rng))
+    return condition
+
+@pytest.mark.parametrize('seed', range(5))
+def test_index_matches_match_metadata(seed):
+    rng = random.Random(seed)
+    rows = [_random_metadata(rng) for _ in range(300)]
+    index = MetadataIndex()
+    for row, metadata in enumerate(rows):
+        index.add(row, metadata)
+    # แก้ไขบางแถวหลังสร้าง index แล้ว (remove ค่าเดิมแล้ว add ค่าใหม่)
+    for row in rng.sample(range(len(rows)), 50):
+        index.remove(row, rows[row])
+        rows[row] = _random_metadata(rng)
+        index.add(row, rows[row])
+
+    for _ in range(300):
+        filter_dict = _random_filter(rng)
+        expected = np.array([match_metadata(metadata, filter_dict) for metadata in rows])
+        assert np.array_equal(index.mask(filter_dict, len(rows)), expected), filter_dict
+
+def test_numbers_and_bools_do_not_collide():
+    index = MetadataIndex()
+    rows = [{'flag': True}, {'flag': 1}, {'flag': 1.0}, {'flag': False}, {'flag': 0}]
+    for row, metadata in enumerate(rows):
+        index.add(row, metadata)
+    assert index.mask({'flag': 1}, 5).tolist() == [False, True, True, False, False]
+    assert index.mask({'flag': True}, 5).tolist() == [True, False, False, False, False]
+    assert index.mask({'flag': {'$gte': 1}}, 5).tolist() == [False, True, True, False, False]
+
+def test_filter_helpers():
+    filter_dict = {'$and': [{'doc_id': {'$in': ['a', 'b']}}, {'$or': [{'title': 'x'}, {'chunk_index': {'$gt': 1}}]}]}
+    assert filter_fields(filter_dict) == {'doc_id', 'title', 'chunk_index'}
+    assert required_values(filter_dict, 'doc_id') == ['a', 'b']
+    assert required_values(filter_dict, 'title') is None
+    assert required_values({'doc_id': 'a'}, 'doc_id') == ['a']
+    with pytest.raises(ValueError):
+        match_metadata({'a': 1}, {'a': {'$regex': '.*'}})
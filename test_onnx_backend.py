@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('onnx')
+pytest.importorskip('onnxruntime')
+pytest.importorskip('sentence_transformers')
+
+from onnx_backend import _MIN_COSINE, OnnxEncoder, compare_embeddings
+
+TEXTS = [
+    'python machine learning',
+    'the quick brown fox and the lazy dog',
+    'ภาษาไทย เขียนติดกัน',
+    'a' * 200,
+]
+
+@pytest.fixture(scope='module')
+def tiny_model(tmp_path_factory):
+    """SentenceTransformer ขนาดเล็ก (BERT 2 ชั้น hidden 32) สร้างจาก config ไม่ต้องดาวน์โหลด"""
+    import string
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    path = tmp_path_factory.mktemp('tiny')
+    chars = list(string.ascii_lowercase + string.digits + string.punctuation) + \
+        [chr(code) for code in range(0x0E01, 0x0E5B)]
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + chars + ['##' + char for char in chars] + \
+        ['python', 'machine', 'learning', 'the', 'and']
+    (path / 'vocab.txt').write_text('\n'.join(vocab), encoding='utf-8')
+
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=128)
+    BertModel(config).save_pretrained(path / 'hf')
+    BertTokenizerFast(str(path / 'vocab.txt'), do_lower_case=True).save_pretrained(path / 'hf')
+
+    transformer = models.Transformer(str(path / 'hf'), max_seq_length=64)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension(), 'mean')
+    return SentenceTransformer(modules=[transformer, pooling, models.Normalize()], device='cpu')
+
+@pytest.mark.parametrize('quantize', [False, True], ids=['onnx', 'onnx-int8'])
+def test_onnx_matches_torch(tiny_model, tmp_path, quantize):
+    encoder = OnnxEncoder(tiny_model, 'tiny', quantize=quantize, cache_dir=str(tmp_path))
+    reference = tiny_model.encode(TEXTS, convert_to_tensor=False, show_progress_bar=False)
+    embeddings = encoder.encode(TEXTS)
+
+    assert embeddings.shape == reference.shape
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-4)
+    assert compare_embeddings(reference, embeddings)['min_cosine'] >= _MIN_COSINE[encoder.backend]
+    assert (tmp_path / 'tiny' / f"{'model_int8' if quantize else 'model'}.check.json").exists()
+
+def test_batches_match_single_texts(tiny_model, tmp_path):
+    encoder = OnnxEncoder(tiny_model, 'tiny', cache_dir=str(tmp_path))
+    batched = encoder.encode(TEXTS, batch_size=2)
+    single = np.stack([encoder.encode([text])[0] for text in TEXTS])
+    assert np.allclose(batched, single, atol=1e-5)
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+import reranker as reranker_module
+from reranker import CosineReranker, Reranker
+from vector_search import VectorSearcher
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class StepReranker(Reranker):
+    """ให้คะแนน = ค่า 'value' ของ candidate และทุก batch ใช้เวลา step_ms ตามนาฬิกาจำลอง"""
+
+    def __init__(self, clock, step_ms=10.0, batch_size=2):
+        super().__init__(batch_size)
+        self.clock = clock
+        self.step_ms = step_ms
+        self.batches = []
+
+    def score(self, query, query_vector, candidates):
+        self.batches.append([candidate['id'] for candidate in candidates])
+        self.clock.now += self.step_ms / 1000
+        return [candidate['value'] for candidate in candidates]
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(reranker_module.time, 'perf_counter', clock)
+    return clock
+
+def _candidates(values):
+    return [{'id': f"c{i}", 'score': 1.0 - i / 100, 'value': value} for i, value in enumerate(values)]
+
+def test_unbudgeted_rerank_scores_everything(clock):
+    reranker = StepReranker(clock)
+    outcome = reranker.rerank('q', None, _candidates([1, 5, 3, 5, 0]), top_k=4)
+    assert [result['id'] for result in outcome['results']] == ['c1', 'c3', 'c2', 'c0']
+    assert [result['rerank_score'] for result in outcome['results']] == [5, 5, 3, 1]
+    assert (outcome['scored'], outcome['truncated']) == (5, False)
+    assert len(reranker.batches) == 3
+
+def test_budget_keeps_unscored_candidates_in_index_order(clock):
+    reranker = StepReranker(clock, step_ms=10)
+    candidates = _candidates([1, 2, 3, 4, 9, 8, 7, 6, 10, 10])
+    outcome = reranker.rerank('q', None, candidates, top_k=10, budget_ms=25)
+
+    # ทุก batch ใช้ 10 ms: หลัง batch ที่ 3 (30 ms) เกิน budget จึงหยุด
+    assert reranker.batches == [['c0', 'c1'], ['c2', 'c3'], ['c4', 'c5']]
+    assert (outcome['scored'], outcome['truncated']) == (6, True)
+    # ตัวที่ได้คะแนนเรียงตามคะแนนใหม่ ตามด้วยตัวที่ไม่ทันได้คะแนนในลำดับเดิมจาก index
+    assert [result['id'] for result in outcome['results']] == \
+        ['c4', 'c5', 'c3', 'c2', 'c1', 'c0', 'c6', 'c7', 'c8', 'c9']
+    assert [result['rerank_score'] for result in outcome['results'][5:]] == [1, None, None, None, None]
+    assert outcome['results'][0]['score'] == candidates[4]['score']
+    assert 'rerank_score' not in candidates[4]
+
+def test_zero_budget_scores_first_batch_only(clock):
+    reranker = StepReranker(clock)
+    outcome = reranker.rerank('q', None, _candidates([0, 1, 9, 9]), top_k=3, budget_ms=0)
+    assert outcome['scored'] == 2
+    assert [result['id'] for result in outcome['results']] == ['c1', 'c0', 'c2']
+
+def test_cosine_reranker_uses_cache_then_fetch():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(6, 8)).astype(np.float32)
+    query = vectors[4] + rng.normal(scale=0.01, size=8).astype(np.float32)
+
+    class Cache:
+        def get_many(self, texts):
+            return [vectors[int(text[-1])] if text.endswith(('0', '1', '2')) else None for text in texts]
+
+    class Embedder:
+        cache = Cache()
+
+    fetched = []
+
+    def fetch(ids):
+        fetched.append(ids)
+        return {'vectors': {vector_id: {'values': vectors[int(vector_id[1:])].tolist()}
+                            for vector_id in ids if vector_id != 'c5'}}
+
+    candidates = [{'id': f"c{i}", 'score': -5.0, 'content': f"text {i}"} for i in range(6)]
+    outcome = CosineReranker(Embedder(), fetch=fetch).rerank('q', query, candidates, top_k=6)
+    assert fetched == [['c3', 'c4', 'c5']]
+    assert outcome['results'][0]['id'] == 'c4'
+    # ไม่มี vector ทั้งใน cache และ index: ใช้คะแนนเดิมจาก index
+    assert outcome['results'][-1]['id'] == 'c5' and outcome['results'][-1]['rerank_score'] == -5.0
+    expected = vectors[0] @ query / np.linalg.norm(vectors[0]) / np.linalg.norm(query)
+    assert next(r for r in outcome['results'] if r['id'] == 'c0')['rerank_score'] == pytest.approx(expected, rel=1e-5)
+
+def test_searcher_counts_truncated_reranks(index_name, fake_index, embedder, make_upserter, documents):
+    make_upserter().upsert_documents(documents(3))
+    searcher = VectorSearcher(index_name, index=fake_index, embedder=embedder, reranker='cosine',
+                              rerank_candidates=12, rerank_budget_ms=0)
+    searcher.reranker.batch_size = 4
+    results = searcher.search("Document d2 sentence 5 mentions item 97.", top_k=5)
+
+    assert len(results) == 5
+    assert searcher.rerank_truncated == 1
+    assert all(result['rerank_score'] is not None for result in results[:4])
+    assert searcher.latency['rerank'].summary()['count'] == 1
@@ -0,0 +1,80 @@
+from result_cache import SQLiteResultBackend, open_result_cache
+from vector_search import VectorSearcher
+
+def test_each_caller_gets_its_own_settings(index_name, tmp_path):
+    small = open_result_cache(index_name, max_entries=5, ttl=10)
+    default = open_result_cache(index_name)
+    assert small.backend is not default.backend
+    assert small.backend is open_result_cache(index_name, max_entries=5, ttl=10).backend
+
+    path = str(tmp_path / 'results.db')
+    assert open_result_cache(index_name, path=path, max_entries=7).backend.max_entries == 7
+    assert open_result_cache(index_name, path=path, max_entries=9, ttl=None).backend.ttl is None
+
+def test_invalidation_reaches_caches_with_other_settings(index_name, tmp_path):
+    searcher_cache = open_result_cache(index_name, path=str(tmp_path / 'results.db'), max_entries=50)
+    upserter_cache = open_result_cache(index_name)
+    before = searcher_cache.generation()
+    upserter_cache.invalidate()
+    assert searcher_cache.generation() != before
+
+def test_search_sees_documents_upserted_after_caching(index_name, fake_index, embedder, make_upserter,
+                                                      documents, tmp_path):
+    searcher = VectorSearcher(index_name, index=fake_index, embedder=embedder,
+                              result_cache_path=str(tmp_path / 'results.db'), result_cache_size=100)
+    upserter = make_upserter()
+    upserter.upsert_documents(documents(2, prefix='a'))
+
+    query = "Document b0 sentence 3 mentions item 21."
+    first = searcher.search(query, top_k=3)
+    assert searcher.search(query, top_k=3) == first
+    assert searcher.result_cache.stats()['hits'] == 1
+
+    upserter.upsert_documents(documents(1, prefix='b'))
+    assert searcher.search(query, top_k=3)[0]['id'].startswith('b0_')
+
+    upserter.delete_by_filter({'title': 'b title 0'})
+    assert not any(hit['id'].startswith('b0_') for hit in searcher.search(query, top_k=3))
+
+def test_generation_is_bumped_per_acked_batch(make_upserter, documents):
+    upserter = make_upserter()
+    upserter.upsert_batch_size = 2
+    before = upserter.result_cache.generation()
+
+    bumps = []
+    invalidate = upserter.result_cache.invalidate
+    upserter.result_cache.invalidate = lambda: bumps.append(invalidate())
+    chunks = upserter.upsert_stream(documents(3))['chunks']
+
+    assert before != upserter.result_cache.generation()
+    assert len(bumps) == -(-chunks // 2) == upserter.writer.summary()['batches']
+
+def test_upserter_bumps_explicit_shared_file(index_name, make_upserter, documents, tmp_path):
+    path = str(tmp_path / 'shared.db')
+    upserter = make_upserter(result_cache_path=path)
+    upserter.upsert_documents(documents(1))
+    # backend ใหม่บนไฟล์เดียวกัน = searcher ใน process อื่น
+    assert SQLiteResultBackend(path).generation(index_name) > 0
+
+def test_cache_defaults_on_only_with_shared_file(index_name, fake_index, embedder, tmp_path, monkeypatch):
+    assert VectorSearcher(index_name, index=fake_index, embedder=embedder).result_cache is None
+    assert VectorSearcher(index_name, index=fake_index, embedder=embedder, result_cache=True).result_cache
+
+    monkeypatch.setenv('RESULT_CACHE_PATH', str(tmp_path / 'results.db'))
+    searcher = VectorSearcher(index_name, index=fake_index, embedder=embedder)
+    assert isinstance(searcher.result_cache.backend, SQLiteResultBackend)
+    assert VectorSearcher(index_name, index=fake_index, embedder=embedder, result_cache=False).result_cache is None
+
+def test_callers_cannot_modify_cached_metadata(index_name, fake_index, embedder, make_upserter, documents):
+    searcher = VectorSearcher(index_name, index=fake_index, embedder=embedder, result_cache=True)
+    make_upserter().upsert_documents(documents(2))
+
+    query = "Document d1 sentence 2 mentions item 45."
+    first = searcher.search(query, top_k=3)
+    expected = [dict(hit, metadata=dict(hit['metadata'])) for hit in first]
+    first[0]['metadata']['title'] = 'changed'
+    second = searcher.search(query, top_k=3)
+    second[1]['metadata'].clear()
+
+    assert searcher.result_cache.stats()['hits'] == 1
+    assert searcher.search(query, top_k=3) == expected
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from search_service import SearchHTTPServer, SearchService, ServiceOverloaded
+from vector_search import VectorSearcher
+
+QUERIES = [f"Document d{i % 4} sentence {i} mentions item {i * 7}." for i in range(24)]
+
+@pytest.fixture
+def searcher(index_name, fake_index, embedder, make_upserter, documents):
+    make_upserter().upsert_documents(documents(4))
+    searcher = VectorSearcher(index_name, index=fake_index, embedder=embedder)
+    searcher.batch_sizes = []
+    embed_queries = searcher.embed_queries
+
+    def recorded(queries):
+        searcher.batch_sizes.append(len(queries))
+        time.sleep(0.02)  # forward pass ที่ใช้เวลา: requests ที่เข้ามาระหว่างนั้นต้องรวมเป็น batch ถัดไป
+        return embed_queries(queries)
+
+    searcher.embed_queries = recorded
+    return searcher
+
+def test_concurrent_requests_are_coalesced(searcher):
+    async def run():
+        service = SearchService(searcher, batch_window_ms=10, max_batch_size=8)
+        await service.start()
+        try:
+            results = await asyncio.gather(*(service.search(query, top_k=3) for query in QUERIES))
+        finally:
+            await service.stop()
+        return service, results
+
+    service, results = asyncio.run(run())
+    assert sum(searcher.batch_sizes) == len(QUERIES)
+    assert max(searcher.batch_sizes) == 8
+    assert len(searcher.batch_sizes) <= len(QUERIES) // 4
+    assert service.stats()['mean_batch_size'] > 2
+    # ผลลัพธ์ของแต่ละ request ต้องเป็นของ query นั้น ไม่สลับกันใน batch
+    assert results == [searcher.search(query, top_k=3) for query in QUERIES]
+
+def test_admission_limit_rejects_excess_requests(searcher):
+    release = threading.Event()
+    embed_queries = searcher.embed_queries
+
+    def blocked(queries):
+        release.wait(5)
+        return embed_queries(queries)
+
+    searcher.embed_queries = blocked
+
+    async def run():
+        service = SearchService(searcher, batch_window_ms=1, max_pending=3)
+        await service.start()
+        try:
+            tasks = [asyncio.create_task(service.search(query, top_k=2)) for query in QUERIES[:6]]
+            await asyncio.sleep(0.05)
+            release.set()
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            await service.stop()
+        return service, outcomes
+
+    service, outcomes = asyncio.run(run())
+    rejected = [outcome for outcome in outcomes if isinstance(outcome, ServiceOverloaded)]
+    assert len(rejected) == 3 and service.rejected == 3
+    assert all(isinstance(outcome, list) and len(outcome) == 2 for outcome in outcomes[:3])
+    assert service.pending == 0
+
+async def _request(reader, writer, method, target, body=b''):
+    writer.write((f"{method} {target} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n\r\n")
+                 .encode('latin-1') + body)
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode('latin-1')
+    status = int(head.split(' ', 2)[1])
+    length = int(head.lower().split('content-length:', 1)[1].split("\r\n", 1)[0])
+    payload = await reader.readexactly(length)
+    return status, head, json.loads(payload) if 'json' in head else payload.decode('utf-8')
+
+def test_http_endpoint(searcher):
+    async def run():
+        server = SearchHTTPServer(SearchService(searcher, batch_window_ms=1), port=0)
+        await server.start()
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+        responses = []
+        try:
+            body = json.dumps({'query': QUERIES[0], 'top_k': 2}).encode('utf-8')
+            responses.append(await _request(reader, writer, 'POST', '/search', body))
+            # body ที่เป็น JSON แต่ไม่ใช่ object ต้องได้ 400 และ connection ยังใช้ต่อได้
+            for invalid in (b'[]', b'"x"', b'{"query": ["x"]}', b'{"query": "x", "filter": [1]}', b'{bad'):
+                responses.append(await _request(reader, writer, 'POST', '/search', invalid))
+            responses.append(await _request(reader, writer, 'GET', '/search?q=Document+d1&top_k=1'))
+            responses.append(await _request(reader, writer, 'GET', '/missing'))
+            responses.append(await _request(reader, writer, 'PUT', '/search'))
+            responses.append(await _request(reader, writer, 'GET', '/health'))
+        finally:
+            writer.close()
+            await server.stop()
+        return responses
+
+    responses = asyncio.run(run())
+    assert [status for status, _, _ in responses] == [200, 400, 400, 400, 400, 400, 200, 404, 405, 200]
+    assert len(responses[0][2]['results']) == 2 and responses[0][2]['query'] == QUERIES[0]
+    assert responses[1][2] == {'error': "Request body must be a JSON object"}
+    assert len(responses[6][2]['results']) == 1
+
+def test_http_returns_503_when_overloaded(searcher):
+    release = threading.Event()
+    embed_queries = searcher.embed_queries
+    searcher.embed_queries = lambda queries: (release.wait(5), embed_queries(queries))[1]
+
+    async def run():
+        server = SearchHTTPServer(SearchService(searcher, batch_window_ms=1, max_pending=1), port=0)
+        await server.start()
+        connections = [await asyncio.open_connection('127.0.0.1', server.port) for _ in range(2)]
+        body = json.dumps({'query': QUERIES[0]}).encode('utf-8')
+        try:
+            first = asyncio.create_task(_request(*connections[0], 'POST', '/search', body))
+            await asyncio.sleep(0.05)
+            second = await _request(*connections[1], 'POST', '/search', body)
+            release.set()
+            return await first, second
+        finally:
+            for _, writer in connections:
+                writer.close()
+            await server.stop()
+
+    first, second = asyncio.run(run())
+    assert first[0] == 200
+    assert second[0] == 503 and 'Retry-After: 1' in second[1]
@@ -0,0 +1,62 @@
+import pickle
+
+import pytest
+
+from sentence_segmenter import RegexSegmenter, ThaiHeuristicSegmenter, get_segmenter, last_boundary
+from text_chunker import TextChunker
+
+def _sentences(text, cuts):
+    return [text[start:end].strip() for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+def test_thai_boundaries_use_spaces_and_line_breaks():
+    text = ('ระบบนี้ใช้ Python ในการทำงาน ข้อมูลถูกแบ่งเป็นส่วน\n'
+            'บรรทัดใหม่ English text. Next line\n\nย่อหน้าใหม่ ภาษาไทยๆ ต่อ')
+    assert _sentences(text, get_segmenter('thai').boundaries(text)) == [
+        'ระบบนี้ใช้ Python ในการทำงาน',  # เว้นวรรครอบคำภาษาอังกฤษไม่ใช่ขอบเขต
+        'ข้อมูลถูกแบ่งเป็นส่วน',
+        'บรรทัดใหม่ English text.',
+        'Next line',  # บรรทัดว่างเป็นขอบเขตทุกภาษา
+        'ย่อหน้าใหม่',
+        'ภาษาไทยๆ ต่อ',  # ไม้ยมกต่อด้วยคำเดิม ไม่ตัดหลัง ๆ
+    ]
+
+def test_punctuation_segmenter_ignores_thai_spaces():
+    text = 'ข้อมูลถูกแบ่ง เป็นส่วน. English! Why? ok'
+    assert _sentences(text, get_segmenter('punctuation').boundaries(text)) == \
+        ['ข้อมูลถูกแบ่ง เป็นส่วน.', 'English!', 'Why?', 'ok']
+
+def test_boundaries_respect_range():
+    text = 'หนึ่ง สอง สาม สี่ ห้า'
+    segmenter = ThaiHeuristicSegmenter()
+    cuts = segmenter.boundaries(text)
+    assert segmenter.boundaries(text, cuts[0], len(text)) == cuts[1:]
+    assert segmenter.boundaries(text, 0, cuts[2] - 1) == cuts[:2]
+
+def test_last_boundary():
+    cuts = [5, 10, 20]
+    assert last_boundary(cuts, 0, 15) == 10
+    assert last_boundary(cuts, 0, 20) == 20
+    assert last_boundary(cuts, 10, 19) == -1
+    assert last_boundary([], 0, 100) == -1
+
+def test_get_segmenter():
+    assert isinstance(get_segmenter(), ThaiHeuristicSegmenter)
+    assert type(get_segmenter('punctuation')) is RegexSegmenter
+    with pytest.raises(ValueError):
+        get_segmenter('unknown')
+    # chunker ถูกส่งเข้า process pool จึงต้อง pickle ได้
+    assert pickle.loads(pickle.dumps(get_segmenter('thai'))).boundaries('ก ข') == [2]
+
+def test_dictionary_segmenter():
+    pytest.importorskip('pythainlp')
+    text = 'ผมชอบกินข้าวมาก วันนี้อากาศดี'
+    cuts = get_segmenter('pythainlp').boundaries(text)
+    assert cuts and cuts[-1] == len(text)
+
+def test_thai_text_is_chunked_without_losing_content():
+    text = ' '.join(f"ประโยคที่{i}ของเอกสารภาษาไทยไม่มีเครื่องหมายจบประโยค" for i in range(100))
+    thai = TextChunker(chunk_size=200, overlap=0).chunk_by_sentences(text)
+    assert len(thai) > 1
+    assert all(len(chunk) <= 200 for chunk in thai)
+    # ทุกประโยคอยู่ใน chunk ใด chunk หนึ่งครบทั้งประโยค (ไม่ถูกตัดกลางคำ)
+    assert ' '.join(thai).split(' ') == text.split(' ')
@@ -0,0 +1,86 @@
+import os
+
+from data_importer import FileDataImporter
+from sync_manifest import SyncManifest
+
+def _doc_ids(index, doc_id):
+    return sorted((vector_id for vector_id in index._vectors if vector_id.rsplit('_', 1)[0] == doc_id),
+                  key=lambda vector_id: int(vector_id.rsplit('_', 1)[1]))
+
+def test_unchanged_documents_are_skipped(make_upserter, fake_index, tmp_path, documents):
+    upserter = make_upserter()
+    manifest = SyncManifest(str(tmp_path / 'manifest.json'))
+    docs = documents(4)
+    first = upserter.sync_documents(docs, manifest, source='s')
+    assert first['changed'] == 4 and first['upserted_chunks'] == len(fake_index._vectors)
+
+    calls = fake_index.upsert_calls
+    # manifest ที่อ่านจาก disk ใหม่ = รอบถัดไปของ job
+    second = upserter.sync_documents(documents(4), SyncManifest(str(tmp_path / 'manifest.json')), source='s')
+    assert (second['changed'], second['unchanged'], second['upserted_chunks']) == (0, 4, 0)
+    assert fake_index.upsert_calls == calls
+
+    edited = documents(4)
+    edited[2]['title'] = 'edited'
+    third = upserter.sync_documents(edited, SyncManifest(str(tmp_path / 'manifest.json')), source='s')
+    assert (third['changed'], third['deleted_chunks']) == (1, 0)
+    assert fake_index._vectors['d2_0'][1]['title'] == 'edited'
+
+def test_shrinking_document_deletes_stale_chunks(make_upserter, fake_index, tmp_path, documents):
+    upserter = make_upserter()
+    manifest = SyncManifest(str(tmp_path / 'manifest.json'))
+    upserter.sync_documents(documents(2, sentences=40), manifest, source='s')
+    long_ids = _doc_ids(fake_index, 'd0')
+    other_ids = _doc_ids(fake_index, 'd1')
+    assert len(long_ids) > 2
+
+    shrunk = documents(2, sentences=40)
+    shrunk[0]['content'] = documents(1, sentences=3)[0]['content']
+    result = upserter.sync_documents(shrunk, manifest, source='s')
+
+    assert _doc_ids(fake_index, 'd0') == ['d0_0']
+    assert result['deleted_chunks'] == len(long_ids) - 1
+    assert _doc_ids(fake_index, 'd1') == other_ids
+    assert manifest.get('d0')['chunks'] == 1
+
+def test_prune_removes_documents_missing_from_source(make_upserter, fake_index, tmp_path, documents):
+    upserter = make_upserter()
+    manifest = SyncManifest(str(tmp_path / 'manifest.json'))
+    upserter.sync_documents(documents(3), manifest, source='a')
+    upserter.sync_documents(documents(1, prefix='other'), manifest, source='b')
+
+    result = upserter.sync_documents(documents(3)[:2], manifest, source='a', prune_missing=True)
+    assert result['removed'] == 1
+    assert _doc_ids(fake_index, 'd2') == [] and manifest.get('d2') is None
+    assert _doc_ids(fake_index, 'd0') and _doc_ids(fake_index, 'other0')
+
+    # unchanged_ids (ไฟล์ที่ไม่ได้อ่าน) ไม่ถูกมองว่าหายไป
+    result = upserter.sync_documents([], manifest, source='a', unchanged_ids=['d0', 'd1'], prune_missing=True)
+    assert result['removed'] == 0 and _doc_ids(fake_index, 'd1')
+
+def test_folder_sync_skips_files_without_reading(make_upserter, fake_index, tmp_path, monkeypatch, documents):
+    folder = tmp_path / 'docs'
+    folder.mkdir()
+    for doc in documents(3):
+        (folder / f"{doc['id']}.txt").write_text(doc['content'], encoding='utf-8')
+    importer = FileDataImporter(upserter=make_upserter(), manifest_path=str(tmp_path / 'manifest.json'))
+    importer.import_from_folder(str(folder), incremental=True)
+    assert _doc_ids(fake_index, 'folder_d1')
+
+    (folder / 'd1.txt').write_text('A rewritten file.', encoding='utf-8')
+    os.remove(folder / 'd2.txt')
+    read = []
+    real_open = open
+
+    def tracking_open(path, *args, **kwargs):
+        read.append(os.path.basename(str(path)))
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr('builtins.open', tracking_open)
+    importer.import_from_folder(str(folder), incremental=True)
+    monkeypatch.undo()
+
+    assert 'd0.txt' not in read and 'd1.txt' in read
+    assert _doc_ids(fake_index, 'folder_d1') == ['folder_d1_0']
+    assert _doc_ids(fake_index, 'folder_d2') == []
+    assert _doc_ids(fake_index, 'folder_d0')
@@ -0,0 +1,159 @@
+import random
+import re
+
+import pytest
+
+from text_chunker import TextChunker
+
+_SKIPPED = re.compile(r'[\s.!?।]')
+
+class StubTokenizer:
+    """แทน HuggingFace fast tokenizer: token ละไม่เกิน 3 ตัวอักษรที่ไม่ใช่ whitespace (คืน offset_mapping)"""
+
+    name_or_path = 'stub-tokenizer'
+    _TOKEN = re.compile(r'\S{1,3}')
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts, **kwargs):
+        self.calls += 1
+        if isinstance(texts, str):
+            return {'offset_mapping': self.offsets(texts)}
+        return {'offset_mapping': [self.offsets(text) for text in texts]}
+
+    def offsets(self, text):
+        return [match.span() for match in self._TOKEN.finditer(text)]
+
+    def count(self, text):
+        return len(self._TOKEN.findall(text))
+
+def _random_text(seed, length=5000):
+    """ข้อความผสมไทย/อังกฤษ ประโยคยาวสั้นปนกัน มีทั้งประโยคที่ไม่มีเครื่องหมายจบและคำที่ยาวมาก"""
+    rng = random.Random(seed)
+    words = ['python', 'ข้อมูล', 'เวกเตอร์', 'index', '42', 'ภาษาไทยเขียนติดกันยาว', 'x' * 300, 'a.b']
+    parts = []
+    while sum(map(len, parts)) < length:
+        parts.append(rng.choice(words))
+        parts.append(rng.choice([' ', ' ', ' ', '. ', '! ', '\n', '\n\n', '', '?']))
+    return ''.join(parts)
+
+def _assert_covers(text, spans):
+    """ทุกตัวอักษรที่ไม่ใช่ whitespace/เครื่องหมายจบประโยคต้องอยู่ในอย่างน้อยหนึ่ง chunk"""
+    covered = bytearray(len(text))
+    for start, end in spans:
+        covered[start:end] = b'\x01' * (end - start)
+    missing = [i for i, flag in enumerate(covered) if not flag and not _SKIPPED.match(text[i])]
+    assert not missing, f"uncovered text at {missing[:5]}: {text[missing[0]:missing[0] + 20]!r}"
+
+def _assert_well_formed(text, spans, chunk_size):
+    for start, end in spans:
+        assert 0 <= start < end <= len(text)
+        assert end - start <= chunk_size
+        assert not text[start].isspace() and not text[end - 1].isspace()
+    assert [start for start, _ in spans] == sorted(start for start, _ in spans)
+
+@pytest.mark.parametrize('method', ['chunk_by_sentences', 'chunk_by_paragraphs', 'chunk_by_characters'])
+@pytest.mark.parametrize('seed', range(5))
+def test_chunks_are_bounded_and_cover_input(method, seed):
+    text = _random_text(seed)
+    chunker = TextChunker(chunk_size=120, overlap=30)
+    spans = getattr(chunker, method)(text, return_offsets=True)
+    _assert_well_formed(text, spans, 120)
+    _assert_covers(text, spans)
+    assert getattr(chunker, method)(text) == [text[start:end] for start, end in spans]
+
+def test_sentence_overlap_repeats_whole_trailing_sentences():
+    text = ' '.join(f"Sentence number {i} is here." for i in range(40))
+    chunker = TextChunker(chunk_size=100, overlap=40, segmenter='punctuation')
+    spans = chunker.chunk_by_sentences(text, return_offsets=True)
+    assert len(spans) > 1
+    for (_, previous_end), (start, end) in zip(spans, spans[1:]):
+        assert start < previous_end  # ประโยคสั้นกว่า overlap จึงซ้อนกันทุก chunk
+        assert previous_end - start <= 40
+        assert text[start:start + 8] == 'Sentence'
+
+    no_overlap = TextChunker(chunk_size=100, overlap=0, segmenter='punctuation')
+    spans = no_overlap.chunk_by_sentences(text, return_offsets=True)
+    assert all(start >= previous_end for (_, previous_end), (start, _) in zip(spans, spans[1:]))
+
+def test_fixed_size_overlap_steps_by_chunk_size_minus_overlap():
+    text = ''.join(chr(ord('a') + i % 26) for i in range(1000))
+    spans = TextChunker(chunk_size=100, overlap=25).chunk_by_characters(text, return_offsets=True)
+    assert [start for start, _ in spans] == list(range(0, 901, 75))
+    assert all(end - start == 100 for start, end in spans)
+    assert spans[-1][1] == len(text)
+
+@pytest.mark.parametrize('text', [
+    'x' * 5000,
+    'ภาษาไทยที่เขียนติดกันโดยไม่มีการเว้นวรรคเลย' * 100,
+    '.' * 500 + 'word' + '!' * 500,
+    ' \n\t ' * 300,
+    '',
+])
+@pytest.mark.parametrize('overlap', [0, 50, 99])
+def test_degenerate_input_terminates(text, overlap):
+    chunker = TextChunker(chunk_size=100, overlap=overlap)
+    for method in ('chunk_by_sentences', 'chunk_by_paragraphs', 'chunk_by_characters'):
+        spans = getattr(chunker, method)(text, return_offsets=True)
+        assert len(spans) <= len(text)
+        _assert_well_formed(text, spans, 100)
+        _assert_covers(text, spans)
+
+def test_thai_cut_keeps_vowels_with_consonants():
+    text = 'เกาะแก่งในไทย' * 50
+    spans = TextChunker(chunk_size=37, overlap=0).chunk_by_sentences(text, return_offsets=True)
+    for start, end in spans:
+        assert text[end - 1] not in 'เแโใไ'
+        assert end == len(text) or text[end] not in '่้๊๋ิีึืุูั็์'
+
+@pytest.mark.parametrize('seed', range(5))
+def test_token_budget_bounds_sentence_chunks(seed):
+    text = _random_text(seed)
+    tokenizer = StubTokenizer()
+    chunker = TextChunker(chunk_size=40, overlap=10, tokenizer=tokenizer)
+    for method in ('chunk_by_sentences', 'chunk_by_paragraphs'):
+        spans = getattr(chunker, method)(text, return_offsets=True)
+        assert all(tokenizer.count(text[start:end]) <= 40 for start, end in spans)
+        _assert_covers(text, spans)
+        # budget เป็น tokens: chunk ยาวเกิน 40 ตัวอักษรได้
+        assert max(end - start for start, end in spans) > 40
+
+def test_token_overlap_is_measured_in_tokens():
+    text = ' '.join(f"Sentence {i} has a few more words." for i in range(60))
+    tokenizer = StubTokenizer()
+    chunker = TextChunker(chunk_size=50, overlap=20, tokenizer=tokenizer, segmenter='punctuation')
+    spans = chunker.chunk_by_sentences(text, return_offsets=True)
+    overlaps = [tokenizer.count(text[start:previous_end])
+                for (_, previous_end), (start, _) in zip(spans, spans[1:])]
+    assert all(0 < overlap <= 20 for overlap in overlaps)
+
+def test_chunk_by_tokens_steps_by_tokens():
+    tokenizer = StubTokenizer()
+    text = ' '.join(f"w{i:03d}" for i in range(100))  # 2 tokens ต่อคำ
+    spans = TextChunker(chunk_size=30, overlap=10, tokenizer=tokenizer).chunk_by_tokens(text, return_offsets=True)
+    offsets = tokenizer.offsets(text)
+    assert [start for start, _ in spans] == [offsets[i][0] for i in range(0, 200 - 10, 20)]
+    assert all(tokenizer.count(text[start:end]) == 30 for start, end in spans[:-1])
+    assert spans[-1][1] == len(text)
+    with pytest.raises(ValueError):
+        TextChunker().chunk_by_tokens(text)
+
+def test_many_texts_are_tokenized_in_one_call():
+    texts = [_random_text(seed, 800) for seed in range(4)]
+    tokenizer = StubTokenizer()
+    chunker = TextChunker(chunk_size=40, overlap=10, tokenizer=tokenizer)
+    batched = chunker.chunk_many_by_sentences(texts, return_offsets=True)
+    assert tokenizer.calls == 1
+    assert batched == [chunker.chunk_by_sentences(text, return_offsets=True) for text in texts]
+
+def test_for_model_uses_model_budget():
+    class Model:
+        max_seq_length = 128
+        num_special_tokens = 2
+        tokenizer = StubTokenizer()
+
+    chunker = TextChunker.for_model(Model())
+    assert (chunker.chunk_size, chunker.overlap, chunker.tokenizer) == (126, 31, Model.tokenizer)
+    assert 'unit=stub-tokenizer' in chunker.fingerprint()
+    assert TextChunker.for_model(Model(), overlap=8).overlap == 8
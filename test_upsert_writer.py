@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from fake_index import FakeIndex, FakeThrottleError
+from upsert_writer import ConcurrentUpsertWriter, is_retryable
+
+def _batches(count, size=10, dim=4):
+    return [[(f"v{b}_{i}", np.ones(dim, dtype=np.float32), {'batch': b}) for i in range(size)]
+            for b in range(count)]
+
+def test_retries_throttled_batches_until_stored(make_fake_index):
+    index = make_fake_index(throttle_rate=0.5, seed=1)
+    writer = ConcurrentUpsertWriter(index, max_workers=4, max_retries=50, base_delay=0)
+    for batch in _batches(20):
+        writer.submit(batch)
+    writer.flush()
+
+    assert len(index._vectors) == 200
+    assert index.throttled_calls > 0
+    assert writer.retries == index.throttled_calls
+    assert writer.summary()['batches'] == 20
+
+def test_gives_up_after_max_retries(make_fake_index):
+    index = make_fake_index(throttle_rate=1.0, seed=1)
+    writer = ConcurrentUpsertWriter(index, max_workers=1, max_retries=3, base_delay=0)
+    writer.submit(_batches(1)[0])
+    with pytest.raises(FakeThrottleError):
+        writer.flush()
+    assert index.throttled_calls == 4
+
+def test_non_retryable_error_is_not_retried():
+    class BrokenIndex(FakeIndex):
+        def upsert(self, vectors, **kwargs):
+            raise ValueError("dimension mismatch")
+
+    index = BrokenIndex(latency=0, jitter=0)
+    writer = ConcurrentUpsertWriter(index, max_workers=1, base_delay=0)
+    writer.submit(_batches(1)[0])
+    with pytest.raises(ValueError):
+        writer.flush()
+    assert writer.retries == 0
+    assert not is_retryable(ValueError("dimension mismatch"))
+    assert is_retryable(FakeThrottleError("(429) Too Many Requests"))
+
+def test_backpressure_limits_batches_in_flight(make_fake_index):
+    index = make_fake_index(latency=0.02)
+    writer = ConcurrentUpsertWriter(index, max_workers=2, max_pending=2)
+    for batch in _batches(10):
+        writer.submit(batch)
+    writer.flush()
+
+    assert index.max_in_flight <= 2
+    assert writer.backpressure_wait > 0
+    assert len(index._vectors) == 100
+
+def test_on_done_runs_only_for_acked_batches(make_fake_index):
+    index = make_fake_index(throttle_rate=0.3, seed=2)
+    writer = ConcurrentUpsertWriter(index, max_workers=3, max_retries=50, base_delay=0)
+    acked = []
+    for batch_no, batch in enumerate(_batches(12)):
+        writer.submit(batch, lambda batch_no=batch_no: acked.append(batch_no))
+    writer.flush()
+    assert sorted(acked) == list(range(12))
+
+    failing = make_fake_index(throttle_rate=1.0)
+    writer = ConcurrentUpsertWriter(failing, max_workers=1, max_retries=0, base_delay=0)
+    writer.submit(_batches(1)[0], lambda: acked.append('failed'))
+    with pytest.raises(FakeThrottleError):
+        writer.flush()
+    assert 'failed' not in acked
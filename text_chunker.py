@@ -1,80 +1,259 @@
 import re
-from typing import List
+import unicodedata
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Sequence, Tuple, Union
+
+from sentence_segmenter import get_segmenter, last_boundary
+from metrics import timer
+
+# จุดเริ่มประโยคถัดไป (ข้าม whitespace และเครื่องหมายจบประโยค)
+_SENTENCE_START = re.compile(r'[^\s.!?।]')
+_PARAGRAPH_BREAK = re.compile(r'\n\n')
+_NON_SPACE = re.compile(r'\S')
+# สระหน้า (เ แ โ ใ ไ) ต้องอยู่ chunk เดียวกับพยัญชนะที่ตามมา
+_THAI_LEADING_VOWELS = 'เแโใไ'
+
+Span = Tuple[int, int]
+
+def _strip_span(text: str, start: int, end: int) -> Span:
+    """ตัด whitespace หัวท้ายของ text[start:end] โดยคืนเป็นตำแหน่งแทนการสร้าง string ใหม่"""
+    match = _NON_SPACE.search(text, start, end)
+    if match is None:
+        return start, start
+    start = match.start()
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
 
 class TextChunker:
-    def __init__(self, chunk_size=512, overlap=50):
+    """แบ่งข้อความเป็น chunks โดยทำงานบนตำแหน่ง (start, end) ของข้อความต้นฉบับ
+    
+    ทุก method รับ return_offsets=True เพื่อคืน list ของ (start, end) แทน string
+    chunk ที่เป็น string คือ text[start:end] เสมอ
+    
+    ถ้ากำหนด tokenizer (HuggingFace fast tokenizer) chunk_size และ overlap จะนับเป็น tokens
+    แทนตัวอักษร (ยกเว้น chunk_by_characters)
+    
+    segmenter: ชื่อหรือ object ที่หาขอบเขตประโยค ดู sentence_segmenter.py
+    ('thai' = heuristic สำหรับภาษาไทย, 'punctuation' = แบบเดิม, 'pythainlp' = dictionary)
+    """
+    
+    def __init__(self, chunk_size=512, overlap=50, tokenizer=None, segmenter='thai'):
         self.chunk_size = chunk_size
         self.overlap = overlap
+        self.tokenizer = tokenizer
+        self.segmenter = get_segmenter(segmenter) if isinstance(segmenter, str) else segmenter
     
-    def chunk_by_sentences(self, text: str) -> List[str]:
-        """แบ่ง chunk โดยใช้ประโยค (เหมาะกับเอกสารภาษาไทย)"""
-        # แบ่งเป็นประโยค (รองรับภาษาไทย)
-        sentences = re.split(r'[.!?।]+', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
+    @classmethod
+    def for_model(cls, embedder, overlap=32, segmenter='thai'):
+        """สร้าง chunker ที่ chunk_size = max sequence length ของโมเดล (หัก special tokens)
         
-        chunks = []
-        current_chunk = ""
+        โมเดลตัดข้อความที่ยาวเกิน max_seq_length ทิ้ง chunk ที่ยาวกว่านั้นจึงเสียทั้ง compute และเนื้อหา
+        """
+        budget = embedder.max_seq_length - embedder.num_special_tokens
+        return cls(
+            chunk_size=budget,
+            overlap=min(overlap, budget // 4),
+            tokenizer=embedder.tokenizer,
+            segmenter=segmenter
+        )
+    
+    def fingerprint(self) -> str:
+        """ค่า config ที่มีผลต่อผลลัพธ์การแบ่ง chunk"""
+        unit = getattr(self.tokenizer, 'name_or_path', None) or 'chars'
+        return (
+            f"TextChunker(chunk_size={self.chunk_size}, overlap={self.overlap}, unit={unit}, "
+            f"segmenter={self.segmenter.name}, spans=source, sentence_overlap=1)"
+        )
+    
+    def _token_ends(self, texts: Sequence[str]) -> List[Optional[List[int]]]:
+        """ตำแหน่งตัวอักษรที่แต่ละ token จบ (tokenize ทุก text ใน call เดียว) หรือ None ถ้าไม่มี tokenizer"""
+        if self.tokenizer is None:
+            return [None] * len(texts)
+        with timer('tokenize'):
+            encoded = self.tokenizer(
+                list(texts),
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+                verbose=False
+            )
+        return [[end for _, end in offsets] for offsets in encoded['offset_mapping']]
+    
+    def _limit(self, start: int, end: int, token_ends: Optional[List[int]]) -> int:
+        """ตำแหน่งไกลสุดที่ chunk ซึ่งเริ่มที่ start ยังยาวไม่เกิน chunk_size"""
+        if token_ends is None:
+            return min(start + self.chunk_size, end)
+        last = bisect_right(token_ends, start) + self.chunk_size - 1
+        return end if last >= len(token_ends) else min(token_ends[last], end)
+    
+    def _length(self, start: int, end: int, token_ends: Optional[List[int]]) -> int:
+        """ความยาวของ text[start:end] เป็นตัวอักษร หรือจำนวน tokens"""
+        if token_ends is None:
+            return end - start
+        return bisect_right(token_ends, end) - bisect_right(token_ends, start)
+    
+    @staticmethod
+    def _output(text: str, spans: List[Span], return_offsets: bool) -> Union[List[str], List[Span]]:
+        if return_offsets:
+            return spans
+        return [text[start:end] for start, end in spans]
+    
+    @staticmethod
+    def _window_cut(text: str, start: int, limit: int) -> int:
+        """จุดตัดของประโยคที่ยาวเกิน chunk_size: whitespace สุดท้ายในครึ่งหลังของ window
         
-        for sentence in sentences:
-            # ถ้าเพิ่มประโยคนี้แล้วยาวเกิน chunk_size
-            if len(current_chunk + sentence) > self.chunk_size:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                    current_chunk = sentence + " "
-                else:
-                    # ประโยคเดียวยาวเกิน chunk_size
-                    chunks.append(sentence[:self.chunk_size])
-                    current_chunk = ""
-            else:
-                current_chunk += sentence + " "
+        ถ้าไม่มี (เช่นภาษาไทยที่เขียนติดกัน) ตัดที่ limit แต่ไม่แยกสระ/วรรณยุกต์ออกจากพยัญชนะ
+        """
+        for cut in range(limit, start + (limit - start) // 2, -1):
+            if text[cut - 1].isspace():
+                return cut
+        cut = limit
+        while cut > start + 1 and (
+            (cut < len(text) and unicodedata.combining(text[cut]))
+            or text[cut - 1] in _THAI_LEADING_VOWELS
+        ):
+            cut -= 1
+        return cut
+    
+    def _pack_sentences(self, text: str, start: int = 0, end: int = None,
+                        token_ends: Optional[List[int]] = None) -> List[Span]:
+        """รวมประโยคที่ติดกันเป็น chunk ที่ยาวไม่เกิน chunk_size
         
-        # เพิ่ม chunk สุดท้าย
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        กระโดดทีละ chunk: หาขอบเขตประโยคสุดท้ายภายใน chunk_size (bisect บน boundaries
+        ที่ segmenter หาไว้ครั้งเดียว) แทนการวนทีละประโยคใน Python
+        ประโยคที่ยาวเกิน chunk_size จะถูกแบ่งเป็นหลาย window ไม่ตัดส่วนที่เหลือทิ้ง
+        
+        chunk ถัดไปเริ่มซ้ำประโยคท้ายของ chunk ก่อนหน้าที่รวมกันยาวไม่เกิน overlap
+        (ทั้งประโยคเท่านั้น ถ้าประโยคสุดท้ายยาวเกิน overlap จะไม่มีส่วนที่ซ้อนกัน)
+        """
+        if end is None:
+            end = len(text)
+        chunks = []
+        cuts = self.segmenter.boundaries(text, start, end)
+        
+        previous_cut = start
+        match = _SENTENCE_START.search(text, start, end)
+        while match is not None:
+            chunk_start = match.start()
+            limit = self._limit(chunk_start, end, token_ends)
+            cut = end if limit == end else last_boundary(cuts, chunk_start, limit)
+            if cut < 0:
+                # ประโยคเดียวยาวเกิน chunk_size
+                cut = self._window_cut(text, chunk_start, limit)
+            if cut <= previous_cut:
+                # ส่วนที่ซ้อนกับ chunk ก่อนหน้ากิน chunk_size จนไม่เหลือที่ให้ประโยคใหม่: เริ่มต่อจากจุดตัดเดิม
+                match = _SENTENCE_START.search(text, previous_cut, end)
+                continue
+            
+            chunk_end = cut
+            while chunk_end > chunk_start and text[chunk_end - 1].isspace():
+                chunk_end -= 1
+            chunks.append((chunk_start, chunk_end))
+            if cut >= end:
+                break
+            
+            previous_cut = cut
+            match = (self._overlap_start(text, cuts, chunk_start, chunk_end, token_ends)
+                     or _SENTENCE_START.search(text, cut, end))
         
         return chunks
     
-    def chunk_by_characters(self, text: str) -> List[str]:
+    def _overlap_start(self, text: str, cuts: List[int], chunk_start: int, chunk_end: int,
+                       token_ends: Optional[List[int]]):
+        """match ของจุดเริ่มประโยคท้าย chunk ที่รวมกันยาวไม่เกิน overlap หรือ None ถ้าไม่มี"""
+        overlap_start = None
+        i = bisect_left(cuts, chunk_end) - 1
+        while i >= 0 and cuts[i] > chunk_start:
+            match = _SENTENCE_START.search(text, cuts[i], chunk_end)
+            if match is None or self._length(match.start(), chunk_end, token_ends) > self.overlap:
+                break
+            overlap_start = match
+            i -= 1
+        return overlap_start
+    
+    def chunk_by_sentences(self, text: str, return_offsets: bool = False) -> Union[List[str], List[Span]]:
+        """แบ่ง chunk โดยใช้ประโยค (เหมาะกับเอกสารภาษาไทย) chunks ที่ติดกันซ้อนกันไม่เกิน overlap"""
+        token_ends = self._token_ends([text])[0]
+        return self._output(text, self._pack_sentences(text, token_ends=token_ends), return_offsets)
+    
+    def chunk_many_by_sentences(self, texts: Sequence[str], return_offsets: bool = False) -> List[Union[List[str], List[Span]]]:
+        """chunk_by_sentences ของหลาย texts โดย tokenize ทั้งหมดใน batch เดียว"""
+        return [
+            self._output(text, self._pack_sentences(text, token_ends=token_ends), return_offsets)
+            for text, token_ends in zip(texts, self._token_ends(texts))
+        ]
+    
+    def chunk_by_tokens(self, text: str, return_offsets: bool = False) -> Union[List[str], List[Span]]:
+        """แบ่ง chunk ละ chunk_size tokens พร้อม overlap เป็น tokens (ต้องมี tokenizer)"""
+        if self.tokenizer is None:
+            raise ValueError("chunk_by_tokens requires a tokenizer")
+        
+        offsets = self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False
+        )['offset_mapping']
+        
+        spans = []
+        step = max(self.chunk_size - self.overlap, 1)
+        for first in range(0, len(offsets), step):
+            last = min(first + self.chunk_size, len(offsets)) - 1
+            spans.append((offsets[first][0], offsets[last][1]))
+            if last == len(offsets) - 1:
+                break
+        
+        return self._output(text, spans, return_offsets)
+    
+    def chunk_by_characters(self, text: str, return_offsets: bool = False) -> Union[List[str], List[Span]]:
         """แบ่ง chunk โดยใช้จำนวนตัวอักษร พร้อม overlap"""
-        chunks = []
-        start = 0
+        spans = []
+        step = max(self.chunk_size - self.overlap, 1)  # overlap เพื่อไม่ให้สูญเสียบริบท
         
-        while start < len(text):
-            end = start + self.chunk_size
-            chunk = text[start:end]
-            chunks.append(chunk)
-            start = end - self.overlap  # overlap เพื่อไม่ให้สูญเสียบริบท
+        for start in range(0, len(text), step):
+            span = _strip_span(text, start, min(start + self.chunk_size, len(text)))
+            if span[1] > span[0]:
+                spans.append(span)
+            if start + self.chunk_size >= len(text):
+                break
         
-        return [chunk.strip() for chunk in chunks if chunk.strip()]
+        return self._output(text, spans, return_offsets)
     
-    def chunk_by_paragraphs(self, text: str) -> List[str]:
+    def chunk_by_paragraphs(self, text: str, return_offsets: bool = False) -> Union[List[str], List[Span]]:
         """แบ่ง chunk โดยใช้ paragraph"""
-        paragraphs = text.split('\n\n')
-        chunks = []
-        current_chunk = ""
+        spans = []
+        chunk_start = chunk_end = None
+        token_ends = self._token_ends([text])[0]
         
-        for para in paragraphs:
-            para = para.strip()
-            if not para:
+        para_start = 0
+        boundaries = [match.start() for match in _PARAGRAPH_BREAK.finditer(text)] + [len(text)]
+        for boundary in boundaries:
+            start, end = _strip_span(text, para_start, boundary)
+            para_start = boundary + 2
+            if start == end:
+                continue
+            
+            if chunk_start is not None and self._length(chunk_start, end, token_ends) > self.chunk_size:
+                spans.append((chunk_start, chunk_end))
+                chunk_start = None
+            
+            # ถ้า paragraph เดียวยาวเกิน chunk_size
+            if self._length(start, end, token_ends) > self.chunk_size:
+                spans.extend(self._pack_sentences(text, start, end, token_ends))
                 continue
-                
-            if len(current_chunk + para) > self.chunk_size:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                
-                # ถ้า paragraph เดียวยาวเกิน chunk_size
-                if len(para) > self.chunk_size:
-                    chunks.extend(self.chunk_by_sentences(para))
-                    current_chunk = ""
-                else:
-                    current_chunk = para + "\n\n"
-            else:
-                current_chunk += para + "\n\n"
+            
+            if chunk_start is None:
+                chunk_start = start
+            chunk_end = end
         
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        if chunk_start is not None:
+            spans.append((chunk_start, chunk_end))
         
-        return chunks
+        return self._output(text, spans, return_offsets)
 
 # ทดสอบ
 if __name__ == "__main__":
@@ -91,4 +270,6 @@ if __name__ == "__main__":
     
     chunks = chunker.chunk_by_paragraphs(text)
     for i, chunk in enumerate(chunks):
-        print(f"Chunk {i+1}: {chunk}\n---")
\ No newline at end of file
+        print(f"Chunk {i+1}: {chunk}\n---")
+    
+    print(chunker.chunk_by_sentences(text, return_offsets=True))
\ No newline at end of file
@@ -0,0 +1,172 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import LatencyStats, timer, inc
+
+# status / ข้อความที่ถือว่าเป็นการโดน throttle หรือ server ไม่ว่างชั่วคราว (HTTP และ gRPC)
+RETRYABLE_STATUS = {429, 503}
+RETRYABLE_MARKERS = ('Too Many Requests', 'RESOURCE_EXHAUSTED', 'UNAVAILABLE', '(429)', '(503)')
+
+def is_retryable(error: Exception) -> bool:
+    """ตรวจว่า error มาจากการโดน throttle/ระบบไม่ว่างชั่วคราว ซึ่งควร retry"""
+    status = getattr(error, 'status', None) or getattr(error, 'status_code', None)
+    if status in RETRYABLE_STATUS:
+        return True
+    message = str(error)
+    return any(marker in message for marker in RETRYABLE_MARKERS)
+
+def serialize_vectors(batch: List) -> List:
+    """แปลง values ที่เป็น numpy array เป็น list ของ float (จุดเดียวที่ออกจาก float32 array ก่อนส่ง Pinecone)"""
+    serialized = []
+    for vector in batch:
+        if isinstance(vector, dict):
+            values = vector.get('values')
+            if hasattr(values, 'tolist'):
+                vector = {**vector, 'values': values.tolist()}
+        elif hasattr(vector[1], 'tolist'):
+            vector = (vector[0], vector[1].tolist(), *vector[2:])
+        serialized.append(vector)
+    return serialized
+
+class ConcurrentUpsertWriter:
+    """ส่ง upsert หลาย request พร้อมกันผ่าน thread pool
+
+    - max_workers: จำนวน request ที่วิ่งพร้อมกันได้
+    - max_pending: จำนวน batch สูงสุดที่รอ/กำลังส่ง ถ้าเต็ม submit() จะ block
+      ทำให้ขั้น embedding หยุดรอเมื่อ network ตามไม่ทัน (backpressure)
+    - retry แบบ exponential backoff + full jitter เมื่อโดน throttle
+    """
+
+    def __init__(self, index, max_workers=4, max_pending=None,
+                 max_retries=5, base_delay=0.5, max_delay=8.0):
+        self.index = index
+        self.max_workers = max_workers
+        self.max_pending = max_pending or max_workers * 2
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upsert")
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._futures = []
+
+        self.latency = LatencyStats()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """เริ่มนับสถิติใหม่สำหรับ run ถัดไป"""
+        with self._lock:
+            self.batches = 0
+            self.vectors = 0
+            self.retries = 0
+            self.backpressure_wait = 0.0
+            self._started_at = time.perf_counter()
+        self.latency.reset()
+
+    def submit(self, batch: List, on_done: Optional[Callable[[], None]] = None):
+        """ส่ง batch เข้าคิว (block ถ้ามี batch ค้างเกิน max_pending)
+
+        on_done: เรียกใน upsert thread หลัง index ตอบรับ batch นี้ (เช่นบันทึกลง IngestJournal)
+        """
+        self._collect_done()
+
+        wait_start = time.perf_counter()
+        self._slots.acquire()
+        waited = time.perf_counter() - wait_start
+
+        future = self._executor.submit(self._send, batch, on_done)
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self.backpressure_wait += waited
+            self._futures.append(future)
+
+    def _send(self, batch: List, on_done: Optional[Callable[[], None]] = None):
+        if not getattr(self.index, 'accepts_arrays', False):
+            with timer('serialize'):
+                batch = serialize_vectors(batch)
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                with timer('upsert'):
+                    self.index.upsert(vectors=batch)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                # full jitter: สุ่มรอระหว่าง 0 ถึง base * 2^attempt
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt))))
+                continue
+
+            self.latency.record(time.perf_counter() - start)
+            inc('vectors_upserted', len(batch))
+            with self._lock:
+                self.batches += 1
+                self.vectors += len(batch)
+            if on_done is not None:
+                on_done()
+            return len(batch)
+
+    def _collect_done(self):
+        """เอา batch ที่ส่งเสร็จแล้วออกจากรายการ และ raise error แรกที่เจอ"""
+        with self._lock:
+            done = [f for f in self._futures if f.done()]
+            self._futures = [f for f in self._futures if not f.done()]
+        for future in done:
+            error = future.exception()
+            if error is not None:
+                raise error
+
+    def flush(self):
+        """รอให้ทุก batch ส่งเสร็จ แล้ว raise error แรกถ้ามี"""
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.exception()
+        self._collect_done()
+
+    def summary(self) -> Dict[str, Any]:
+        """สรุป throughput และ latency ของ run ปัจจุบัน"""
+        elapsed = time.perf_counter() - self._started_at
+        with self._lock:
+            summary = {
+                'batches': self.batches,
+                'vectors': self.vectors,
+                'retries': self.retries,
+                'elapsed_s': elapsed,
+                'vectors_per_s': self.vectors / elapsed if elapsed > 0 else 0.0,
+                'backpressure_wait_s': self.backpressure_wait,
+            }
+        summary['latency'] = self.latency.summary()
+        return summary
+
+    def close(self):
+        """flush แล้วปิด thread pool"""
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+# ทดสอบกับ FakeIndex ที่มี latency เทียม
+if __name__ == "__main__":
+    from fake_index import FakeIndex
+
+    batches = [[(f"v{b}_{i}", [0.1] * 8, {}) for i in range(100)] for b in range(40)]
+
+    for workers in (1, 4, 8):
+        index = FakeIndex(latency=0.05, jitter=0.01, throttle_rate=0.05, seed=0)
+        writer = ConcurrentUpsertWriter(index, max_workers=workers, base_delay=0.01)
+        for batch in batches:
+            writer.submit(batch)
+        writer.close()
+
+        summary = writer.summary()
+        print(f"workers={workers}: {summary['vectors_per_s']:.0f} vectors/s, "
+              f"retries={summary['retries']}, max in flight={index.max_in_flight}, "
+              f"p95={summary['latency']['p95_ms']:.1f} ms")
@@ -1,12 +1,274 @@
-from typing import List, Dict, Any, Optional
-from pinecone_client import PineconeClient
-from embedding_model import EmbeddingModel
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from index_backend import open_index
+from embedding_model import get_embedding_model
+from lru_cache import LRUCache
+from metrics import LatencyStats
+from result_cache import open_result_cache
+from chunk_store import open_chunk_store, split_vector_id
+from bm25_index import open_bm25_index
+from reranker import RERANKERS, CosineReranker, get_cross_encoder
+from chunk_dedup import open_chunk_dedup
+from metrics import timer, inc, get_logger, log_event
+
+logger = get_logger('search')
+
+_WHITESPACE_RUN = re.compile(r'\s+')
+
+def normalize_query(query: str) -> str:
+    """รูปแบบมาตรฐานของ query ที่ใช้เป็น key ของ cache (NFC + ยุบ whitespace)"""
+    return _WHITESPACE_RUN.sub(' ', unicodedata.normalize('NFC', query)).strip()
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """รวมหลายลำดับผลลัพธ์ด้วย RRF: score(id) = sum 1 / (k + rank) (rank เริ่มที่ 1)
+    
+    ใช้เฉพาะลำดับ จึงรวม cosine score กับ BM25 score ที่คนละสเกลได้โดยไม่ต้อง normalize
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, vector_id in enumerate(ranking, 1):
+            scores[vector_id] = scores.get(vector_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
 
 class VectorSearcher:
-    def __init__(self, index_name="rag-documents"):
-        self.client = PineconeClient()
-        self.index = self.client.get_index(index_name)
-        self.embedder = EmbeddingModel()
+    def __init__(self, index_name="rag-documents", query_cache_size=1024, query_cache_ttl=3600,
+                 max_query_workers=8, result_cache=None, result_cache_size=10000, result_cache_ttl=300,
+                 result_cache_path=None, chunk_store_path=None, index=None, embedder=None,
+                 lexical_index_path=None, reranker=None, rerank_candidates=50, rerank_budget_ms=None,
+                 dedup_path=None):
+        """index / embedder: ส่ง object ที่สร้างไว้แล้วเข้ามาใช้แทนได้ (ไม่ส่ง = เปิดเมื่อใช้ครั้งแรก)
+        
+        reranker: 'cosine', 'cross-encoder' หรือ Reranker ที่สร้างเอง (None = ไม่ rerank)
+        ดึง rerank_candidates รายการจาก index ให้คะแนนใหม่แล้วคืน top_k
+        rerank_budget_ms: เวลาสูงสุดของการ rerank ต่อ query (เกินแล้วใช้ลำดับเดิมกับส่วนที่เหลือ)
+        """
+        self.index_name = index_name
+        self._index = index
+        # โมเดลตัวเดียวกับ PineconeDataUpserter ใน process เดียวกัน (โหลดตอน query แรก)
+        self.embedder = embedder or get_embedding_model()
+        
+        # cache ผลการค้นหา (ล้างอัตโนมัติเมื่อ PineconeDataUpserter เขียน/ลบ index นี้)
+        # result_cache_path หรือ RESULT_CACHE_PATH: ใช้ไฟล์ SQLite ร่วมกันหลาย process
+        # result_cache=None: เปิดเฉพาะเมื่อมีไฟล์ร่วม เพราะ cache ในหน่วยความจำไม่เห็นการเขียนจาก process อื่น
+        # (ส่ง True เพื่อใช้หน่วยความจำเมื่อ ingest กับ search อยู่ใน process เดียวกัน)
+        if result_cache is None:
+            result_cache = bool(result_cache_path or os.getenv('RESULT_CACHE_PATH'))
+        self.result_cache = None
+        if result_cache:
+            self.result_cache = open_result_cache(
+                index_name,
+                path=result_cache_path,
+                max_entries=result_cache_size,
+                ttl=result_cache_ttl
+            )
+        
+        # cache ของ query embeddings (key = normalize_query) ลดการ encode query ซ้ำ
+        self.query_cache = LRUCache(max_entries=query_cache_size, ttl=query_cache_ttl)
+        # index ที่ upsert แบบ compact_metadata: ดึงข้อความของ chunks จาก ChunkStore หลัง query
+        self.chunk_store_path = chunk_store_path
+        self.chunk_store = None
+        # BM25 index ที่ PineconeDataUpserter(lexical=True) สร้างไว้ สำหรับ hybrid_search
+        self.lexical_index_path = lexical_index_path
+        self._lexical_index = None
+        # references ของ chunks ซ้ำที่ PineconeDataUpserter(dedup=True) ไม่ได้ upsert (ค้นด้วย filter / ดึงเป็นข้างเคียง)
+        self.dedup_path = dedup_path
+        self._dedup = None
+        
+        self.reranker = self._make_reranker(reranker)
+        self.rerank_candidates = rerank_candidates
+        self.rerank_budget_ms = rerank_budget_ms
+        self.rerank_truncated = 0
+        self._rerank_lock = threading.Lock()
+        
+        self.max_query_workers = max_query_workers
+        self._query_pool = None
+        self.latency = {
+            'embed': LatencyStats(),
+            'query': LatencyStats(),
+            'search': LatencyStats(),
+            'lexical': LatencyStats(),
+            'hybrid': LatencyStats(),
+            'rerank': LatencyStats(),
+            'context': LatencyStats(),
+        }
+    
+    @property
+    def index(self):
+        """index ของ VECTOR_BACKEND (เชื่อมต่อครั้งแรกที่ใช้)"""
+        if self._index is None:
+            self._index = open_index(self.index_name)
+        return self._index
+    
+    @property
+    def lexical_index(self):
+        """BM25Index ของ index นี้ (None ถ้ายังไม่เคย ingest แบบ lexical)"""
+        if self._lexical_index is None:
+            self._lexical_index = open_bm25_index(self.index_name, self.lexical_index_path, create=False)
+        return self._lexical_index
+    
+    @property
+    def dedup(self):
+        """ChunkDeduplicator ของ index นี้ (None ถ้าไม่เคย ingest แบบ dedup)"""
+        if self._dedup is None:
+            self._dedup = open_chunk_dedup(self.index_name, self.dedup_path, create=False)
+        return self._dedup
+    
+    def _make_reranker(self, reranker):
+        if reranker is None or not isinstance(reranker, str):
+            return reranker
+        if reranker == 'cosine':
+            # vectors ของ chunks จาก embedding cache ของโมเดลตัวเดียวกัน ที่เหลือ fetch จาก index
+            return CosineReranker(self.embedder, fetch=lambda ids: self.index.fetch(ids))
+        if reranker == 'cross-encoder':
+            return get_cross_encoder()
+        raise ValueError(f"Unknown reranker {reranker!r}, expected one of {RERANKERS}")
+    
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._query_pool is None:
+            self._query_pool = ThreadPoolExecutor(
+                max_workers=self.max_query_workers,
+                thread_name_prefix='query'
+            )
+        return self._query_pool
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """แปลง queries เป็น embeddings โดย encode เฉพาะตัวที่ไม่อยู่ใน cache ใน forward pass เดียว"""
+        started = time.perf_counter()
+        keys = [normalize_query(query) for query in queries]
+        embeddings = [self.query_cache.get(key) for key in keys]
+        
+        missing = list(dict.fromkeys(key for key, embedding in zip(keys, embeddings) if embedding is None))
+        if missing:
+            encoded = dict(zip(missing, self.embedder.encode(
+                missing,
+                batch_size=len(missing),
+                show_progress_bar=False
+            ).tolist()))
+            for key, embedding in encoded.items():
+                self.query_cache.put(key, embedding)
+            embeddings = [encoded[key] if embedding is None else embedding
+                          for key, embedding in zip(keys, embeddings)]
+        
+        self.latency['embed'].record(time.perf_counter() - started)
+        return embeddings
+    
+    def _query_index(self, vector: List[float], top_k: int, filter_dict: Optional[Dict[str, Any]],
+                     include_metadata: bool):
+        """Query Pinecone v7.x ด้วย vector หนึ่งตัว"""
+        started = time.perf_counter()
+        inc('queries')
+        with timer('query'):
+            results = self.index.query(
+                vector=vector,
+                top_k=top_k,
+                filter=filter_dict,
+                include_metadata=include_metadata
+            )
+        self.latency['query'].record(time.perf_counter() - started)
+        return results
+    
+    def _match_metadata(self, matches) -> List[Dict[str, Any]]:
+        """metadata ของแต่ละ match โดยเติมข้อความจาก ChunkStore ให้ match ที่ index เก็บแบบ compact
+        
+        ดึงจาก ChunkStore ครั้งเดียวต่อผลลัพธ์ทั้งชุด
+        """
+        metadata_list = [match.get('metadata') or {} for match in matches]
+        missing = [match['id'] for match, metadata in zip(matches, metadata_list)
+                   if metadata and 'content' not in metadata]
+        if not missing:
+            return metadata_list
+        
+        if self.chunk_store is None:
+            self.chunk_store = open_chunk_store(self.chunk_store_path, create=False)
+            if self.chunk_store is None:
+                return metadata_list
+        
+        with timer('hydrate'):
+            stored = self.chunk_store.get_many(missing)
+        return [
+            {**stored[match['id']], **metadata} if match['id'] in stored else metadata
+            for match, metadata in zip(matches, metadata_list)
+        ]
+    
+    def _format_matches(self, results) -> List[Dict]:
+        """จัดรูปแบบผลลัพธ์"""
+        search_results = []
+        matches = results['matches']
+        for match, metadata in zip(matches, self._match_metadata(matches)):
+            result = {
+                'id': match['id'],
+                'score': match['score'],
+                'content': metadata.get('content', ''),
+                'title': metadata.get('title', ''),
+                'source_url': metadata.get('source_url', ''),
+                'chunk_index': metadata.get('chunk_index', 0),
+                'metadata': metadata
+            }
+            search_results.append(result)
+        
+        return search_results
+    
+    def _resolve_references(self, vector: List[float], top_k: int, filter_dict: Optional[Dict[str, Any]],
+                            search_results: List[Dict]) -> List[Dict]:
+        """เติม chunks ซ้ำที่ตรงกับ filter แต่ index กรองทิ้งเพราะ canonical ของมันไม่ตรง
+        
+        ผลลัพธ์ของ reference ใช้ ID และ metadata ของตัวเอง, score ของ canonical และมี duplicate_of
+        """
+        if not filter_dict or self.dedup is None:
+            return search_results
+        references = self.dedup.search_references(vector, top_k, filter_dict)
+        if not references:
+            return search_results
+        matches = [{'id': vector_id, 'score': score, 'metadata': metadata}
+                   for score, vector_id, _, metadata in references]
+        resolved = self._format_matches({'matches': matches})
+        for result, (_, _, canonical_id, _) in zip(resolved, references):
+            result['duplicate_of'] = canonical_id
+        return sorted(search_results + resolved, key=lambda result: -result['score'])[:top_k]
+    
+    def _search_uncached(self, vector: List[float], top_k: int, filter_dict: Optional[Dict[str, Any]],
+                         include_metadata: bool) -> List[Dict]:
+        search_results = self._format_matches(self._query_index(vector, top_k, filter_dict, include_metadata))
+        return self._resolve_references(vector, top_k, filter_dict, search_results)
+    
+    def _search_vector(self, vector: List[float], top_k: int, filter_dict: Optional[Dict[str, Any]],
+                       include_metadata: bool) -> List[Dict]:
+        """ค้นหาด้วย query vector ผ่าน result cache (ถ้าเปิดใช้)"""
+        if self.result_cache is None:
+            return self._search_uncached(vector, top_k, filter_dict, include_metadata)
+        
+        cache_key = self.result_cache.key(vector, filter_dict, top_k, include_metadata)
+        search_results = self.result_cache.get(cache_key)
+        if search_results is None:
+            search_results = self._search_uncached(vector, top_k, filter_dict, include_metadata)
+            self.result_cache.put(cache_key, search_results)
+        
+        # backend คืน copy ใหม่ทุกครั้ง (รวม metadata ข้างใน) ผู้เรียกแก้ไขผลลัพธ์ได้โดยไม่กระทบ cache
+        return search_results
+    
+    def _search_reranked(self, query: str, vector: List[float], top_k: int, filter_dict: Optional[Dict[str, Any]],
+                         include_metadata: bool) -> List[Dict]:
+        """ดึง candidates (ผ่าน result cache) แล้ว rerank เหลือ top_k
+        
+        candidates ดึงพร้อม metadata เสมอเพราะ reranker ใช้ข้อความของ chunks
+        """
+        if self.reranker is None:
+            return self._search_vector(vector, top_k, filter_dict, include_metadata)
+        
+        candidates = self._search_vector(vector, max(top_k, self.rerank_candidates), filter_dict, True)
+        with timer('rerank'):
+            outcome = self.reranker.rerank(query, vector, candidates, top_k, self.rerank_budget_ms)
+        self.latency['rerank'].record(outcome['seconds'])
+        if outcome['truncated']:
+            with self._rerank_lock:
+                self.rerank_truncated += 1
+        return outcome['results']
     
     def search(self, 
                query: str, 
@@ -14,34 +276,294 @@ class VectorSearcher:
                filter_dict: Optional[Dict[str, Any]] = None,
                include_metadata: bool = True) -> List[Dict]:
         """ค้นหา vectors ที่คล้ายกับ query"""
+        started = time.perf_counter()
+        
+        # แปลง query เป็น embedding (ใช้ cache ถ้าเคย encode แล้ว)
+        query_embedding = self.embed_queries([query])[0]
+        
+        search_results = self.search_embedding(query, query_embedding, top_k, filter_dict, include_metadata)
+        
+        self.latency['search'].record(time.perf_counter() - started)
+        return search_results
+    
+    def search_embedding(self,
+                         query: str,
+                         query_embedding: List[float],
+                         top_k: int = 5,
+                         filter_dict: Optional[Dict[str, Any]] = None,
+                         include_metadata: bool = True) -> List[Dict]:
+        """ค้นหาด้วย embedding ของ query ที่ encode ไว้แล้ว (เช่นจาก embed_queries ของทั้ง batch)
+        
+        ผ่าน result cache และ reranker เหมือน search() ส่วน query ใช้เป็นข้อความให้ reranker
+        """
+        return self._search_reranked(query, query_embedding, top_k, filter_dict, include_metadata)
+    
+    def search_many(self,
+                    queries: List[str],
+                    top_k: int = 5,
+                    filter_dict: Optional[Dict[str, Any]] = None,
+                    include_metadata: bool = True) -> List[List[Dict]]:
+        """ค้นหาหลาย queries พร้อมกัน: encode รวมครั้งเดียว แล้ว query index แบบ concurrent
+        
+        คืนผลลัพธ์ตามลำดับของ queries
+        """
+        if not queries:
+            return []
+        started = time.perf_counter()
+        
+        query_embeddings = self.embed_queries(queries)
+        
+        search_results = list(self._pool().map(
+            lambda query, vector: self.search_embedding(query, vector, top_k, filter_dict, include_metadata),
+            queries,
+            query_embeddings
+        ))
+        
+        # latency ต่อ query เพื่อให้เทียบกับ search() ได้
+        elapsed = time.perf_counter() - started
+        for _ in queries:
+            self.latency['search'].record(elapsed)
+        return search_results
+    
+    def _lexical_search(self, query: str, top_k: int, filter_dict: Optional[Dict[str, Any]]) -> List[Tuple[str, float]]:
+        started = time.perf_counter()
+        with timer('lexical'):
+            results = self.lexical_index.search(query, top_k=top_k, filter_dict=filter_dict)
+        self.latency['lexical'].record(time.perf_counter() - started)
+        return results
+    
+    def hybrid_search(self,
+                      query: str,
+                      top_k: int = 5,
+                      filter_dict: Optional[Dict[str, Any]] = None,
+                      candidates: Optional[int] = None,
+                      rrf_k: int = 60,
+                      include_metadata: bool = True) -> List[Dict]:
+        """ค้นหาแบบ hybrid: BM25 (คำตรงตัว เช่น รหัสสินค้า ชื่อเฉพาะ) + vector search รวมลำดับด้วย RRF
+        
+        - ค้นหา BM25 ใน thread pool ขนานกับการ encode query และ query index
+        - candidates: จำนวนผลลัพธ์ที่ดึงจากแต่ละฝั่งก่อนรวม (default max(top_k * 4, 20))
+        - score ของผลลัพธ์คือ RRF score, dense_score / lexical_score และ dense_rank / lexical_rank
+          เป็นค่าจากแต่ละฝั่ง (None ถ้าไม่พบในฝั่งนั้น)
+        - ถ้ายังไม่มี BM25 index คืนผลลัพธ์จาก vector search อย่างเดียวในรูปแบบเดียวกัน
+        """
+        started = time.perf_counter()
+        candidates = candidates or max(top_k * 4, 20)
+        
+        lexical_future = None
+        if self.lexical_index is not None:
+            # filter บน field ที่ BM25 ไม่ได้เก็บ: raise แทนการกลายเป็น vector search อย่างเดียวโดยไม่รู้ตัว
+            self.lexical_index.check_filter(filter_dict)
+            lexical_future = self._pool().submit(self._lexical_search, query, candidates, filter_dict)
+        
+        query_embedding = self.embed_queries([query])[0]
+        dense_results = self._search_vector(query_embedding, candidates, filter_dict, include_metadata)
+        lexical_results = lexical_future.result() if lexical_future is not None else []
         
-        # แปลง query เป็น embedding
-        query_embedding = self.embedder.encode_single(query)
+        dense_by_id = {result['id']: (rank, result) for rank, result in enumerate(dense_results, 1)}
+        lexical_by_id = {vector_id: (rank, score) for rank, (vector_id, score) in enumerate(lexical_results, 1)}
+        fused = reciprocal_rank_fusion(
+            [[result['id'] for result in dense_results], [vector_id for vector_id, _ in lexical_results]],
+            k=rrf_k
+        )[:top_k]
         
-        # Query Pinecone v7.x
-        results = self.index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            filter=filter_dict,
-            include_metadata=include_metadata
-        )
+        # chunks ที่พบจาก BM25 อย่างเดียว: ดึง metadata จาก index ในครั้งเดียว
+        lexical_only = [vector_id for vector_id, _ in fused if vector_id not in dense_by_id]
+        fetched = {}
+        if lexical_only:
+            vectors = self.index.fetch(lexical_only)['vectors']
+            matches = [{'id': vector_id, 'score': 0.0, 'metadata': vectors[vector_id].get('metadata') or {}}
+                       for vector_id in lexical_only if vector_id in vectors]
+            fetched = {result['id']: result for result in self._format_matches({'matches': matches})}
         
-        # จัดรูปแบบผลลัพธ์
         search_results = []
-        for match in results['matches']:
-            result = {
-                'id': match['id'],
-                'score': match['score'],
-                'content': match.get('metadata', {}).get('content', ''),
-                'title': match.get('metadata', {}).get('title', ''),
-                'source_url': match.get('metadata', {}).get('source_url', ''),
-                'chunk_index': match.get('metadata', {}).get('chunk_index', 0),
-                'metadata': match.get('metadata', {})
-            }
-            search_results.append(result)
+        for vector_id, score in fused:
+            dense_rank, result = dense_by_id.get(vector_id, (None, fetched.get(vector_id)))
+            if result is None:
+                # ถูกลบจาก index แล้วแต่ BM25 index ยังไม่ได้ลบ
+                continue
+            lexical_rank, lexical_score = lexical_by_id.get(vector_id, (None, None))
+            search_results.append({
+                **result,
+                'score': score,
+                'dense_score': result['score'] if dense_rank is not None else None,
+                'dense_rank': dense_rank,
+                'lexical_score': lexical_score,
+                'lexical_rank': lexical_rank,
+            })
         
+        self.latency['hybrid'].record(time.perf_counter() - started)
         return search_results
     
+    def _neighbor_ids(self, hits: List[Dict], neighbors: int) -> List[str]:
+        """IDs ของ chunks ติดกัน ({doc_id}_{chunk_index +- neighbors}) ที่ยังไม่อยู่ใน hits"""
+        have = {hit['id'] for hit in hits}
+        wanted = []
+        for hit in hits:
+            metadata = hit.get('metadata') or {}
+            doc_id, chunk_index = split_vector_id(hit['id'])
+            doc_id = metadata.get('doc_id', doc_id)
+            total_chunks = metadata.get('total_chunks')
+            for i in range(chunk_index - neighbors, chunk_index + neighbors + 1):
+                vector_id = f"{doc_id}_{i}"
+                if i < 0 or (total_chunks is not None and i >= total_chunks) or vector_id in have:
+                    continue
+                have.add(vector_id)
+                wanted.append(vector_id)
+        return wanted
+    
+    @staticmethod
+    def _merge_passages(chunks: List[Dict]) -> List[Dict[str, Any]]:
+        """รวม chunks ของเอกสารเดียวกันที่ chunk_index ติดกันเป็น passage เดียว
+        
+        ถ้ามี char_start/char_end ตัดส่วนที่ซ้อนกัน (chunk overlap) ออก ไม่งั้นต่อข้อความด้วยช่องว่าง
+        score ของ passage คือ score สูงสุดของ chunks ที่ค้นเจอ (chunks ข้างเคียงไม่มี score)
+        และ best คือ chunk นั้น (ใช้แทนทั้ง passage เมื่อ passage ใหญ่เกิน budget)
+        """
+        by_doc: Dict[str, List[Dict]] = {}
+        for chunk in chunks:
+            doc_id = (chunk.get('metadata') or {}).get('doc_id') or split_vector_id(chunk['id'])[0]
+            by_doc.setdefault(doc_id, []).append(chunk)
+        
+        passages = []
+        for doc_id, doc_chunks in by_doc.items():
+            passage = None
+            for chunk in sorted(doc_chunks, key=lambda chunk: chunk['chunk_index']):
+                metadata = chunk.get('metadata') or {}
+                start, end = metadata.get('char_start'), metadata.get('char_end')
+                if passage is not None and chunk['chunk_index'] == passage['chunk_end'] + 1:
+                    if start is not None and passage['char_end'] is not None:
+                        # ข้ามข้อความส่วนที่ซ้อนกับ passage อยู่แล้ว
+                        if end > passage['char_end']:
+                            overlap = max(passage['char_end'] - start, 0)
+                            gap = ' ' if start > passage['char_end'] else ''
+                            passage['content'] += gap + chunk['content'][overlap:]
+                            passage['char_end'] = end
+                    else:
+                        passage['content'] += ' ' + chunk['content']
+                        passage['char_start'] = passage['char_end'] = None
+                    passage['chunk_end'] = chunk['chunk_index']
+                else:
+                    passage = {
+                        'doc_id': doc_id,
+                        'title': chunk.get('title', ''),
+                        'source_url': chunk.get('source_url', ''),
+                        'chunk_start': chunk['chunk_index'],
+                        'chunk_end': chunk['chunk_index'],
+                        'char_start': start,
+                        'char_end': end,
+                        'content': chunk['content'],
+                        'score': None,
+                        'hits': [],
+                        'best': None,
+                    }
+                    passages.append(passage)
+                if chunk.get('score') is not None:
+                    passage['hits'].append(chunk['id'])
+                    if passage['score'] is None or chunk['score'] > passage['score']:
+                        passage['score'] = chunk['score']
+                        passage['best'] = chunk
+        return [passage for passage in passages if passage['hits']]
+    
+    def build_context(self,
+                      query: str,
+                      token_budget: int = 1500,
+                      top_k: int = 8,
+                      neighbors: int = 1,
+                      filter_dict: Optional[Dict[str, Any]] = None,
+                      hybrid: bool = False,
+                      count_tokens: Optional[Callable[[List[str]], List[int]]] = None,
+                      separator: str = '\n\n') -> Dict[str, Any]:
+        """ค้นหาแล้วประกอบ context สำหรับ LLM ให้ไม่เกิน token_budget
+        
+        1. ค้นหา top_k chunks (search หรือ hybrid_search ตาม hybrid)
+        2. ดึง chunks ข้างเคียง (chunk_index +- neighbors) ของทุกผลลัพธ์ด้วย fetch ครั้งเดียว
+        3. รวม chunks ที่ติดกันของเอกสารเดียวกันเป็น passage (ตัดส่วนที่ซ้อนกันตาม char offsets)
+        4. เลือก passages ตาม score จากมากไปน้อยเท่าที่ยังไม่เกิน token_budget
+           passage ที่ใหญ่เกินลดเหลือ chunk ที่ score สูงสุด ถ้ายังเกินก็ข้ามแล้วลองอันถัดไป
+        
+        count_tokens: ฟังก์ชันนับ tokens ของหลาย texts (default = tokenizer ของ embedding model)
+        คืน {'context', 'passages', 'tokens', 'token_budget', 'dropped'}
+        แต่ละ passage ใน context ขึ้นต้นด้วย [n] และชื่อเอกสารเพื่อให้ LLM อ้างอิงได้
+        """
+        started = time.perf_counter()
+        count_tokens = count_tokens or self.embedder.count_tokens
+        if hybrid:
+            hits = self.hybrid_search(query, top_k=top_k, filter_dict=filter_dict)
+        else:
+            hits = self.search(query, top_k=top_k, filter_dict=filter_dict)
+        
+        with timer('context'):
+            chunks = list(hits)
+            neighbor_ids = self._neighbor_ids(hits, neighbors) if neighbors > 0 else []
+            if neighbor_ids:
+                vectors = self.index.fetch(neighbor_ids)['vectors']
+                matches = [{'id': vector_id, 'score': None, 'metadata': vectors[vector_id].get('metadata') or {}}
+                           for vector_id in neighbor_ids if vector_id in vectors]
+                # chunks ข้างเคียงที่ไม่อยู่ใน index เพราะซ้ำกับ chunk อื่น: ใช้ metadata ของ reference
+                missing = [vector_id for vector_id in neighbor_ids if vector_id not in vectors]
+                if missing and self.dedup is not None:
+                    matches.extend({'id': vector_id, 'score': None, 'metadata': metadata}
+                                   for vector_id, (_, metadata) in self.dedup.get_references(missing).items())
+                chunks.extend(self._format_matches({'matches': matches}))
+            
+            passages = sorted(self._merge_passages(chunks), key=lambda passage: -passage['score'])
+            blocks = [f"[{n}] {passage['title']}\n{passage['content']}" for n, passage in enumerate(passages, 1)]
+            costs = count_tokens(blocks + [separator]) if blocks else [0]
+            separator_tokens = costs.pop()
+            
+            selected = []
+            used = 0
+            for passage, cost in zip(passages, costs):
+                best = passage.pop('best')
+                cost += separator_tokens if selected else 0
+                if used + cost > token_budget and passage['chunk_start'] != passage['chunk_end']:
+                    metadata = best.get('metadata') or {}
+                    passage.update(chunk_start=best['chunk_index'], chunk_end=best['chunk_index'],
+                                   char_start=metadata.get('char_start'), char_end=metadata.get('char_end'),
+                                   content=best['content'], hits=[best['id']])
+                    cost = count_tokens([f"[{len(selected) + 1}] {passage['title']}\n{passage['content']}"])[0]
+                    cost += separator_tokens if selected else 0
+                if used + cost > token_budget:
+                    continue
+                selected.append(passage)
+                passage['tokens'] = cost
+                used += cost
+            
+            # เลขอ้างอิงเรียงใหม่หลังเลือก (ไม่ทำให้จำนวน tokens เพิ่มขึ้น)
+            context = separator.join(
+                f"[{n}] {passage['title']}\n{passage['content']}" for n, passage in enumerate(selected, 1)
+            )
+        
+        self.latency['context'].record(time.perf_counter() - started)
+        return {
+            'context': context,
+            'passages': selected,
+            'tokens': used,
+            'token_budget': token_budget,
+            'dropped': len(passages) - len(selected),
+        }
+    
+    def search_stats(self) -> Dict[str, Any]:
+        """สถิติของ query/result cache และ latency (ms) ของแต่ละขั้นตอน"""
+        return {
+            'query_cache': self.query_cache.stats(),
+            'result_cache': self.result_cache.stats() if self.result_cache is not None else None,
+            'latency': {stage: stats.summary() for stage, stats in self.latency.items()},
+            'rerank': {
+                'reranker': self.reranker.name,
+                'candidates': self.rerank_candidates,
+                'budget_ms': self.rerank_budget_ms,
+                'truncated': self.rerank_truncated,
+            } if self.reranker is not None else None,
+        }
+    
+    def close(self):
+        """ปิด thread pool ของ search_many"""
+        if self._query_pool is not None:
+            self._query_pool.shutdown(wait=True)
+            self._query_pool = None
+    
     def search_with_filters(self, 
                           query: str, 
                           document_type: Optional[str] = None,
@@ -82,19 +604,20 @@ class VectorSearcher:
                 
                 # กรอง original vector ออก
                 similar_chunks = []
-                for match in results['matches']:
-                    if match['id'] != vector_id:
-                        similar_chunks.append({
-                            'id': match['id'],
-                            'score': match['score'],
-                            'content': match.get('metadata', {}).get('content', ''),
-                            'title': match.get('metadata', {}).get('title', ''),
-                        })
+                matches = [match for match in results['matches'] if match['id'] != vector_id][:top_k]
+                for match, metadata in zip(matches, self._match_metadata(matches)):
+                    similar_chunks.append({
+                        'id': match['id'],
+                        'score': match['score'],
+                        'content': metadata.get('content', ''),
+                        'title': metadata.get('title', ''),
+                    })
                 
                 return similar_chunks[:top_k]
         
         except Exception as e:
-            print(f"Error finding similar chunks: {e}")
+            log_event(logger, f"Error finding similar chunks: {e}", level=logging.ERROR,
+                      event='similar_chunks_failed', vector_id=vector_id, error=str(e))
             return []
     
     def get_index_stats(self) -> Dict:
@@ -121,6 +644,22 @@ if __name__ == "__main__":
             print(f"{i}. [{result['score']:.3f}] {result['title']}")
             print(f"   {result['content'][:100]}...")
     
+    # ค้นหาหลาย queries พร้อมกัน (queries เดิมจะได้จาก cache)
+    batch_results = searcher.search_many(queries, top_k=3)
+    print(f"\nsearch_many: {[len(results) for results in batch_results]} results")
+    
+    # hybrid: ต้อง upsert ด้วย PineconeDataUpserter(lexical=True) ก่อน
+    for i, result in enumerate(searcher.hybrid_search("ภาษาไทย programming", top_k=3), 1):
+        print(f"hybrid {i}. [{result['score']:.4f}] dense #{result['dense_rank']} "
+              f"lexical #{result['lexical_rank']} {result['title']}")
+    
+    # context สำหรับ LLM: ผลการค้นหา + chunks ข้างเคียง ไม่เกิน 512 tokens
+    context = searcher.build_context("Python programming language", token_budget=512)
+    print(f"\nContext ({context['tokens']}/{context['token_budget']} tokens, "
+          f"{len(context['passages'])} passages):\n{context['context'][:300]}...")
+    print(f"Search stats: {searcher.search_stats()}")
+    searcher.close()
+    
     # ดูสถิติ index
     stats = searcher.get_index_stats()
     print(f"\nIndex stats: {stats}")
\ No newline at end of file
@@ -0,0 +1,80 @@
+import hashlib
+from typing import List, Dict, Any, Tuple
+
+from metrics import timer
+
+def document_id(document: Dict[str, Any]) -> str:
+    """ID ของเอกสาร: ใช้ 'id' ถ้ามี ไม่งั้นสร้างจาก hash ของ title+content
+
+    ได้ ID เดิมทุกครั้งไม่ว่าจะรันกี่รอบหรือใน process ไหน ทำให้ re-import ไม่สร้าง vectors ซ้ำ
+    """
+    if 'id' in document:
+        return document['id']
+    data = f"{document.get('title', '')}\n{document.get('content', '')}".encode('utf-8')
+    return f"doc_{hashlib.sha1(data).hexdigest()[:16]}"
+
+class DocumentVectorizer:
+    """แปลงเอกสารเป็น vectors (chunk -> encode -> metadata) โดยไม่ผูกกับ index
+
+    ใช้ได้ทั้งใน PineconeDataUpserter และใน worker process ของ parallel ingest
+    """
+
+    def __init__(self, embedder, chunker, encode_batch_size=64):
+        self.embedder = embedder
+        self.chunker = chunker
+        self.encode_batch_size = encode_batch_size
+
+    def build_metadata(self, document: Dict[str, Any], chunk: str, chunk_index: int, total_chunks: int,
+                       span: Tuple[int, int] = None) -> Dict:
+        """Metadata สำหรับ filtering และแสดงผล (span = ตำแหน่งของ chunk ใน content ต้นฉบับ)"""
+        metadata = {
+            'title': document['title'],
+            'content': chunk,
+            'chunk_index': chunk_index,
+            'total_chunks': total_chunks,
+            'source_url': document.get('source_url', ''),
+            'document_type': document.get('type', 'general'),
+            'created_at': document.get('created_at', ''),
+        }
+        if span is not None:
+            metadata['char_start'], metadata['char_end'] = span
+        return metadata
+
+    def chunk_spans(self, content: str) -> List[Tuple[int, int]]:
+        """ตำแหน่ง (start, end) ของแต่ละ chunk ใน content"""
+        with timer('chunk'):
+            return self.chunker.chunk_by_sentences(content, return_offsets=True)
+
+    def chunk_documents(self, documents: List[Dict[str, Any]]):
+        """chunk ทุกเอกสาร คืน (doc_ids, spans ของแต่ละเอกสาร) โดย tokenize ทั้ง window ใน batch เดียว"""
+        doc_ids = [document_id(document) for document in documents]
+        with timer('chunk'):
+            doc_spans = self.chunker.chunk_many_by_sentences(
+                [document['content'] for document in documents], return_offsets=True
+            )
+        return doc_ids, doc_spans
+
+    def vectors_from_chunks(self, documents, doc_ids, doc_spans) -> List[tuple]:
+        """encode chunks จากทุกเอกสารรวมกัน แล้วกระจายกลับเป็น vector ของ (doc_id, chunk_index)"""
+        texts = [
+            document['content'][start:end]
+            for document, spans in zip(documents, doc_spans)
+            for start, end in spans
+        ]
+        embeddings = self.embedder.encode_packed(texts, batch_size=self.encode_batch_size, show_progress_bar=False)
+
+        vectors = []
+        offset = 0
+        for document, doc_id, spans in zip(documents, doc_ids, doc_spans):
+            for i, span in enumerate(spans):
+                metadata = self.build_metadata(document, texts[offset + i], i, len(spans), span)
+                vectors.append((f"{doc_id}_{i}", embeddings[offset + i], metadata))
+            offset += len(spans)
+
+        return vectors
+
+    def vectorize(self, documents: List[Dict[str, Any]]) -> Tuple[List[str], List[int], List[tuple]]:
+        """chunk + encode ทั้ง window คืน (doc_ids, จำนวน chunks ของแต่ละเอกสาร, vectors)"""
+        doc_ids, doc_spans = self.chunk_documents(documents)
+        vectors = self.vectors_from_chunks(documents, doc_ids, doc_spans)
+        return doc_ids, [len(spans) for spans in doc_spans], vectors